@@ -1,9 +1,388 @@
-from transformers import pipeline
+"""Local dialogue model used as the offline fallback when the OpenAI API is unreachable.
 
-# Initialize the chatbot model
-chatbot = pipeline("conversational", model="microsoft/DialoGPT-medium")
+DialoGPT runs on CPU with:
+- dynamic int8 quantization of every linear layer (GPT-2's Conv1D layers are
+  converted to nn.Linear first so they are quantized too)
+- an explicit torch thread count and a warm-up generation on load
+- a per-session KV cache, so each turn only encodes the new user tokens
+- token streaming
+- batched decoding when several sessions ask at once
 
-def generate_response(user_input):
-    conversation = chatbot(user_input)
-    response = conversation[0]['generated_text']
-    return response
+Tune with LOCAL_MODEL, LOCAL_MODEL_THREADS and LOCAL_MODEL_QUANTIZE; see
+benchmark_local_model.py for a comparison against the plain fp32 pipeline.
+"""
+import os
+import queue
+import threading
+import time
+
+MODEL_NAME = os.getenv('LOCAL_MODEL', "microsoft/DialoGPT-medium")
+
+
+def _cache_layers(cache):
+    """Per-layer (key, value) tensors of a model cache, whatever its type"""
+    if isinstance(cache, (tuple, list)):
+        return [tuple(layer) for layer in cache]
+    if hasattr(cache, 'layers'):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, 'key_cache'):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(layer) for layer in cache.to_legacy_cache()]
+
+
+def _make_cache(layers):
+    """Cache object the installed transformers version accepts as past_key_values"""
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return tuple(layers)
+    if hasattr(DynamicCache, 'from_legacy_cache'):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    cache = DynamicCache()
+    for i, (key, value) in enumerate(layers):
+        cache.update(key, value, i)
+    return cache
+
+
+def _linearize_conv1d(model):
+    """Swap GPT-2's Conv1D layers for equivalent nn.Linear so quantize_dynamic covers them"""
+    import torch.nn as nn
+    from transformers.pytorch_utils import Conv1D
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data.clone()
+                setattr(module, name, linear)
+
+
+class DialogueSession:
+    """Conversation state for one meeting: token history and its KV cache"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.history = []   # token ids already in the cache
+        self.cache = None   # per-layer (key, value) tensors
+        self.pending = []   # ids to feed before the next user turn (e.g. the reply's EOS)
+
+    def reset(self):
+        self.history = []
+        self.cache = None
+        self.pending = []
+
+
+class _Request:
+    def __init__(self, session, text, max_new_tokens):
+        self.session = session
+        self.text = text
+        self.max_new_tokens = max_new_tokens
+        self.output = queue.Queue()
+        self.generated = []
+        self.sent = ""
+        self.submitted = time.monotonic()
+        self.first_token_at = None
+
+    def __iter__(self):
+        while True:
+            item = self.output.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class LocalDialogueModel:
+    """Quantized DialoGPT with per-session KV caches and batched decoding.
+
+    All model work happens on one scheduler thread. Requests that arrive
+    within `batch_window` of each other (up to `max_batch`) are prefilled
+    one by one and then decoded together, one token per session per step.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, quantize=True, threads=None, max_context=768,
+                 max_batch=4, batch_window=0.02, temperature=0.7, top_k=40):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.threads = threads
+        self.max_context = max_context
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.temperature = temperature
+        self.top_k = top_k
+        self.model = None
+        self.tokenizer = None
+        self.load_seconds = None
+        self.sessions = {}
+        self._requests = queue.Queue()
+        self._load_lock = threading.Lock()
+        self._sessions_lock = threading.Lock()
+        self._scheduler = None
+        self.stats = {'requests': 0, 'batches': 0, 'max_batch_seen': 0, 'tokens': 0,
+                      'prefill_tokens': 0, 'cache_rebuilds': 0}
+
+    # -- loading ------------------------------------------------------------
+
+    def load(self):
+        """Load, quantize and warm up the model (idempotent)"""
+        with self._load_lock:
+            if self.loaded:
+                return self
+            started = time.monotonic()
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+            if self.threads:
+                torch.set_num_threads(self.threads)
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # can only be set before the first parallel op
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            model.eval()
+            if self.quantize:
+                _linearize_conv1d(model)
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.tokenizer, self.model, self._torch = tokenizer, model, torch
+            self._scheduler = threading.Thread(target=self._schedule, name="local-llm", daemon=True)
+            self._scheduler.start()
+            try:
+                # One short generation so the first real turn doesn't pay for lazy kernel setup
+                warm = DialogueSession('warm-up')
+                "".join(self._submit(warm, "Hello", 4))
+            except Exception:
+                # Leave nothing half-loaded behind so a later load() starts over
+                self._requests.put(None)
+                self._scheduler.join()
+                self.tokenizer = self.model = self._scheduler = None
+                raise
+            self.load_seconds = time.monotonic() - started
+            print(f"Local dialogue model {self.model_name} ready in {self.load_seconds:.1f}s "
+                  f"({'int8' if self.quantize else 'fp32'}, {torch.get_num_threads()} threads)")
+            return self
+
+    @property
+    def loaded(self):
+        return self.model is not None and self.load_seconds is not None
+
+    # -- public API ---------------------------------------------------------
+
+    def session(self, session_id='default'):
+        with self._sessions_lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = DialogueSession(session_id)
+            return self.sessions[session_id]
+
+    def reset_session(self, session_id='default'):
+        with self._sessions_lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.reset()
+
+    def stream(self, text, session_id='default', max_new_tokens=60):
+        """The reply as an iterable of text deltas (also records first_token_at)"""
+        self.load()
+        return self._submit(self.session(session_id), text, max_new_tokens)
+
+    def generate(self, text, session_id='default', max_new_tokens=60):
+        return "".join(self.stream(text, session_id, max_new_tokens)).strip()
+
+    def _submit(self, session, text, max_new_tokens):
+        request = _Request(session, text, max_new_tokens)
+        self._requests.put(request)
+        return request
+
+    # -- scheduling ---------------------------------------------------------
+
+    def _schedule(self):
+        while True:
+            batch = [self._requests.get()]
+            if batch[0] is None:
+                return  # stopped by a failed load()
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None or any(request.session is other.session for other in batch):
+                    # Turns of the same session must run in order, and a stop ends the
+                    # current batch first; defer to the next batch
+                    self._requests.put(request)
+                    break
+                batch.append(request)
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['max_batch_seen'] = max(self.stats['max_batch_seen'], len(batch))
+            try:
+                with self._torch.inference_mode():
+                    self._run_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    request.session.reset()  # the cache may be half-updated
+                    request.output.put(e)
+                    request.output.put(None)
+
+    # -- model work (scheduler thread only) ---------------------------------
+
+    def _prefill(self, request):
+        """Feed the new user turn through the session's cache; returns next-token logits"""
+        session = request.session
+        eos = self.tokenizer.eos_token_id
+        new_ids = session.pending + self.tokenizer.encode(request.text) + [eos]
+        session.pending = []
+        if len(session.history) + len(new_ids) + request.max_new_tokens > self.max_context:
+            # Rebuild the cache from the most recent whole turns
+            keep = self.max_context // 2 - len(new_ids) - request.max_new_tokens
+            history = session.history[-keep:] if keep > 0 else []
+            while history and history[0] != eos:
+                history.pop(0)
+            new_ids = history[1:] + new_ids
+            session.history, session.cache = [], None
+            self.stats['cache_rebuilds'] += 1
+        past = _make_cache(session.cache) if session.cache is not None else None
+        out = self.model(input_ids=self._torch.tensor([new_ids]), past_key_values=past, use_cache=True)
+        session.cache = _cache_layers(out.past_key_values)
+        session.history.extend(new_ids)
+        self.stats['prefill_tokens'] += len(new_ids)
+        return out.logits[0, -1]
+
+    def _sample(self, logits):
+        torch = self._torch
+        if self.temperature <= 0:
+            return int(torch.argmax(logits))
+        values, indices = torch.topk(logits / self.temperature, self.top_k)
+        choice = torch.multinomial(torch.softmax(values, dim=-1), 1)
+        return int(indices[choice])
+
+    def _emit(self, request, token):
+        if request.first_token_at is None:
+            request.first_token_at = time.monotonic()
+        request.generated.append(token)
+        text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+        # Hold back partial multi-byte characters until they are complete
+        if not text.endswith('\ufffd') and len(text) > len(request.sent):
+            request.output.put(text[len(request.sent):])
+            request.sent = text
+
+    def _step(self, running, tokens):
+        """Feed one token per running request; returns next-token logits for each"""
+        torch = self._torch
+        if len(running) == 1:
+            session = running[0].session
+            out = self.model(input_ids=torch.tensor([tokens]), past_key_values=_make_cache(session.cache),
+                             use_cache=True)
+            session.cache = _cache_layers(out.past_key_values)
+            session.history.append(tokens[0])
+            return [out.logits[0, -1]]
+        # Sessions have different history lengths: left-pad their caches and mask the padding
+        lengths = [len(r.session.history) for r in running]
+        longest = max(lengths)
+        layers = []
+        for layer in range(len(running[0].session.cache)):
+            keys, values = [], []
+            for request, length in zip(running, lengths):
+                key, value = request.session.cache[layer]
+                pad = longest - length
+                if pad:
+                    key = torch.nn.functional.pad(key, (0, 0, pad, 0))
+                    value = torch.nn.functional.pad(value, (0, 0, pad, 0))
+                keys.append(key)
+                values.append(value)
+            layers.append((torch.cat(keys), torch.cat(values)))
+        mask = torch.zeros(len(running), longest + 1, dtype=torch.long)
+        for i, length in enumerate(lengths):
+            mask[i, longest - length:] = 1
+        out = self.model(input_ids=torch.tensor(tokens).unsqueeze(1), past_key_values=_make_cache(layers),
+                         attention_mask=mask, position_ids=torch.tensor(lengths).unsqueeze(1), use_cache=True)
+        new_layers = _cache_layers(out.past_key_values)
+        for i, (request, length) in enumerate(zip(running, lengths)):
+            start = longest - length
+            request.session.cache = [(key[i:i + 1, :, start:], value[i:i + 1, :, start:])
+                                     for key, value in new_layers]
+            request.session.history.append(tokens[i])
+        return [out.logits[i, -1] for i in range(len(running))]
+
+    def _run_batch(self, batch):
+        eos = self.tokenizer.eos_token_id
+        logits = [self._prefill(request) for request in batch]
+        running = list(batch)
+        while running:
+            still_running, tokens = [], []
+            for request, request_logits in zip(running, logits):
+                token = self._sample(request_logits)
+                if token == eos:
+                    request.session.pending = [eos]
+                    request.output.put(None)
+                    continue
+                self._emit(request, token)
+                self.stats['tokens'] += 1
+                if len(request.generated) >= request.max_new_tokens:
+                    # Out of budget: the last token still has to enter the cache
+                    request.session.pending = [token, eos]
+                    request.output.put(None)
+                    continue
+                still_running.append(request)
+                tokens.append(token)
+            running = still_running
+            if running:
+                logits = self._step(running, tokens)
+
+
+# The process-wide model is created on first use (or by warm_up()), not at import
+_model = None
+_model_lock = threading.Lock()
+_warm_up_thread = None
+_warm_up_failed_at = None
+# A failed load (no network, missing weights) is retried at most this often
+WARM_UP_RETRY_SECONDS = 60.0
+
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            threads = os.getenv('LOCAL_MODEL_THREADS')
+            _model = LocalDialogueModel(quantize=os.getenv('LOCAL_MODEL_QUANTIZE', '1') != '0',
+                                        threads=int(threads) if threads else None)
+        return _model
+
+
+def _load_in_background():
+    global _warm_up_failed_at
+    try:
+        get_model().load()
+    except Exception as e:
+        print(f"Could not load local dialogue model: {e}")
+        _warm_up_failed_at = time.monotonic()
+
+
+def warm_up():
+    """Load the model in a background thread so the first reply does not wait for it"""
+    global _warm_up_thread
+    with _model_lock:
+        retry = (_warm_up_thread is not None and not _warm_up_thread.is_alive() and not is_ready()
+                 and _warm_up_failed_at is not None
+                 and time.monotonic() - _warm_up_failed_at >= WARM_UP_RETRY_SECONDS)
+        if _warm_up_thread is None or retry:
+            _warm_up_thread = threading.Thread(target=_load_in_background, name="local-llm-warmup",
+                                               daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
+def is_ready():
+    return _model is not None and _model.loaded
+
+
+def stream_response(user_input, session_id='default'):
+    return get_model().stream(user_input, session_id)
+
+
+def generate_response(user_input, session_id='default'):
+    return get_model().generate(user_input, session_id)
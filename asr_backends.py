@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import speech_recognition as sr
+
+import tracing
+
+
+class BackendStats:
+    """Latency and error counters for one recognition backend"""
+
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.unrecognized = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, outcome):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if outcome == 'ok':
+                self.successes += 1
+            elif outcome == 'unknown':
+                self.unrecognized += 1
+            else:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'successes': self.successes,
+                'unrecognized': self.unrecognized,
+                'errors': self.errors,
+                'avg_latency': self.total_latency / self.calls if self.calls else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+
+class ASRBackend:
+    """Base class for speech recognition engines.
+
+    Subclasses implement _recognize(audio) and raise sr.UnknownValueError when
+    nothing intelligible was heard and sr.RequestError when the engine failed.
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self.stats = BackendStats()
+
+    def recognize(self, audio):
+        """Recognize an sr.AudioData and return the transcript"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            text = self._recognize(audio)
+            outcome = 'ok'
+            return text
+        except sr.UnknownValueError:
+            outcome = 'unknown'
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            self.stats.record(latency, outcome)
+            tracing.observe("asr_backend_seconds", latency, backend=self.name, outcome=outcome)
+
+    async def recognize_async(self, audio):
+        """Recognize without blocking the event loop"""
+        return await asyncio.to_thread(self.recognize, audio)
+
+    def _recognize(self, audio):
+        raise NotImplementedError
+
+
+class GoogleBackend(ASRBackend):
+    """Google Web Speech API (network round trip per utterance)"""
+
+    name = 'google'
+
+    def __init__(self, recognizer=None, language='en-US', timeout=10.0):
+        super().__init__()
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+        self.timeout = timeout
+
+    def _recognize(self, audio):
+        # operation_timeout bounds the HTTP request made by recognize_google
+        self.recognizer.operation_timeout = self.timeout
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class LocalBackend(ASRBackend):
+    """Offline recognition through one of speech_recognition's local engines.
+
+    engine is 'sphinx' (pocketsphinx), 'whisper' (openai-whisper) or 'vosk'.
+    """
+
+    def __init__(self, engine='sphinx', recognizer=None, **options):
+        super().__init__()
+        self.name = engine
+        self.recognizer = recognizer or sr.Recognizer()
+        self.options = options
+        self._method = getattr(self.recognizer, f"recognize_{engine}", None)
+        if self._method is None:
+            raise ValueError(f"speech_recognition has no local engine named {engine!r}")
+        # Local models are not guaranteed to be thread-safe
+        self._lock = threading.Lock()
+
+    def _recognize(self, audio):
+        with self._lock:
+            text = self._method(audio, **self.options)
+        if isinstance(text, str) and text.startswith('{'):
+            # recognize_vosk returns its raw JSON result
+            import json
+            text = json.loads(text).get('text', '')
+        if not text or not text.strip():
+            raise sr.UnknownValueError()
+        return text.strip()
+
+
+class FakeBackend(ASRBackend):
+    """Deterministic stand-in for tests and offline runs.
+
+    Transcripts come from, in order of preference: a mapping from the SHA-1 of
+    the raw audio bytes, a scripted list returned one per call, or a callable.
+    """
+
+    name = 'fake'
+
+    def __init__(self, transcripts=None, script=None, latency=0.0, default=None):
+        super().__init__()
+        self.transcripts = transcripts or {}
+        self.script = list(script or [])
+        self.latency = latency
+        self.default = default
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(audio):
+        return hashlib.sha1(audio.get_raw_data()).hexdigest()
+
+    def _recognize(self, audio):
+        # latency: fixed seconds, or a callable drawing from a distribution
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        key = self.fingerprint(audio)
+        if key in self.transcripts:
+            return self.transcripts[key]
+        with self._lock:
+            if self.script:
+                text = self.script.pop(0)
+            elif callable(self.default):
+                text = self.default(audio)
+            else:
+                text = self.default
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+def create_backend(name=None, recognizer=None):
+    """Build a backend by name: 'google' (default), 'sphinx', 'whisper', 'vosk' or 'fake'"""
+    name = (name or os.getenv('ASR_BACKEND', 'google')).lower()
+    if name == 'google':
+        return GoogleBackend(recognizer)
+    if name == 'fake':
+        return FakeBackend(default="")
+    return LocalBackend(name, recognizer)
+
+
+class ASRDispatcher:
+    """Runs recognition on a thread pool with ordered fallback across backends.
+
+    Several buffered utterances can be recognised concurrently with submit()
+    or recognize_many(); results always come back in submission order.
+    """
+
+    def __init__(self, backends, max_workers=4):
+        if not backends:
+            raise ValueError("ASRDispatcher needs at least one backend")
+        self.backends = list(backends)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr")
+
+    def recognize(self, audio):
+        """Try each backend in turn; engine failures fall through, silence does not"""
+        last_error = None
+        for backend in self.backends:
+            try:
+                return backend.recognize(audio)
+            except sr.UnknownValueError:
+                raise
+            except Exception as e:
+                last_error = e
+                print(f"ASR backend {backend.name} failed: {e}")
+        raise sr.RequestError(f"All recognition backends failed: {last_error}")
+
+    def submit(self, audio):
+        """Recognize on the pool; returns a Future for the transcript"""
+        return self.executor.submit(self.recognize, audio)
+
+    def recognize_many(self, audios):
+        """Recognize several utterances concurrently, keeping their order"""
+        futures = [self.submit(audio) for audio in audios]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (sr.UnknownValueError, sr.RequestError):
+                results.append(None)
+        return results
+
+    async def recognize_async(self, audio):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.recognize, audio)
+
+    def stats(self):
+        """Per-backend latency and error counters"""
+        return {backend.name: backend.stats.snapshot() for backend in self.backends}
+
+    def fastest_backend(self):
+        """Name of the backend with the lowest average latency among those that succeeded"""
+        candidates = [(s['avg_latency'], name) for name, s in self.stats().items() if s['successes']]
+        return min(candidates)[1] if candidates else None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
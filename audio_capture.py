@@ -0,0 +1,371 @@
+import threading
+import time
+import wave
+import queue
+
+from endpointing import (Endpointer, EndOfTurnModel, FixedPause, NoiseFloor,
+                         SPEECH_START, SPEECH_END, SPEECH_PAUSE, SPEECH_RESUME)
+
+
+class AudioSource:
+    """Base class for anything that produces raw 16-bit mono PCM frames"""
+
+    sample_rate = 16000
+    sample_width = 2
+    chunk_size = 1024  # samples per read
+
+    def open(self):
+        pass
+
+    def read(self):
+        """Return the next block of PCM bytes, or None when the source is exhausted"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MicrophoneSource(AudioSource):
+    """Live microphone input through PyAudio"""
+
+    def __init__(self, device_index=None, sample_rate=16000, chunk_size=1024):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self._audio = None
+        self._stream = None
+
+    def open(self):
+        import pyaudio
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.chunk_size,
+        )
+
+    def read(self):
+        return self._stream.read(self.chunk_size, exception_on_overflow=False)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+
+class WavFileSource(AudioSource):
+    """Replay a mono 16-bit WAV file, optionally paced at real time (or `speed` times faster)"""
+
+    def __init__(self, path, chunk_size=1024, realtime=False, speed=1.0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        self.speed = speed
+        self._wav = None
+        self._next_time = None
+
+    def open(self):
+        self._wav = wave.open(self.path, 'rb')
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != 2:
+            raise ValueError(f"{self.path}: expected mono 16-bit PCM audio")
+        self.sample_rate = self._wav.getframerate()
+        self.sample_width = self._wav.getsampwidth()
+        self._next_time = time.monotonic()
+
+    def read(self):
+        frame = self._wav.readframes(self.chunk_size)
+        if not frame:
+            return None
+        if self.realtime:
+            self._next_time += self.chunk_size / self.sample_rate / self.speed
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return frame
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class GeneratorSource(AudioSource):
+    """Feed frames from any iterable of PCM byte blocks (synthetic audio, tests)"""
+
+    def __init__(self, frames, sample_rate=16000, chunk_size=1024):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self._iterator = None
+
+    def open(self):
+        self._iterator = iter(self.frames)
+
+    def read(self):
+        return next(self._iterator, None)
+
+
+def create_source(spec=None):
+    """Build an audio source from a spec: None/'mic', 'mic:<index>' or a .wav path"""
+    if not spec or spec == 'mic':
+        return MicrophoneSource()
+    if spec.startswith('mic:'):
+        return MicrophoneSource(device_index=int(spec[4:]))
+    if spec.lower().endswith('.wav'):
+        return WavFileSource(spec, realtime=True)
+    raise ValueError(f"Unknown audio source: {spec}")
+
+
+class RingBuffer:
+    """Fixed-size byte ring buffer that hands out contiguous zero-copy views.
+
+    Every byte is written twice (at p and p + capacity), so any window of up to
+    `capacity` bytes is contiguous in memory and can be returned as a memoryview
+    without copying. Positions are absolute byte offsets since the buffer was created.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = bytearray(2 * capacity)
+        self._view = memoryview(self._data)
+        self.write_pos = 0
+        self._lock = threading.Lock()
+
+    def write(self, frame):
+        frame = memoryview(frame)[-self.capacity:]
+        n = len(frame)
+        with self._lock:
+            offset = self.write_pos % self.capacity
+            first = min(n, self.capacity - offset)
+            # Primary copy and mirror copy, split where the frame wraps around
+            self._view[offset:offset + first] = frame[:first]
+            self._view[offset + self.capacity:offset + self.capacity + first] = frame[:first]
+            if first < n:
+                rest = n - first
+                self._view[:rest] = frame[first:]
+                self._view[self.capacity:self.capacity + rest] = frame[first:]
+            self.write_pos += n
+
+    @property
+    def oldest_pos(self):
+        return max(0, self.write_pos - self.capacity)
+
+    def is_available(self, start, end):
+        return self.oldest_pos <= start <= end <= self.write_pos
+
+    def view(self, start, end):
+        """Return a memoryview over [start, end); valid until those bytes are overwritten"""
+        with self._lock:
+            if not self.is_available(start, end):
+                raise ValueError("Requested audio is no longer in the ring buffer")
+            offset = start % self.capacity
+            return self._view[offset:offset + (end - start)]
+
+
+class Utterance:
+    """A detected span of speech, referenced by position in the ring buffer"""
+
+    def __init__(self, ring, start, end, sample_rate, sample_width, started_at, ended_at,
+                 voice_ended_at=None, end_wait=None, forced=False):
+        self.ring = ring
+        self.start = start
+        self.end = end
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.started_at = started_at
+        self.ended_at = ended_at              # when the end of the turn was declared
+        self.voice_ended_at = voice_ended_at  # when the voice actually stopped
+        self.end_wait = end_wait              # silence required before the end was declared
+        self.forced = forced                  # split off a long utterance, the speaker is still going
+
+    @property
+    def duration(self):
+        return (self.end - self.start) / (self.sample_rate * self.sample_width)
+
+    def is_valid(self):
+        return self.ring.is_available(self.start, self.end)
+
+    def view(self):
+        """Zero-copy view of the utterance audio"""
+        return self.ring.view(self.start, self.end)
+
+    def to_audio_data(self):
+        """Convert to a speech_recognition AudioData (copies the bytes once)"""
+        import speech_recognition as sr
+        return sr.AudioData(bytes(self.view()), self.sample_rate, self.sample_width)
+
+
+class AudioCapture:
+    """Long-lived capture thread: reads a source into a ring buffer and cuts utterances.
+
+    Speech detection and the end-of-turn decision are made by an
+    endpointing.Endpointer. With `adaptive_endpointing` the silence it waits
+    for depends on how finished the utterance sounds; otherwise every turn
+    ends after `pause_threshold` seconds of silence. With `tentative_pause`,
+    the audio so far is also handed to the tentative-end callbacks after
+    that much silence, before the end of the turn is certain.
+    """
+
+    def __init__(self, source, buffer_seconds=60.0, pause_threshold=0.8,
+                 pre_roll=0.3, min_utterance=0.3, max_utterance=30.0, max_pending=16,
+                 name="audio-capture", adaptive_endpointing=True, tentative_pause=None):
+        self.name = name
+        self.source = source
+        self.buffer_seconds = buffer_seconds
+        self.pause_threshold = pause_threshold
+        self.pre_roll = pre_roll
+        self.min_utterance = min_utterance
+        self.max_utterance = max_utterance
+        self.adaptive_endpointing = adaptive_endpointing
+        self.tentative_pause = tentative_pause
+        self.noise_floor = NoiseFloor()
+        self.endpointer = None
+        self.utterances = queue.Queue(maxsize=max_pending)
+        self.ring = None
+        self.is_running = False
+        self.is_speaking = False  # True while a participant is mid-utterance
+        self.speech_start_callbacks = []
+        self.tentative_end_callbacks = []
+        self.speech_resume_callbacks = []
+        self.exhausted = threading.Event()
+        self._split_at = None  # ring position where the last forced split happened
+        self._thread = None
+
+    def start(self):
+        """Open the source and start the capture thread"""
+        self.source.open()
+        bytes_per_second = self.source.sample_rate * self.source.sample_width
+        self.ring = RingBuffer(int(self.buffer_seconds * bytes_per_second))
+        model = EndOfTurnModel(self.pause_threshold) if self.adaptive_endpointing else FixedPause(self.pause_threshold)
+        self.endpointer = Endpointer(self.source.sample_rate, self.source.sample_width, model=model,
+                                     noise_floor=self.noise_floor, max_utterance=self.max_utterance,
+                                     tentative_pause=self.tentative_pause)
+        self.is_running = True
+        self.exhausted.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the capture thread and release the source"""
+        self.is_running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.source.close()
+
+    def on_speech_start(self, callback):
+        """Register a callback fired from the capture thread when speech begins"""
+        self.speech_start_callbacks.append(callback)
+
+    def on_tentative_end(self, callback):
+        """Register callback(utterance) fired from the capture thread on a short pause in speech"""
+        self.tentative_end_callbacks.append(callback)
+
+    def on_speech_resume(self, callback):
+        """Register a callback fired when speech carries on after a tentative end"""
+        self.speech_resume_callbacks.append(callback)
+
+    def hint_transcript(self, utterance, text):
+        """What a tentative utterance said, so the endpointer can judge whether the turn is over"""
+        if self.endpointer is not None:
+            self.endpointer.set_transcript_hint(text, utterance.end)
+
+    def get_utterance(self, timeout=None):
+        """Block until the next utterance is available; None on timeout or end of source"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return self.utterances.get(timeout=0.1 if remaining is None else min(0.1, remaining))
+            except queue.Empty:
+                if self.exhausted.is_set() and self.utterances.empty():
+                    return None
+                if remaining is not None and remaining <= 0:
+                    return None
+
+    def _run(self):
+        bytes_per_second = self.source.sample_rate * self.source.sample_width
+        pre_roll_bytes = int(self.pre_roll * bytes_per_second)
+        min_bytes = int(self.min_utterance * bytes_per_second)
+
+        # Endpointer positions count the bytes fed to it, which are exactly the
+        # bytes written to the ring, so they are ring positions as well
+        speech_start = None
+        started_at = None
+        try:
+            while self.is_running:
+                frame = self.source.read()
+                if frame is None:
+                    break
+                if not frame:
+                    continue
+                self.ring.write(frame)
+                for event in self.endpointer.process(frame):
+                    now = time.time()
+                    if event.kind == SPEECH_START:
+                        if speech_start is not None:
+                            continue
+                        if event.position == self._split_at:
+                            speech_start = event.position  # continuation of a split utterance
+                        else:
+                            speech_start = max(self.ring.oldest_pos, event.position - pre_roll_bytes)
+                        started_at = now - (self.ring.write_pos - event.position) / bytes_per_second
+                        if not self.is_speaking:
+                            self.is_speaking = True
+                            self._notify(self.speech_start_callbacks)
+                    elif event.kind == SPEECH_PAUSE and speech_start is not None:
+                        # Provisional: the same span is emitted again if this turns out to be the end
+                        voice_ended_at = now - (self.ring.write_pos - event.position) / bytes_per_second
+                        if event.position - speech_start >= min_bytes:
+                            self._notify(self.tentative_end_callbacks,
+                                         Utterance(self.ring, speech_start, event.position, self.source.sample_rate,
+                                                   self.source.sample_width, started_at, now, voice_ended_at))
+                    elif event.kind == SPEECH_RESUME:
+                        self._notify(self.speech_resume_callbacks)
+                    elif event.kind == SPEECH_END and speech_start is not None:
+                        voice_ended_at = now - (self.ring.write_pos - event.position) / bytes_per_second
+                        self._emit(speech_start, event.position, min_bytes, started_at,
+                                   voice_ended_at, event.wait, event.forced)
+                        speech_start = None
+                        self._split_at = event.position if event.forced else None
+                        self.is_speaking = event.forced
+
+            if speech_start is not None:
+                self._emit(speech_start, self.ring.write_pos, min_bytes, started_at)
+        except Exception as e:
+            print(f"Audio capture stopped: {e}")
+        finally:
+            self.is_speaking = False
+            self.exhausted.set()
+
+    @staticmethod
+    def _notify(callbacks, *args):
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in capture callback: {e}")
+
+    def _emit(self, start, end, min_bytes, started_at, voice_ended_at=None, end_wait=None, forced=False):
+        if end - start < min_bytes and not forced:
+            return
+        start = max(start, self.ring.oldest_pos)
+        utterance = Utterance(self.ring, start, end, self.source.sample_rate,
+                              self.source.sample_width, started_at, time.time(),
+                              voice_ended_at, end_wait, forced)
+        try:
+            self.utterances.put_nowait(utterance)
+        except queue.Full:
+            print("Utterance queue full; dropping oldest utterance")
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                pass
+            self.utterances.put_nowait(utterance)
@@ -0,0 +1,125 @@
+"""Compare the local dialogue backend against the plain fp32 pipeline.
+
+    python benchmark_local_model.py --turns 6 --max-new-tokens 40 --sessions 4
+
+The baseline does what pipeline("conversational") did: every turn re-encodes
+the whole conversation in fp32 and only returns once generation finishes, so
+its first-token latency is the full generation time. The optimised runs use
+ai_agent.LocalDialogueModel (int8, KV-cache reuse, streaming), once for a
+single session and once with several sessions decoding as a batch.
+Decoding is greedy so every configuration generates comparable replies.
+"""
+import argparse
+import json
+import threading
+import time
+
+from ai_agent import MODEL_NAME, LocalDialogueModel
+from hedging import percentile
+
+PROMPTS = [
+    "Hi, can you hear me?",
+    "Let's go through the roadmap for next quarter.",
+    "What do you think about moving the launch to May?",
+    "The design team needs two more weeks for the onboarding flow.",
+    "Can you summarise what we agreed so far?",
+    "Who should own the follow-up with marketing?",
+    "Any risks we haven't talked about?",
+    "Great, let's wrap up there.",
+]
+
+
+def summarize(name, first_token, tokens, seconds):
+    return {
+        'config': name,
+        'turns': len(first_token),
+        'first_token_p50_ms': round(percentile(first_token, 50) * 1000, 1),
+        'first_token_p95_ms': round(percentile(first_token, 95) * 1000, 1),
+        'tokens': tokens,
+        'tokens_per_sec': round(tokens / seconds, 1) if seconds else None,
+    }
+
+
+def bench_baseline(model_name, turns, max_new_tokens, threads):
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    if threads:
+        torch.set_num_threads(threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name).eval()
+    history = []
+    first_token, tokens, busy = [], 0, 0.0
+    with torch.inference_mode():
+        for prompt in PROMPTS[:turns]:
+            started = time.perf_counter()
+            history += tokenizer.encode(prompt) + [tokenizer.eos_token_id]
+            output = model.generate(torch.tensor([history]), max_new_tokens=max_new_tokens, do_sample=False,
+                                    pad_token_id=tokenizer.eos_token_id)
+            reply = output[0, len(history):].tolist()
+            elapsed = time.perf_counter() - started
+            history += reply if reply and reply[-1] == tokenizer.eos_token_id else reply + [tokenizer.eos_token_id]
+            first_token.append(elapsed)
+            tokens += len([t for t in reply if t != tokenizer.eos_token_id])
+            busy += elapsed
+    return summarize("fp32 pipeline (full history)", first_token, tokens, busy)
+
+
+def run_turn(model, prompt, session_id, max_new_tokens, first_token):
+    reply = model.stream(prompt, session_id, max_new_tokens)
+    for _ in reply:
+        pass
+    finished = time.monotonic()
+    first_token.append((reply.first_token_at or finished) - reply.submitted)
+
+
+def bench_local(model, turns, max_new_tokens, sessions=1):
+    first_token = []
+    tokens_before = model.stats['tokens']
+    started = time.perf_counter()
+    for prompt in PROMPTS[:turns]:
+        threads = [threading.Thread(target=run_turn,
+                                    args=(model, prompt, f"bench-{sessions}-{i}", max_new_tokens,
+                                          first_token))
+                   for i in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    name = f"{'int8' if model.quantize else 'fp32'} + KV reuse, {sessions} session(s)"
+    return summarize(name, first_token, model.stats['tokens'] - tokens_before, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local dialogue backend")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--max-new-tokens", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions for the batched run")
+    parser.add_argument("--no-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    if not args.no_baseline:
+        results.append(bench_baseline(args.model, args.turns, args.max_new_tokens, args.threads))
+    for quantize in (False, True):
+        model = LocalDialogueModel(args.model, quantize=quantize, threads=args.threads,
+                                   max_batch=max(1, args.sessions), temperature=0)
+        model.load()
+        results.append(bench_local(model, args.turns, args.max_new_tokens))
+        if args.sessions > 1:
+            results.append(bench_local(model, args.turns, args.max_new_tokens, args.sessions))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'config':<40} {'turns':>5} {'p50 first':>10} {'p95 first':>10} {'tokens':>7} {'tok/s':>7}")
+    for r in results:
+        print(f"{r['config']:<40} {r['turns']:>5} {r['first_token_p50_ms']:>8.1f}ms "
+              f"{r['first_token_p95_ms']:>8.1f}ms {r['tokens']:>7} {r['tokens_per_sec'] or 0:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
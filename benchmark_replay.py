@@ -0,0 +1,466 @@
+"""Replay recorded (or synthetic) meeting audio through the full agent pipeline.
+
+    python benchmark_replay.py --synthetic 12 --sessions 2 --save run.json
+    python benchmark_replay.py --audio-dir recordings/ --compare run.json
+
+Audio goes through the same path as a live meeting: AudioCapture ->
+recognition -> response -> TTS -> MeetingNotesTaker, driven by
+sessions.MeetingSession. The outside world is replaced by deterministic
+stand-ins:
+
+- Speech recognition is asr_backends.FakeBackend. Transcripts come from
+  <name>.txt files next to the WAVs (one line per utterance) or a built-in
+  script, and its latency is drawn from a seeded distribution.
+- The OpenAI API is mock_openai_server, run in-process behind the real
+  gateway, with a normal or lognormal latency distribution.
+- pyttsx3 and the audio output are fakes. They render and "play" silence
+  for as long as the text would take to speak.
+
+The report covers:
+- end-to-end turn latency: end of speech to first audio, and end of speech
+  to end of playback, each at p50/p95/p99
+- the per-stage breakdown
+- notes lag
+- throughput
+
+--compare flags any metric that got worse than a saved run by more than
+--tolerance, and exits non-zero.
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from datetime import datetime, timezone
+
+import tracing
+from mock_openai_server import MockBehaviour, start_server
+
+SAMPLE_RATE = 16000
+
+SCRIPT = [
+    "Hi everyone, can you hear me?",
+    "Let's go through the roadmap for next quarter.",
+    "What do you think about moving the launch to May?",
+    "The design team needs two more weeks for the onboarding flow.",
+    "Can you summarise what we agreed so far?",
+    "Who should own the follow-up with marketing?",
+    "Any risks we haven't talked about?",
+    "I think the pricing page needs another round of testing.",
+    "How would you measure whether the new flow is working?",
+    "Great, let's wrap up there.",
+]
+
+REPLIES = [
+    "Good point. What would you test first?",
+    "Interesting. Who feels that risk the most?",
+    "Agreed. What does done look like here?",
+]
+
+# Metrics compared between runs: key -> True when higher is better
+COMPARED = {
+    'response_latency.p50': False,
+    'response_latency.p95': False,
+    'response_latency.p99': False,
+    'turn_total.p95': False,
+    'notes_lag.p95': False,
+    'turns_per_minute': True,
+}
+
+
+# -- audio -----------------------------------------------------------------
+
+def synthetic_utterance(duration, rng, amplitude=6000):
+    """A voiced-sounding burst: a few harmonics with a syllable-rate envelope,
+    declining over the last 0.6 s like a finished sentence"""
+    pitch = rng.uniform(100, 220)
+    samples = []
+    n = int(duration * SAMPLE_RATE)
+    decline = int(0.6 * SAMPLE_RATE)
+    for i in range(n):
+        t = i / SAMPLE_RATE
+        envelope = (0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)) * min(1.0, 0.25 + 0.75 * (n - i) / decline)
+        value = sum(math.sin(2 * math.pi * pitch * k * t) / k for k in (1, 2, 3))
+        samples.append(int(amplitude * envelope * value / 1.8))
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+def silence(duration):
+    return b"\0\0" * int(duration * SAMPLE_RATE)
+
+
+def write_wav(path, frames, sample_rate=SAMPLE_RATE):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(frames)
+
+
+def synthetic_meeting(path, utterances, gap, seed):
+    """Write a WAV of `utterances` bursts separated by `gap` seconds of silence"""
+    rng = random.Random(seed)
+    parts = [silence(1.0)]
+    for _ in range(utterances):
+        parts.append(synthetic_utterance(rng.uniform(0.8, 2.5), rng))
+        parts.append(silence(gap))
+    write_wav(path, b"".join(parts))
+    return SCRIPT * (utterances // len(SCRIPT) + 1)
+
+
+def recorded_meeting(path, audio_dir, gap):
+    """Concatenate a directory of mono 16-bit WAVs into one meeting; returns its transcripts"""
+    names = sorted(name for name in os.listdir(audio_dir) if name.lower().endswith('.wav'))
+    if not names:
+        raise SystemExit(f"No .wav files in {audio_dir}")
+    parts, transcripts, sample_rate = [], [], None
+    for name in names:
+        with wave.open(os.path.join(audio_dir, name), 'rb') as f:
+            if f.getnchannels() != 1 or f.getsampwidth() != 2:
+                raise SystemExit(f"{name}: expected mono 16-bit PCM audio")
+            if sample_rate not in (None, f.getframerate()):
+                raise SystemExit(f"{name}: all files must share one sample rate")
+            sample_rate = f.getframerate()
+            parts.append(f.readframes(f.getnframes()))
+        parts.append(b"\0\0" * int(gap * sample_rate))
+        sidecar = os.path.join(audio_dir, os.path.splitext(name)[0] + '.txt')
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding='utf-8') as f:
+                transcripts.extend(line.strip() for line in f if line.strip())
+    write_wav(path, b"".join(parts), sample_rate)
+    return transcripts or SCRIPT
+
+
+def audio_seconds(path):
+    with wave.open(path, 'rb') as f:
+        return f.getnframes() / f.getframerate()
+
+
+# -- stand-ins ---------------------------------------------------------------
+
+def mock_reply(messages):
+    """Short agent replies, and well-formed JSON for the batch notes summarizer"""
+    system = messages[0]['content'] if messages else ""
+    last = messages[-1]['content'] if messages else ""
+    if "JSON array" in system:
+        lines = [line for line in last.splitlines() if line.strip()]
+        return json.dumps([f"- {line.split('. ', 1)[-1][:60]}" for line in lines])
+    if "summar" in system.lower():
+        return f"- {last[:60]}"
+    return REPLIES[len(last) % len(REPLIES)]
+
+
+def latency_sampler(mean, jitter, seed):
+    """Seeded normal latency in seconds, never negative"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def sample():
+        with lock:
+            return max(0.0, rng.gauss(mean, jitter))
+    return sample
+
+
+class FakeSpeechEngine:
+    """pyttsx3 engine stand-in: renders silence as long as the text takes to say"""
+
+    def __init__(self, render_seconds=0.05, render_per_char=0.001, words_per_minute=150,
+                 sample_rate=22050):
+        self.render_seconds = render_seconds
+        self.render_per_char = render_per_char
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+        self.properties = {'rate': 150, 'volume': 0.9, 'voice': 'fake'}
+        self._pending = []
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def getProperty(self, name):
+        return self.properties.get(name)
+
+    def duration(self, text):
+        return max(0.2, len(text.split()) * 60.0 / self.words_per_minute)
+
+    def save_to_file(self, text, path):
+        self._pending.append(('save', text, path))
+
+    def say(self, text):
+        self._pending.append(('say', text, None))
+
+    def runAndWait(self):
+        pending, self._pending = self._pending, []
+        for kind, text, path in pending:
+            if kind == 'save':
+                time.sleep(self.render_seconds + self.render_per_char * len(text))
+                write_wav(path, silence(self.duration(text) * self.sample_rate / SAMPLE_RATE),
+                          self.sample_rate)
+            else:
+                time.sleep(self.duration(text))
+
+    def stop(self):
+        self._pending = []
+
+
+class FakeOutputStream:
+    """PyAudio output stream stand-in that takes as long as real playback would"""
+
+    def __init__(self, rate, channels, sample_width, speed):
+        self.bytes_per_second = rate * channels * sample_width * speed
+
+    def write(self, data):
+        time.sleep(len(data) / self.bytes_per_second)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install_fake_audio_output(engine, speed=1.0):
+    """Make `import pyttsx3` / `import pyaudio` resolve to the stand-ins for this process"""
+    pyttsx3 = types.ModuleType('pyttsx3')
+    pyttsx3.init = lambda *args, **kwargs: engine
+    pyaudio = types.ModuleType('pyaudio')
+
+    class PyAudio:
+        def get_format_from_width(self, width):
+            return width
+
+        def open(self, format, channels, rate, output=False, output_device_index=None, **kwargs):
+            return FakeOutputStream(rate, channels, format, speed)
+
+        def terminate(self):
+            pass
+
+    pyaudio.PyAudio = PyAudio
+    pyaudio.paInt16 = 2
+    sys.modules['pyttsx3'] = pyttsx3
+    sys.modules['pyaudio'] = pyaudio
+
+
+class _Pool:
+    """Browser pool stand-in: there is no meeting page to join"""
+
+    def acquire(self, timeout=None):
+        return object()
+
+    def release(self, driver, healthy=True):
+        pass
+
+
+# -- run -------------------------------------------------------------------
+
+def snapshot(histogram):
+    return {k: v for k, v in histogram.snapshot().items() if k in ('count', 'p50', 'p95', 'p99', 'mean')}
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.chdir(workdir)  # notes, journals and the TTS cache stay out of the checkout
+    meeting_wav = os.path.join(workdir, "meeting.wav")
+    if args.audio_dir:
+        transcripts = recorded_meeting(meeting_wav, os.path.abspath(args.audio_dir), args.gap)
+    else:
+        transcripts = synthetic_meeting(meeting_wav, args.synthetic, args.gap, args.seed)
+
+    behaviour = MockBehaviour(args.llm_latency, args.llm_jitter, args.token_delay,
+                              error_rate=args.llm_error_rate, reply=mock_reply, seed=args.seed,
+                              distribution=args.llm_distribution)
+    server, base_url = start_server(behaviour)
+    os.environ.update({
+        'OPENAI_BASE_URL': base_url,
+        'OPENAI_API_KEY': 'replay',
+        'ASR_BACKEND': 'fake',
+        'RESPONSE_CACHE_SIZE': '256' if args.cache else '0',
+        'LOCAL_FALLBACK': '0',
+        'NOTES_FSYNC': 'never',
+    })
+    install_fake_audio_output(FakeSpeechEngine(args.tts_latency, args.tts_per_char), args.speed)
+    tracing.enable(args.trace)
+    main = importlib.import_module('main')
+    from asr_backends import FakeBackend
+    from audio_capture import WavFileSource
+    from meeting_schedule import Meeting
+    from sessions import SharedServices, SessionManager
+    import sessions
+
+    main.asr.backends = [FakeBackend(script=transcripts * args.sessions,
+                                     latency=latency_sampler(args.asr_latency, args.asr_jitter, args.seed),
+                                     default="Could you say more about that?")]
+
+    services = SharedServices(
+        asr=main.asr,
+        tts=main.get_tts_service(),
+        browser_pool=_Pool(),
+        join=lambda driver, url: True,
+        reply=main.generate_response_with_acknowledgment_and_followup,
+        stream_reply=main.stream_response_with_acknowledgment_and_followup,
+        new_notes_taker=lambda name: main.MeetingNotesTaker(name=name),
+        new_context=main.new_conversation,
+        system_prompt=main.AGENT_SYSTEM_PROMPT,
+        turn_budget=main.TURN_BUDGET,
+        stream_responses=not args.no_stream,
+        pipeline_turns=not args.serial,
+        termination_keyword=main.TERMINATION_KEYWORD,
+        pause_threshold=args.pause_threshold,
+        adaptive_endpointing=args.endpointing == 'adaptive',
+        speculate=args.speculate,
+        tentative_pause=args.tentative_pause,
+    )
+    # Every session replays the same meeting, paced at `speed` times real time
+    replay = lambda: WavFileSource(meeting_wav, realtime=True, speed=args.speed)
+    manager = SessionManager(services, [replay] * args.sessions, [None] * args.sessions, args.sessions)
+    started = time.monotonic()
+    for i in range(args.sessions):
+        manager.start(Meeting(f"replay-{i}", f"Replay {i}", datetime.now(timezone.utc), ""))
+    manager.wait()
+    elapsed = time.monotonic() - started
+
+    tracer = tracing.get_tracer()
+    stages = {stage: snapshot(h) for (name, labels), h in tracer.histograms.items()
+              if name == 'turn_stage_seconds' for stage in [dict(labels)['stage']]}
+    turns = sum(s.usage['turns'] for s in manager.sessions)
+    speculation = {}
+    for session in manager.sessions:
+        if session.speculator is not None:
+            for key, value in session.speculator.stats_counts.items():
+                speculation[key] = speculation.get(key, 0) + value
+    if speculation.get('llm_calls'):
+        speculation['hit_rate'] = round(speculation['hits'] / speculation['llm_calls'], 3)
+    result = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('save', 'compare', 'json', 'trace')},
+        'sessions': args.sessions,
+        'audio_seconds': round(audio_seconds(meeting_wav) * args.sessions, 1),
+        'wall_seconds': round(elapsed, 1),
+        'turns': turns,
+        'turns_per_minute': round(turns / elapsed * 60, 2) if elapsed else None,
+        'cancelled_turns': tracer.counters.get(('turns_total', (('outcome', 'cancelled'),)), 0),
+        'realtime_factor': round(audio_seconds(meeting_wav) / args.speed / elapsed, 2) if elapsed else None,
+        'response_latency': stages.get('response_latency', {}),
+        'turn_total': stages.get('turn_total', {}),
+        'stages': stages,
+        'notes_lag': snapshot(tracer.histogram('notes_lag_seconds')),
+        'notes': sum(len(s.notes_taker.meeting_notes) for s in manager.sessions),
+        'llm_requests': behaviour.requests,
+        'speculation': speculation,
+        'failed_sessions': [s.id for s in manager.sessions if s.state != sessions.ENDED],
+    }
+    tracing.shutdown()
+    server.shutdown()
+    return result
+
+
+# -- reporting ---------------------------------------------------------------
+
+def metric(result, key):
+    value = result
+    for part in key.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare(baseline, result, tolerance):
+    """(key, baseline, current, change, regressed) for every compared metric both runs have"""
+    rows = []
+    for key, higher_is_better in COMPARED.items():
+        before, after = metric(baseline, key), metric(result, key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better else change
+        rows.append((key, before, after, change, worse > tolerance))
+    return rows
+
+
+def ms(value):
+    return f"{value * 1000:8.1f}ms" if value is not None else f"{'-':>10}"
+
+
+def print_report(result):
+    print(f"{result['sessions']} session(s), {result['audio_seconds']}s of audio in {result['wall_seconds']}s: "
+          f"{result['turns']} turns ({result['turns_per_minute']}/min, {result['cancelled_turns']} barged in), "
+          f"{result['notes']} notes, {result['llm_requests']} LLM requests")
+    print(f"{'stage':<20} {'count':>6} {'p50':>10} {'p95':>10} {'p99':>10}")
+    rows = list(result['stages'].items()) + [('notes_lag', result['notes_lag'])]
+    for name, s in rows:
+        print(f"{name:<20} {s.get('count', 0):>6} {ms(s.get('p50'))} {ms(s.get('p95'))} {ms(s.get('p99'))}")
+    spec = result.get('speculation')
+    if spec:
+        print(f"Speculation: {spec['hits']} hits of {spec['llm_calls']} speculative requests "
+              f"(hit rate {spec.get('hit_rate')}), {spec['wasted_llm_calls']} LLM and "
+              f"{spec['wasted_asr_calls']} ASR calls wasted")
+    if result['failed_sessions']:
+        print(f"Sessions that did not finish cleanly: {', '.join(result['failed_sessions'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay meeting audio through the agent pipeline")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--audio-dir", help="directory of mono 16-bit WAVs (optional <name>.txt transcripts)")
+    source.add_argument("--synthetic", type=int, default=10, help="number of synthetic utterances")
+    parser.add_argument("--gap", type=float, default=5.0, help="seconds of silence after each utterance")
+    parser.add_argument("--sessions", type=int, default=1, help="concurrent meetings replaying the audio")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay and playback speed-up")
+    parser.add_argument("--serial", action="store_true", help="serial listen_and_respond turns")
+    parser.add_argument("--no-stream", action="store_true", help="wait for the full reply before speaking")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--pause-threshold", type=float, default=0.8)
+    parser.add_argument("--speculate", action="store_true",
+                        help="start recognition and the reply on tentative pauses (see speculation.py)")
+    parser.add_argument("--tentative-pause", type=float, default=0.25)
+    parser.add_argument("--endpointing", choices=("adaptive", "fixed"), default="adaptive",
+                        help="end-of-turn detection in the capture (see endpointing.py)")
+    parser.add_argument("--asr-latency", type=float, default=0.25)
+    parser.add_argument("--asr-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-distribution", choices=["normal", "lognormal"], default="normal")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="fixed render time per sentence")
+    parser.add_argument("--tts-per-char", type=float, default=0.001, help="render time per character")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", help="also write per-turn traces to this JSONL file")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    for name in ('audio_dir', 'trace', 'save', 'compare'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, result, args.tolerance)
+        print(f"\n{'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+        for key, before, after, change, regressed in rows:
+            print(f"{key:<24} {before:>10.3f} {after:>10.3f} {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
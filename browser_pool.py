@@ -0,0 +1,206 @@
+import threading
+import time
+
+
+class PooledBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class BrowserPool:
+    """Pool of pre-launched, pre-configured browser sessions.
+
+    `factory()` creates a configured driver (or returns None on failure). The
+    pool keeps `size` browsers launched in the background so a join never
+    waits for a cold Chrome start. Browsers are health-checked before they are
+    handed out, retired after `max_uses` meetings or a failure, and idle
+    browsers above `size` are quit after `idle_timeout` seconds. At most
+    `max_size` browsers exist at once, which caps memory use.
+    """
+
+    def __init__(self, factory, size=1, max_size=3, idle_timeout=900.0, max_uses=10,
+                 blank_url="about:blank"):
+        self.factory = factory
+        self.size = size
+        self.max_size = max(size, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self.blank_url = blank_url
+        self._idle = []
+        self._in_use = {}  # id(driver) -> PooledBrowser
+        self._launching = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._maintainer = None
+        self.counters = {'launched': 0, 'launch_failures': 0, 'reused': 0, 'recycled': 0,
+                         'failed_health_checks': 0, 'evicted': 0}
+        self._launch_seconds = 0.0
+
+    def start(self):
+        """Launch the warm browsers in the background"""
+        self._maintainer = threading.Thread(target=self._maintain, name="browser-pool", daemon=True)
+        self._maintainer.start()
+        return self
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._launching
+
+    # -- launching and retiring ---------------------------------------------
+
+    def _launch(self):
+        """Create one browser; the caller has already counted it in _launching"""
+        started = time.monotonic()
+        try:
+            driver = self.factory()
+        except Exception as e:
+            print(f"Error launching browser: {e}")
+            driver = None
+        with self._cond:
+            self._launching -= 1
+            if driver is None:
+                self.counters['launch_failures'] += 1
+            else:
+                self.counters['launched'] += 1
+                self._launch_seconds += time.monotonic() - started
+            self._cond.notify_all()
+        return PooledBrowser(driver) if driver is not None else None
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+    def _healthy(self, browser):
+        try:
+            return browser.driver.execute_script("return 1") == 1 and bool(browser.driver.window_handles)
+        except Exception:
+            return False
+
+    def _maintain(self):
+        """Keep `size` browsers warm and evict ones that sat idle too long"""
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                expired = []
+                # Oldest idle browsers are at the front; keep at least `size` of them
+                while len(self._idle) > self.size and now - self._idle[0].last_used > self.idle_timeout:
+                    expired.append(self._idle.pop(0))
+                self.counters['evicted'] += len(expired)
+                launch = len(self._idle) + self._launching < self.size and self._total() < self.max_size
+                if launch:
+                    self._launching += 1
+            for browser in expired:
+                self._quit(browser)
+            if launch:
+                browser = self._launch()
+                if browser is None:
+                    time.sleep(5)  # don't spin if Chrome cannot start
+                    continue
+                with self._cond:
+                    if self._closed:
+                        closed = True
+                    else:
+                        closed = False
+                        self._idle.append(browser)
+                        self._cond.notify_all()
+                if closed:
+                    self._quit(browser)
+                continue
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(min(self.idle_timeout, 30.0))
+
+    # -- public API -----------------------------------------------------------
+
+    def acquire(self, timeout=None):
+        """Hand out a healthy driver, launching one if none is warm; None on failure or timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            browser = None
+            launch = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return None
+                    if self._idle:
+                        browser = self._idle.pop()  # most recently used first
+                        break
+                    if self._total() < self.max_size:
+                        self._launching += 1
+                        launch = True
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            if launch:
+                browser = self._launch()
+                if browser is None:
+                    return None
+            elif not self._healthy(browser):
+                with self._cond:
+                    self.counters['failed_health_checks'] += 1
+                    self._cond.notify_all()
+                self._quit(browser)
+                continue
+            else:
+                with self._cond:
+                    self.counters['reused'] += 1
+            with self._cond:
+                browser.uses += 1
+                browser.last_used = time.monotonic()
+                self._in_use[id(browser.driver)] = browser
+                self._cond.notify_all()  # let the maintainer refill the warm set
+            return browser.driver
+
+    def release(self, driver, healthy=True):
+        """Return a driver after a meeting; unhealthy or worn-out browsers are replaced"""
+        if driver is None:
+            return
+        with self._cond:
+            browser = self._in_use.pop(id(driver), None)
+        if browser is None:
+            self._quit(PooledBrowser(driver))
+            return
+        if healthy and not self._closed:
+            try:
+                driver.get(self.blank_url)  # leaves the call and frees the page's memory
+            except Exception:
+                healthy = False
+        with self._cond:
+            keep = healthy and not self._closed and browser.uses < self.max_uses
+            if keep:
+                browser.last_used = time.monotonic()
+                self._idle.append(browser)
+            else:
+                self.counters['recycled'] += 1
+            self._cond.notify_all()
+        if not keep:
+            self._quit(browser)
+
+    def shutdown(self):
+        """Quit every browser, including ones still handed out"""
+        with self._cond:
+            self._closed = True
+            browsers = self._idle + list(self._in_use.values())
+            self._idle = []
+            self._in_use.clear()
+            self._cond.notify_all()
+        for browser in browsers:
+            self._quit(browser)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['launching'] = self._launching
+            launched = self.counters['launched']
+            stats['avg_launch_seconds'] = round(self._launch_seconds / launched, 2) if launched else None
+        return stats
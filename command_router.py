@@ -0,0 +1,219 @@
+"""Local handling of spoken control phrases.
+
+"Repeat that", "stop talking", "pause the notes", "summarize so far" and
+the termination keyword are recognised here, without a round trip to the
+LLM. The CommandRouter compiles every command phrase once into an
+Aho-Corasick automaton over words, so one pass over a transcript finds
+all phrases in it.
+
+Transcript words that are not in the command vocabulary are mapped to a
+vocabulary word within one edit ("repeet", "talkin"), using a
+precomputed index of single-letter deletions. Only words of five letters
+or more are mapped this way, and only inside phrases of two words or more:
+a one-word command ("quiet", "summary") and the termination phrases must
+be heard exactly, so "Quite." does not mute the agent and "Terminated."
+does not end the meeting.
+
+A phrase only counts as a command when the rest of the utterance is
+politeness or a wake word ("hey agent, could you repeat that please").
+So "we should terminate that contract" is ordinary conversation, not a
+command. Commands that take an argument ("take a note ...") treat
+everything after the phrase as the argument.
+"""
+import re
+import time
+from collections import deque
+
+import tracing
+
+# Words that may surround a command without making it part of a sentence
+FILLER_WORDS = {
+    "hey", "hi", "ok", "okay", "so", "please", "agent", "assistant", "ai", "can", "could", "would",
+    "will", "you", "just", "now", "thanks", "thank", "right", "alright", "well", "um", "uh", "go",
+    "ahead", "and",
+}
+
+# name -> (phrases, takes_argument). The termination phrases are added from the keyword.
+DEFAULT_COMMANDS = {
+    'repeat': (["repeat", "repeat that", "repeat yourself", "repeat the last answer", "say that again",
+                "say again", "come again", "what did you say", "what was that"], False),
+    'mute': (["mute", "stop talking", "be quiet", "quiet", "shut up", "stop speaking",
+              "don't talk", "stay quiet"], False),
+    'unmute': (["unmute", "you can talk again", "you can speak again", "start talking again",
+                "speak again"], False),
+    'louder': (["louder", "speak up", "speak louder", "talk louder", "volume up", "turn it up"], False),
+    'quieter': (["quieter", "softer", "speak softer", "talk quieter", "volume down", "turn it down",
+                 "too loud"], False),
+    'pause_notes': (["pause notes", "pause the notes", "pause note taking", "stop taking notes",
+                     "off the record"], False),
+    'resume_notes': (["resume notes", "resume the notes", "resume note taking", "start taking notes",
+                      "back on the record", "on the record"], False),
+    'take_note': (["take a note", "make a note", "add a note", "note down"], True),
+    'summary': (["summarize", "summarize so far", "summarize the meeting", "summary",
+                 "give me a summary", "read the summary", "what have we covered",
+                 "recap", "give me a recap"], False),
+}
+
+TERMINATION_PHRASES = ["{keyword}", "{keyword} the meeting", "{keyword} the call", "{keyword} now",
+                       "end the meeting", "leave the meeting", "leave the call"]
+
+
+def tokenize(text):
+    """(word, offset) pairs: lower-case words with punctuation and apostrophes dropped"""
+    tokens = []
+    for m in re.finditer(r"[A-Za-z0-9']+", text or ""):
+        word = m.group().lower().replace("'", "")
+        if word:
+            tokens.append((word, m.start()))
+    return tokens
+
+
+def normalize(text):
+    return [word for word, _ in tokenize(text)]
+
+
+def edit_distance(a, b, limit=1):
+    """Damerau-Levenshtein distance between two words, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def default_commands(termination_keyword="terminate"):
+    commands = dict(DEFAULT_COMMANDS)
+    commands['terminate'] = ([p.format(keyword=termination_keyword) for p in TERMINATION_PHRASES], False)
+    return commands
+
+
+class CommandMatch:
+    def __init__(self, name, phrase, argument=""):
+        self.name = name
+        self.phrase = phrase
+        self.argument = argument
+
+    def __repr__(self):
+        return f"CommandMatch({self.name!r}, {self.argument!r})"
+
+
+class CommandRouter:
+    """Matches transcripts against command phrases; compiled once, then read-only and thread-safe"""
+
+    def __init__(self, commands=None, filler_words=FILLER_WORDS, fuzzy_min_length=5,
+                 exact_commands=("terminate",)):
+        commands = commands if commands is not None else default_commands()
+        self.filler_words = set(filler_words)
+        self.fuzzy_min_length = fuzzy_min_length
+        self.exact_commands = set(exact_commands)
+        self._patterns = []  # (command name, phrase words, takes_argument)
+        for name, (phrases, takes_argument) in commands.items():
+            for phrase in phrases:
+                words = tuple(normalize(phrase))
+                if words:
+                    self._patterns.append((name, words, takes_argument))
+        self._vocabulary = {w for _, words, _ in self._patterns for w in words}
+        self._deletions = {}  # word or word minus one letter -> vocabulary words
+        for word in self._vocabulary:
+            if len(word) >= self.fuzzy_min_length:
+                for variant in self._variants(word):
+                    self._deletions.setdefault(variant, set()).add(word)
+        self._build_automaton()
+
+    # -- compilation ----------------------------------------------------------
+
+    def _build_automaton(self):
+        # Trie over words: node -> {word: child}; outputs are pattern indices ending at a node
+        self._goto = [{}]
+        self._outputs = [[]]
+        for index, (_, words, _) in enumerate(self._patterns):
+            node = 0
+            for word in words:
+                child = self._goto[node].get(word)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][word] = child
+                    self._goto.append({})
+                    self._outputs.append([])
+                node = child
+            self._outputs[node].append(index)
+        # Breadth-first failure links; each node inherits the outputs of its failure node
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for word, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                pending.append(child)
+
+    @staticmethod
+    def _variants(word):
+        return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+    # -- matching ---------------------------------------------------------------
+
+    def canonical(self, word):
+        """The vocabulary word a transcript word stands for (itself if none is within one edit)"""
+        if word in self._vocabulary or len(word) < self.fuzzy_min_length:
+            return word
+        candidates = set()
+        for variant in self._variants(word):
+            candidates.update(self._deletions.get(variant, ()))
+        best = min(candidates, key=lambda c: (edit_distance(word, c), c), default=None)
+        if best is not None and edit_distance(word, best) <= 1:
+            return best
+        return word
+
+    def find(self, words):
+        """Every (start, end, pattern index) where a phrase occurs in a list of canonical words"""
+        found = []
+        node = 0
+        for position, word in enumerate(words):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for index in self._outputs[node]:
+                length = len(self._patterns[index][1])
+                found.append((position + 1 - length, position + 1, index))
+        return found
+
+    def match(self, text):
+        """The command a transcript is, or None when it is ordinary conversation"""
+        started = time.perf_counter()
+        tokens = tokenize(text)
+        heard = [w for w, _ in tokens]
+        words = [self.canonical(w) for w in heard]
+        best = None
+        for start, end, index in self.find(words):
+            name, phrase, takes_argument = self._patterns[index]
+            if (len(phrase) == 1 or name in self.exact_commands) and tuple(heard[start:end]) != phrase:
+                continue
+            if not all(w in self.filler_words for w in words[:start]):
+                continue
+            rest = words[end:]
+            if takes_argument:
+                argument = text[tokens[end][1]:].strip() if end < len(tokens) else ""
+            elif all(w in self.filler_words for w in rest):
+                argument = ""
+            else:
+                continue
+            # The longest phrase wins: "repeat the last answer" over "repeat"
+            if best is None or end - start > best[0]:
+                best = (end - start, CommandMatch(name, " ".join(phrase), argument))
+        if tracing.enabled():
+            tracing.observe("command_match_seconds", time.perf_counter() - started)
+        return best[1] if best is not None else None
@@ -0,0 +1,118 @@
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+SUMMARY_PROMPT = ("You compress conversation history for a voice assistant in a meeting. Merge the "
+                  "existing summary with the older turns below into a short summary that keeps names, "
+                  "facts, open questions and decisions. Reply with the summary only.")
+
+
+def estimate_tokens(text):
+    """Fast local token estimate (words and punctuation, plus a little for sub-word splits)"""
+    pieces = _TOKEN_PATTERN.findall(text)
+    return len(pieces) + len(text) // 40 + 1
+
+
+class Turn:
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content) + 4  # per-message overhead
+
+
+class ConversationContext:
+    """Recent conversation kept within a token budget.
+
+    Turns live in a deque; when the total exceeds `token_budget` the oldest
+    turns are evicted and folded into a compressed summary by a background
+    worker, so long meetings keep their memory while the prompt stays bounded.
+    Building the messages for a turn only walks the turns inside the budget.
+
+    summarize(system_prompt, text, max_tokens) -> str performs one LLM call.
+    Without a shared executor the context owns one worker until close().
+    """
+
+    def __init__(self, token_budget=1200, summary_tokens=200, summarize=None, executor=None):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.turns = deque()
+        self.total_tokens = 0
+        self.summary = ""
+        self._evicted = []
+        self._lock = threading.Lock()
+        # A shared executor is not shut down here
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+        self._summary_pending = False
+
+    def add_user(self, text):
+        self._add(Turn("user", text))
+
+    def add_assistant(self, text):
+        self._add(Turn("assistant", text))
+
+    def _add(self, turn):
+        with self._lock:
+            self.turns.append(turn)
+            self.total_tokens += turn.tokens
+            # Always keep the newest turn, even if it alone exceeds the budget
+            while self.total_tokens > self.token_budget and len(self.turns) > 1:
+                old = self.turns.popleft()
+                self.total_tokens -= old.tokens
+                self._evicted.append(old)
+            if self._evicted and self.summarize and not self._summary_pending:
+                self._summary_pending = True
+                self._executor.submit(self._compress)
+
+    def _compress(self):
+        """Fold evicted turns into the running summary (background worker)"""
+        while True:
+            with self._lock:
+                evicted, self._evicted = self._evicted, []
+                summary = self.summary
+                if not evicted:
+                    self._summary_pending = False
+                    return
+            lines = [f"{'Participant' if t.role == 'user' else 'AI'}: {t.content}" for t in evicted]
+            text = (f"Existing summary:\n{summary}\n\n" if summary else "") + "Older turns:\n" + "\n".join(lines)
+            try:
+                new_summary = self.summarize(SUMMARY_PROMPT, text, self.summary_tokens)
+            except Exception as e:
+                print(f"Error compressing conversation history: {e}")
+                # Keep a trimmed tail of the raw turns rather than losing them
+                new_summary = text[-self.summary_tokens * 4:]
+            with self._lock:
+                self.summary = new_summary
+
+    def messages(self, system_prompt):
+        """Role-separated chat messages: system prompt, earlier summary, recent turns"""
+        with self._lock:
+            messages = [{"role": "system", "content": system_prompt}]
+            if self.summary:
+                messages.append({"role": "system",
+                                 "content": f"Summary of earlier conversation in this meeting:\n{self.summary}"})
+            messages.extend({"role": t.role, "content": t.content} for t in self.turns)
+            return messages
+
+    def last_assistant_reply(self):
+        with self._lock:
+            for turn in reversed(self.turns):
+                if turn.role == "assistant":
+                    return turn.content
+        return None
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.total_tokens = 0
+            self.summary = ""
+            self._evicted = []
+
+    def close(self):
+        """Release the summary worker; a compression in progress still finishes"""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
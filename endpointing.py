@@ -0,0 +1,518 @@
+"""Voice activity detection and end-of-turn detection for captured audio.
+
+The capture thread feeds raw PCM blocks to an Endpointer, which cuts them
+into 20 ms frames and classifies each one as speech or not. Energy and
+zero-crossing rate are computed for a whole block at once with NumPy, and
+compared against an adaptive noise floor. When speech stops, an
+EndOfTurnModel decides how much silence to wait for. Clearly finished
+sentences (falling energy at the end) get a shorter wait. Hesitations
+(speech stopping at full level, very short fragments, or a speculative
+transcript ending in "and"/"so"/"um") get a longer one. The model also learns the
+speaker's own mid-turn pauses.
+
+    python endpointing.py --evaluate recordings/    # one complete turn per WAV
+    python endpointing.py --synthetic 40            # generated turns, sanity check
+
+compares the adaptive endpointer with a fixed pause on endpoint latency
+and false cut-offs.
+"""
+import argparse
+import math
+import os
+import random
+import struct
+import wave
+from array import array
+from collections import deque
+
+_np = False  # numpy, once imported on first use (None when it is not installed)
+
+SPEECH_START = 'start'
+SPEECH_END = 'end'
+SPEECH_PAUSE = 'pause'    # tentative end: a short silence inside the utterance
+SPEECH_RESUME = 'resume'  # the speaker carried on after a tentative end
+
+# Words that rarely end a turn: the speaker is mid-thought
+CONTINUATION_WORDS = {
+    "and", "but", "or", "so", "because", "um", "uh", "er", "like", "the", "a", "an", "to",
+    "of", "with", "if", "then", "which", "that", "i", "we", "you", "my", "our", "is", "are",
+}
+
+
+def _numpy():
+    """numpy, imported on first use so importing this module stays cheap; None without it"""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:  # numpy is optional; fall back to the array module
+            numpy = None
+        _np = numpy
+    return _np
+
+
+class NoiseFloor:
+    """Continuously tracked background noise level.
+
+    Drops quickly when it gets quieter and rises slowly, so speech does not
+    drag the floor up but a fan switching on is absorbed within a few seconds.
+    """
+
+    def __init__(self, initial=300.0, rise=0.02, fall=0.3, minimum=50.0):
+        self.level = initial
+        self.rise = rise
+        self.fall = fall
+        self.minimum = minimum
+
+    def update(self, rms):
+        rate = self.fall if rms < self.level else self.rise
+        self.level = max(self.minimum, self.level + rate * (rms - self.level))
+        return self.level
+
+    def threshold(self, ratio=3.0, margin=150.0):
+        return self.level * ratio + margin
+
+
+def frame_features(block, frame_samples):
+    """RMS energy and zero-crossing rate of each whole frame in a block of 16-bit PCM.
+
+    Returns (energies, zcrs, samples used); trailing samples that do not fill a
+    frame are left for the next block.
+    """
+    count = len(block) // 2 // frame_samples
+    used = count * frame_samples
+    if not count:
+        return [], [], 0
+    np = _numpy()
+    if np is not None:
+        x = np.frombuffer(block, dtype=np.int16, count=used).astype(np.float32).reshape(count, frame_samples)
+        energies = np.sqrt(np.mean(x * x, axis=1))
+        signs = np.signbit(x)
+        zcrs = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_samples - 1)
+        return energies.tolist(), zcrs.tolist(), used
+    samples = array('h')
+    samples.frombytes(bytes(block[:used * 2]))
+    energies, zcrs = [], []
+    for i in range(count):
+        frame = samples[i * frame_samples:(i + 1) * frame_samples]
+        energies.append(math.sqrt(sum(s * s for s in frame) / frame_samples))
+        crossings = sum(1 for a, b in zip(frame, frame[1:]) if (a < 0) != (b < 0))
+        zcrs.append(crossings / (frame_samples - 1))
+    return energies, zcrs, used
+
+
+class EndOfTurnModel:
+    """How long a silence has to last before the speaker's turn is over.
+
+    The wait starts from `pause_threshold` and is scaled by a finished-ness
+    score in [-1, 1] built from the end of the utterance. A score of +1
+    halves the wait and -1 stretches it by 1.4x, within [min_pause, max_pause]:
+
+    - the level over the last ~250 ms compared with the ~750 ms before it.
+      Averaging over several syllables, a sentence-final fade counts as
+      finished and stopping at full level counts as mid-thought.
+    - fragments shorter than `short_utterance` seconds are usually "so...",
+      "um" or a name, and count as unfinished
+    - an optional transcript ending in . ? ! or in a continuation word
+
+    Unless the score says the turn is clearly finished, the wait also
+    covers the long mid-turn pauses this speaker has recently made. Each
+    observed false cut-off (speech resuming right after an endpoint)
+    lengthens the base wait a little; each clean endpoint shortens it
+    again.
+    """
+
+    tail_seconds = 1.0  # voiced audio the score looks at
+
+    def __init__(self, pause_threshold=0.8, min_pause=0.35, max_pause=1.6, short_utterance=0.6,
+                 history=50):
+        self.base_pause = pause_threshold
+        self.min_pause = min_pause
+        self.max_pause = max_pause
+        self.short_utterance = short_utterance
+        self.pauses = deque(maxlen=history)  # mid-turn pauses the speaker resumed after
+        self.false_cutoffs = 0
+        self.endpoints = 0
+
+    def score(self, levels_db, voiced_seconds, text=None, frame_seconds=0.02):
+        """Finished-ness in [-1, 1] from the log energies of the utterance's last voiced frames"""
+        score = 0.0
+        recent_n = max(1, round(0.25 / frame_seconds))
+        if len(levels_db) >= 2 * recent_n:
+            recent = levels_db[-recent_n:]
+            before = levels_db[-4 * recent_n:-recent_n]
+            decay = sum(before) / len(before) - sum(recent) / len(recent)
+            # ~0 dB when speech stops at full level, 6 dB or more for a fade
+            score += max(-1.0, min(1.0, (decay - 3.0) / 4.0))
+        if voiced_seconds < self.short_utterance:
+            score -= 0.4
+        if text:
+            stripped = text.rstrip()
+            words = stripped.split()
+            last_word = words[-1].strip(",;:-").lower() if words else ""
+            if stripped.endswith(("?", ".", "!")):
+                score += 0.6
+            elif last_word in CONTINUATION_WORDS or stripped.endswith((",", "-", "...")):
+                score -= 0.6
+        return max(-1.0, min(1.0, score))
+
+    def required_silence(self, levels_db, voiced_seconds, text=None, frame_seconds=0.02):
+        score = self.score(levels_db, voiced_seconds, text, frame_seconds)
+        # Finished-sounding ends may halve the wait; unfinished ones stretch it by at most 1.4x
+        wait = self.base_pause * 2 ** (-score if score > 0 else -score / 2)
+        if score < 0.2 and self.pauses:
+            # Bridge the pauses this speaker typically makes without finishing
+            typical = sorted(self.pauses)[int(0.8 * (len(self.pauses) - 1))]
+            wait = max(wait, typical * 1.15)
+        return max(self.min_pause, min(self.max_pause, wait))
+
+    def observe_pause(self, seconds):
+        """A silence inside the turn after which the speaker carried on"""
+        if seconds >= 0.15:  # shorter gaps are stop consonants, not pauses
+            self.pauses.append(seconds)
+
+    def observe_endpoint(self, false_cutoff):
+        self.endpoints += 1
+        if false_cutoff:
+            self.false_cutoffs += 1
+            self.base_pause = min(self.max_pause, self.base_pause * 1.1)
+        else:
+            self.base_pause = max(self.min_pause, self.base_pause * 0.99)
+
+
+class FixedPause:
+    """The old behaviour: every turn ends after the same amount of silence"""
+
+    tail_seconds = 1.0
+
+    def __init__(self, pause_threshold=0.8):
+        self.pause_threshold = pause_threshold
+        self.false_cutoffs = 0
+        self.endpoints = 0
+
+    def required_silence(self, levels_db, voiced_seconds, text=None, frame_seconds=0.02):
+        return self.pause_threshold
+
+    def observe_pause(self, seconds):
+        pass
+
+    def observe_endpoint(self, false_cutoff):
+        self.endpoints += 1
+        self.false_cutoffs += false_cutoff
+
+
+class SpeechEvent:
+    """Start or end of speech at a byte offset into the stream fed to the Endpointer"""
+
+    def __init__(self, kind, position, wait=None, forced=False):
+        self.kind = kind
+        self.position = position
+        self.wait = wait      # silence required before this end was declared (seconds)
+        self.forced = forced  # cut because the utterance hit max_utterance
+
+    def __repr__(self):
+        return f"SpeechEvent({self.kind!r}, {self.position})"
+
+
+class Endpointer:
+    """Streaming VAD plus end-of-turn detection over 16-bit mono PCM blocks.
+
+    process(block) returns the SpeechEvents the block completed. An end
+    event's position is where the voice stopped, not where the silence was
+    confirmed; `position` (the bytes consumed so far) gives the latter.
+
+    With `tentative_pause`, a pause event is also reported once the silence
+    has lasted that long, well before the end of the turn is certain, and a
+    resume event if the speaker then carries on. A transcript of the audio
+    up to the pause (set_transcript_hint, e.g. from the speculative
+    recognition) updates the wait while the silence is still going on.
+    """
+
+    def __init__(self, sample_rate=16000, sample_width=2, frame_ms=20, model=None, noise_floor=None,
+                 min_speech=0.06, max_utterance=30.0, resume_window=0.6, unvoiced_zcr=0.3,
+                 tentative_pause=None):
+        if sample_width != 2:
+            raise ValueError("Endpointer expects 16-bit PCM")
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.frame_seconds = self.frame_samples / sample_rate
+        self.model = model or EndOfTurnModel()
+        self.noise_floor = noise_floor or NoiseFloor()
+        self.min_speech_frames = max(1, round(min_speech / self.frame_seconds))
+        self.max_utterance_frames = int(max_utterance / self.frame_seconds)
+        self.resume_frames = int(resume_window / self.frame_seconds)
+        self.unvoiced_zcr = unvoiced_zcr
+        self.tentative_frames = max(1, round(tentative_pause / self.frame_seconds)) if tentative_pause else None
+        self.tail_frames = max(3, int(self.model.tail_seconds / self.frame_seconds))
+        _numpy()  # import now rather than on the capture thread's first block
+        self._hint = None            # (voice end position, transcript) from set_transcript_hint
+        self._hint_used = None       # the hint the current wait was computed with
+        self.position = 0            # bytes consumed
+        self._pending = b""
+        self._in_speech = False
+        self._run = 0                # consecutive voiced frames before speech starts
+        self._start = None           # byte offset of the current utterance
+        self._voiced_end = None      # byte offset where the last voiced frame ended
+        self._silent_frames = 0
+        self._required_frames = None
+        self._levels_db = []         # log energies of the utterance's latest voiced frames
+        self._voiced_frames = 0
+        self._last_end_frame = None  # frame index of the last endpoint, for false cut-off checks
+        self._frame_index = 0
+        self._paused = False         # a pause event is outstanding
+        self._resume_run = 0         # voiced frames since speech came back after a pause
+
+    @property
+    def is_speaking(self):
+        return self._in_speech
+
+    def set_transcript_hint(self, text, position):
+        """Transcript of the utterance whose voice ended at `position` (safe from any thread)"""
+        self._hint = (position, text)
+
+    def process(self, block):
+        data = self._pending + bytes(block) if self._pending else bytes(block)
+        energies, zcrs, used = frame_features(data, self.frame_samples)
+        self._pending = data[used * 2:]
+        if not energies:
+            return []
+        threshold = self.noise_floor.threshold()
+        events = []
+        for energy, zcr in zip(energies, zcrs):
+            # Voiced speech clears the threshold; unvoiced consonants (s, f, th) are
+            # quieter but cross zero far more often than hum or rumble
+            voiced = energy > threshold or (energy > threshold * 0.6 and zcr > self.unvoiced_zcr)
+            if not voiced:
+                self.noise_floor.update(energy)
+                threshold = self.noise_floor.threshold()
+            self._frame(voiced, energy, events)
+        return events
+
+    def _frame(self, voiced, energy, events):
+        frame_end = self.position + self.frame_bytes
+        self.position = frame_end
+        self._frame_index += 1
+
+        if not self._in_speech:
+            self._run = self._run + 1 if voiced else 0
+            if self._run >= self.min_speech_frames:
+                self._in_speech = True
+                self._start = frame_end - self._run * self.frame_bytes
+                self._voiced_end = frame_end
+                self._silent_frames = 0
+                self._levels_db = [self._db(energy)]
+                self._voiced_frames = self._run
+                if self._last_end_frame is not None and \
+                        self._frame_index - self._run - self._last_end_frame <= self.resume_frames:
+                    # Speech came back right after an endpoint: the turn was cut short
+                    self.model.observe_endpoint(True)
+                    self._last_end_frame = None
+                events.append(SpeechEvent(SPEECH_START, self._start))
+            elif self._last_end_frame is not None and \
+                    self._frame_index - self._last_end_frame > self.resume_frames:
+                self.model.observe_endpoint(False)
+                self._last_end_frame = None
+            return
+
+        if voiced:
+            if self._silent_frames:
+                self.model.observe_pause(self._silent_frames * self.frame_seconds)
+            if self._paused:
+                # A click or breath is not enough to call off the tentative end
+                self._resume_run += 1
+                if self._resume_run >= self.min_speech_frames:
+                    self._paused = False
+                    events.append(SpeechEvent(SPEECH_RESUME, frame_end - self._resume_run * self.frame_bytes))
+            self._silent_frames = 0
+            self._required_frames = None
+            self._voiced_end = frame_end
+            self._levels_db.append(self._db(energy))
+            if len(self._levels_db) > 2 * self.tail_frames:
+                del self._levels_db[:-self.tail_frames]
+            self._voiced_frames += 1
+        else:
+            if not self._silent_frames or self._hint is not self._hint_used:
+                self._required_frames = self._required_silence_frames()
+            self._silent_frames += 1
+            self._resume_run = 0
+            if self._silent_frames == self.tentative_frames and self._silent_frames < self._required_frames:
+                self._paused = True
+                events.append(SpeechEvent(SPEECH_PAUSE, self._voiced_end))
+
+        too_long = (frame_end - self._start) // self.frame_bytes >= self.max_utterance_frames
+        if too_long:
+            # Long speakers are split, not ended: cut at the voice end so no word is lost
+            end = self._voiced_end if self._silent_frames else frame_end
+            events.append(SpeechEvent(SPEECH_END, end, forced=True))
+            events.append(SpeechEvent(SPEECH_START, end))
+            self._start = end
+            self._voiced_frames = 0
+            self._paused = False
+        elif self._silent_frames and self._silent_frames >= self._required_frames:
+            events.append(SpeechEvent(SPEECH_END, self._voiced_end,
+                                      wait=self._required_frames * self.frame_seconds))
+            self._in_speech = False
+            self._paused = False
+            self._run = 0
+            self._last_end_frame = self._frame_index
+
+    def _required_silence_frames(self):
+        hint = self._hint_used = self._hint
+        # A hint for earlier audio says nothing about how this utterance ends
+        text = hint[1] if hint is not None and hint[0] == self._voiced_end else None
+        seconds = self.model.required_silence(self._levels_db[-self.tail_frames:],
+                                              self._voiced_frames * self.frame_seconds,
+                                              text, self.frame_seconds)
+        return max(1, round(seconds / self.frame_seconds))
+
+    @staticmethod
+    def _db(energy):
+        return 20 * math.log10(max(energy, 1.0))
+
+
+# -- evaluation --------------------------------------------------------------
+
+def read_turn(path):
+    with wave.open(path, 'rb') as f:
+        if f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected mono 16-bit PCM audio")
+        return f.readframes(f.getnframes()), f.getframerate()
+
+
+def voice_end(frames, sample_rate, frame_ms=20):
+    """Byte offset where a recorded turn's speech ends (last frame above 10% of the peak level)"""
+    samples = int(sample_rate * frame_ms / 1000)
+    energies, _, _ = frame_features(frames, samples)
+    if not energies:
+        return len(frames)
+    threshold = max(energies) * 0.1
+    last = max((i for i, e in enumerate(energies) if e > threshold), default=len(energies) - 1)
+    return (last + 1) * samples * 2
+
+
+def synthetic_turn(rng, sample_rate=16000):
+    """A turn of 1-4 phrases at a syllable rate of 4 Hz. Mid-turn pauses follow a
+    phrase that stops at full level; the last phrase declines by ~12 dB over its
+    final 0.6 s, the way a finished sentence does."""
+    def tone(duration, final):
+        pitch = rng.uniform(100, 220)
+        n = int(duration * sample_rate)
+        decline_n = int(0.6 * sample_rate)
+        release_n = int(0.03 * sample_rate)
+        out = []
+        for i in range(n):
+            t = i / sample_rate
+            left = n - i
+            envelope = (0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)) * min(1.0, left / release_n)
+            if final and left < decline_n:
+                envelope *= 0.25 + 0.75 * left / decline_n
+            value = sum(math.sin(2 * math.pi * pitch * k * t) / k for k in (1, 2, 3))
+            out.append(int(5000 * envelope * value / 1.8))
+        return struct.pack(f"<{n}h", *out)
+
+    phrases = rng.randint(1, 4)
+    parts = []
+    for i in range(phrases):
+        last = i == phrases - 1
+        # Short fragments like "so" or "um" are common before a longer phrase
+        duration = rng.uniform(0.25, 0.5) if (not last and rng.random() < 0.3) else rng.uniform(0.6, 2.5)
+        parts.append(tone(duration, final=last))
+        if not last:
+            parts.append(b"\0\0" * int(rng.uniform(0.2, 0.95) * sample_rate))
+    return b"".join(parts)
+
+
+def evaluate(turns, sample_rate, endpointer, gap=3.0):
+    """Stream the turns back to back and score the endpointer.
+
+    A false cut-off is an end declared before the turn's speech was over; the
+    endpoint latency is how long after the true end of speech the end was declared.
+    """
+    gap_bytes = b"\0\0" * int(gap * sample_rate)
+    stream, spans = [gap_bytes], []
+    offset = len(gap_bytes)
+    for frames, true_end in turns:
+        spans.append((offset, offset + true_end))
+        stream.append(frames)
+        stream.append(gap_bytes)
+        offset += len(frames) + len(gap_bytes)
+    audio = b"".join(stream)
+
+    detections = []  # (end position, detected at)
+    block = 2048
+    for i in range(0, len(audio), block):
+        for event in endpointer.process(audio[i:i + block]):
+            if event.kind == SPEECH_END and not event.forced:
+                detections.append((event.position, endpointer.position))
+
+    bytes_per_second = sample_rate * 2
+    false_cutoffs, latencies, missed = 0, [], 0
+    for start, end in spans:
+        inside = [d for d in detections if start <= d[0] < end and d[1] < end]
+        false_cutoffs += len(inside)
+        final = [d for d in detections if d[1] >= end and d[0] >= start and d[1] < end + len(gap_bytes)]
+        if final:
+            latencies.append((final[0][1] - end) / bytes_per_second)
+        else:
+            missed += 1
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+    return {
+        'turns': len(spans),
+        'false_cutoffs': false_cutoffs,
+        'false_cutoff_rate': round(false_cutoffs / len(spans), 3) if spans else 0.0,
+        'missed': missed,
+        'latency_mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'latency_p50': pick(0.5),
+        'latency_p95': pick(0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate end-of-turn detection")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--evaluate", metavar="DIR", help="directory of WAVs, one complete turn each")
+    source.add_argument("--synthetic", type=int, metavar="N", help="generate N turns")
+    parser.add_argument("--pause", type=float, default=0.8, help="fixed pause and the adaptive model's base")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.evaluate:
+        turns, sample_rate = [], None
+        for name in sorted(n for n in os.listdir(args.evaluate) if n.lower().endswith('.wav')):
+            frames, rate = read_turn(os.path.join(args.evaluate, name))
+            if sample_rate not in (None, rate):
+                raise SystemExit(f"{name}: all files must share one sample rate")
+            sample_rate = rate
+            turns.append((frames, voice_end(frames, rate)))
+        if not turns:
+            raise SystemExit(f"No .wav files in {args.evaluate}")
+    else:
+        rng = random.Random(args.seed)
+        sample_rate = 16000
+        turns = []
+        for _ in range(args.synthetic):
+            frames = synthetic_turn(rng, sample_rate)
+            turns.append((frames, voice_end(frames, sample_rate)))
+
+    results = [
+        ("fixed pause", evaluate(turns, sample_rate,
+                                 Endpointer(sample_rate, model=FixedPause(args.pause)))),
+        ("adaptive", evaluate(turns, sample_rate,
+                              Endpointer(sample_rate, model=EndOfTurnModel(args.pause)))),
+    ]
+    print(f"{'endpointer':<14} {'turns':>5} {'false cut-offs':>15} {'missed':>6} "
+          f"{'mean':>8} {'p50':>8} {'p95':>8}")
+    fmt = lambda v: f"{v * 1000:6.0f}ms" if v is not None else f"{'-':>8}"
+    for name, r in results:
+        print(f"{name:<14} {r['turns']:>5} {r['false_cutoffs']:>8} ({r['false_cutoff_rate']:.0%}) "
+              f"{r['missed']:>6} {fmt(r['latency_mean'])} {fmt(r['latency_p50'])} {fmt(r['latency_p95'])}")
+    fixed, adaptive = results[0][1], results[1][1]
+    if fixed['latency_mean'] is not None and adaptive['latency_mean'] is not None:
+        print(f"Mean endpoint latency saved: {(fixed['latency_mean'] - adaptive['latency_mean']) * 1000:.0f}ms; "
+              f"false cut-offs {fixed['false_cutoffs']} -> {adaptive['false_cutoffs']}")
+
+
+if __name__ == "__main__":
+    main()
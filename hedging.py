@@ -0,0 +1,274 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import tracing
+
+
+class DeadlineExceeded(Exception):
+    """The turn's latency budget ran out before the model produced anything, or the reply stalled"""
+
+
+class Deadline:
+    """End-to-end latency budget for one turn"""
+
+    def __init__(self, budget, started=None):
+        self.budget = budget
+        self.started = time.monotonic() if started is None else started
+
+    @classmethod
+    def since(cls, budget, wall_time):
+        """Budget counted from a time.time() timestamp, e.g. the end of the participant's speech"""
+        return cls(budget, time.monotonic() - max(0.0, time.time() - wall_time))
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return max(0.0, self.budget - self.elapsed())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (p in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class HedgeStats:
+    """How often hedging fired and what it saved"""
+
+    def __init__(self, window=500):
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.deadline_misses = 0
+        self.first_token = deque(maxlen=window)  # observed latency with hedging
+        self.primary = deque(maxlen=window)      # latency the first request alone had
+        self._lock = threading.Lock()
+
+    def record(self, latency, hedged, hedge_won):
+        with self._lock:
+            self.requests += 1
+            self.hedges_fired += hedged
+            self.hedge_wins += hedge_won
+            self.first_token.append(latency)
+
+    def record_primary(self, latency):
+        """Latency the first request alone would have had"""
+        with self._lock:
+            self.primary.append(latency)
+
+    def record_miss(self):
+        with self._lock:
+            self.requests += 1
+            self.deadline_misses += 1
+        tracing.count("llm_deadline_misses_total")
+
+    def hedge_threshold(self, p, default):
+        with self._lock:
+            samples = list(self.first_token)
+        # Wait for a few samples before trusting the percentile
+        return percentile(samples, p) if len(samples) >= 10 else default
+
+    def snapshot(self):
+        with self._lock:
+            observed = list(self.first_token)
+            primary = list(self.primary)
+            stats = {
+                'requests': self.requests,
+                'hedges_fired': self.hedges_fired,
+                'hedge_wins': self.hedge_wins,
+                'deadline_misses': self.deadline_misses,
+            }
+        p99 = percentile(observed, 99)
+        p99_primary = percentile(primary, 99)
+        stats['hedge_rate'] = stats['hedges_fired'] / stats['requests'] if stats['requests'] else 0.0
+        stats['p99_first_token'] = p99
+        stats['p99_without_hedging'] = p99_primary
+        stats['p99_saved'] = (p99_primary - p99) if p99 is not None and p99_primary is not None else None
+        return stats
+
+
+class HedgedLLM:
+    """Deadline-aware generation with hedged requests.
+
+    If the first request has not produced its first token by the
+    `hedge_percentile` of recently observed first-token latencies, a duplicate
+    request is started; whichever answers first wins and the other is
+    cancelled. If the turn's deadline passes before any token arrives,
+    DeadlineExceeded is raised so the caller can speak a fallback instead; it
+    is also raised if the winning reply then goes quiet for `stall_timeout`
+    seconds (by default the turn budget).
+
+    Latencies are measured from when the first request was sent, not from the
+    start of the deadline, which may include endpointing and recognition.
+    A losing first request is only abandoned once its own first token arrives,
+    which gives the latency it would have had and so what hedging saved.
+    """
+
+    def __init__(self, gateway, hedge_percentile=90, default_hedge_delay=1.5,
+                 min_hedge_delay=0.25, max_requests=2, stall_timeout=None):
+        self.gateway = gateway
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_requests = max_requests
+        self.stall_timeout = stall_timeout
+        self.stats = HedgeStats()
+
+    def _hedge_delay(self):
+        threshold = self.stats.hedge_threshold(self.hedge_percentile, self.default_hedge_delay)
+        return max(self.min_hedge_delay, threshold)
+
+    def stream(self, messages, deadline, **kwargs):
+        """Yield text deltas from whichever request produces the first token"""
+        events = queue.Queue()
+        cancels = []
+        ids = itertools.count()
+        primary = {'latency': None, 'lost': False}
+        primary_lock = threading.Lock()
+        sent_at = time.monotonic()  # when the first request went out
+
+        trace = tracing.current()
+
+        def attempt(attempt_id, cancel):
+            # Runs on its own thread; retries are still counted against the turn
+            with tracing.use(trace):
+                deltas = self.gateway.stream(messages, **kwargs)
+                first = True
+                try:
+                    for delta in deltas:
+                        if first and attempt_id == 0:
+                            with primary_lock:
+                                primary['latency'] = time.monotonic() - sent_at
+                                if primary['lost']:
+                                    self.stats.record_primary(primary['latency'])
+                        first = False
+                        if cancel.is_set():
+                            break
+                        events.put(('token', attempt_id, delta))
+                    else:
+                        events.put(('done', attempt_id, None))
+                except Exception as e:
+                    events.put(('error', attempt_id, e))
+                finally:
+                    deltas.close()
+
+        def launch():
+            cancel = threading.Event()
+            cancels.append(cancel)
+            if len(cancels) > 1:
+                trace.count('llm_hedges')
+            threading.Thread(target=attempt, args=(next(ids), cancel), daemon=True).start()
+
+        launch()
+        hedge_at = self._hedge_delay()
+        winner = None
+        errors = []
+        try:
+            # Phase 1: wait for the first token, hedging once the threshold passes
+            while winner is None:
+                if deadline.expired():
+                    self.stats.record_miss()
+                    raise DeadlineExceeded(f"no reply within {deadline.budget:.1f}s")
+                timeout = deadline.remaining()
+                if len(cancels) < self.max_requests:
+                    timeout = min(timeout, max(0.0, hedge_at - (time.monotonic() - sent_at)))
+                try:
+                    kind, attempt_id, payload = events.get(timeout=max(timeout, 0.001))
+                except queue.Empty:
+                    if len(cancels) < self.max_requests and time.monotonic() - sent_at >= hedge_at:
+                        launch()
+                    continue
+                if kind == 'token':
+                    winner = attempt_id
+                    latency = time.monotonic() - sent_at
+                    hedged = len(cancels) > 1
+                    self.stats.record(latency, hedged, winner != 0)
+                    with primary_lock:
+                        if winner == 0:
+                            self.stats.record_primary(latency)
+                        elif primary['latency'] is not None:
+                            self.stats.record_primary(primary['latency'])
+                        else:
+                            primary['lost'] = True  # the primary reports when its token arrives
+                    for i, cancel in enumerate(cancels):
+                        if i != winner:
+                            cancel.set()
+                    yield payload
+                elif kind == 'error':
+                    errors.append(payload)
+                    if len(errors) >= len(cancels):
+                        if len(cancels) < self.max_requests and not deadline.expired():
+                            launch()  # retry immediately with the remaining budget
+                        else:
+                            raise payload
+                elif kind == 'done':
+                    # An empty reply still counts as an answer
+                    winner = attempt_id
+                    return
+
+            # Phase 2: relay the winner's remaining tokens
+            stall_timeout = self.stall_timeout or deadline.budget
+            while True:
+                try:
+                    kind, attempt_id, payload = events.get(timeout=stall_timeout)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"reply stalled for {stall_timeout:.1f}s")
+                if attempt_id != winner:
+                    continue
+                if kind == 'token':
+                    yield payload
+                elif kind == 'done':
+                    return
+                else:
+                    raise payload
+        finally:
+            for cancel in cancels:
+                cancel.set()
+
+    def complete(self, messages, deadline, **kwargs):
+        """Non-streaming variant: first finished request wins"""
+        first = self.gateway.submit(messages, **kwargs)
+        sent_at = time.monotonic()
+        futures = [first]
+        hedge_at = self._hedge_delay()
+        try:
+            while True:
+                timeout = deadline.remaining()
+                if len(futures) < self.max_requests:
+                    timeout = min(timeout, max(0.0, hedge_at - (time.monotonic() - sent_at)))
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        latency = time.monotonic() - sent_at
+                        hedged = len(futures) > 1
+                        hedge_won = future is not first
+                        self.stats.record(latency, hedged, hedge_won)
+                        if hedge_won:
+                            # The first request keeps running; measure what it would have taken
+                            first.add_done_callback(lambda f: self.stats.record_primary(time.monotonic() - sent_at))
+                        else:
+                            self.stats.record_primary(latency)
+                        return future.result()
+                    futures.remove(future)
+                    if not futures:
+                        raise future.exception()
+                if deadline.expired():
+                    self.stats.record_miss()
+                    raise DeadlineExceeded(f"no reply within {deadline.budget:.1f}s")
+                if len(futures) < self.max_requests and time.monotonic() - sent_at >= hedge_at:
+                    futures.append(self.gateway.submit(messages, **kwargs))
+                    tracing.current().count('llm_hedges')
+        finally:
+            for future in futures:
+                future.cancel()  # only stops requests still waiting in the queue
@@ -0,0 +1,414 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import tracing
+
+# Request priorities (lower runs first)
+INTERACTIVE = 0
+BACKGROUND = 10
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Request rate limiter that adapts to 429 responses.
+
+    Tokens refill at `rate` per second up to `capacity`. A 429 halves the rate
+    and blocks all callers until Retry-After has passed; each success then
+    raises the rate again by `recovery` (AIMD). Background callers may only
+    take a token while more than `reserve` tokens are left, so interactive
+    requests always find one.
+    """
+
+    def __init__(self, rate=3.0, capacity=10.0, min_rate=0.2, recovery=0.05, reserve=2.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.reserve = reserve
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Block until a token is available; False on timeout"""
+        floor = 1.0 if priority <= INTERACTIVE else 1.0 + self.reserve
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= floor:
+                    self.tokens -= 1.0
+                    return True
+                wait = max(self.blocked_until - now, (floor - self.tokens) / self.rate, 0.01)
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def on_rate_limited(self, retry_after=None):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def on_success(self):
+        with self._cond:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Stops calling a failing API for `reset_timeout` seconds after repeated failures"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = None  # set while the one half-open probe is in flight
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Let one probe request through; a probe that never reported back
+                # (e.g. a cancelled call) is given up on after reset_timeout
+                if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                    return False
+                self.probe_started = now
+            return True
+
+    def release(self):
+        """End a probe that neither proved the API healthy nor failing (429, bad request)"""
+        with self._lock:
+            self.probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print("LLM circuit breaker opened")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(error):
+    """Retry-After from a rate-limit error, if the server sent one"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def api_error():
+    """openai.APIError, imported on first use so importing this module stays cheap"""
+    import openai
+    return openai.APIError
+
+
+def unreachable_errors():
+    """Exceptions meaning the API could not be reached at all (circuit open, connection failures)"""
+    import openai
+    return (CircuitOpenError, openai.APIConnectionError)
+
+
+def is_retryable(error):
+    """Rate limits, timeouts, connection errors and 5xx are worth retrying"""
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+
+class _Job:
+    def __init__(self, priority, fn):
+        self.priority = priority
+        self.fn = fn
+        self.future = Future()
+
+
+class LLMGateway:
+    """Single entry point for every chat completion the agent makes.
+
+    - one pooled keep-alive HTTP client for sync and one for async calls
+    - a priority scheduler: interactive replies always run before queued note
+      summarization, and one worker is reserved for interactive jobs
+    - an adaptive token-bucket rate limiter shared by all callers
+    - retries with exponential backoff and jitter, honouring Retry-After
+    - a circuit breaker that fails fast while the API is down
+
+    Point OPENAI_BASE_URL at a local server (see mock_openai_server.py) to run
+    against a stand-in for the OpenAI API.
+
+    The OpenAI SDK and HTTP clients are created on first use (or by
+    warm_up()), so constructing the gateway costs nothing.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=30.0, max_retries=3,
+                 workers=4, max_connections=10, rate=3.0, burst=10.0):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL')
+        self.max_connections = max_connections
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = TokenBucket(rate=rate, capacity=burst)
+        self.breaker = CircuitBreaker()
+        self.workers = workers
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running_background = 0
+        self._stats_lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0,
+                         'circuit_rejections': 0}
+        self._threads = [threading.Thread(target=self._worker, name=f"llm-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    # -- clients ------------------------------------------------------------
+
+    def _create_clients(self):
+        import httpx
+        from openai import OpenAI, AsyncOpenAI
+        with self._client_lock:
+            if self._client is not None:
+                return
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections,
+                                  keepalive_expiry=60.0)
+            # Retries are handled here, so the SDK's own retry loop is disabled
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0,
+                http_client=httpx.AsyncClient(limits=limits, timeout=self.timeout))
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout,
+                                  max_retries=0,
+                                  http_client=httpx.Client(limits=limits, timeout=self.timeout))
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._create_clients()
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._client is None:
+            self._create_clients()
+        return self._async_client
+
+    def warm_up(self):
+        """Import the SDK and build the pooled clients ahead of the first request"""
+        self._create_clients()
+
+    # -- scheduling ---------------------------------------------------------
+
+    def submit(self, messages, priority=INTERACTIVE, **kwargs):
+        """Queue a completion; returns a Future for the reply text"""
+        job = _Job(priority, lambda: self._complete_now(messages, priority, **kwargs))
+        with self._cond:
+            self._queue.append((priority, next(self._seq), job))
+            self._queue.sort(key=lambda item: item[:2])
+            self._cond.notify()
+        return job.future
+
+    def complete(self, messages, priority=INTERACTIVE, **kwargs):
+        """Run a completion through the scheduler and wait for the reply text"""
+        return self.submit(messages, priority, **kwargs).result()
+
+    def _next_job(self):
+        # Highest priority first; background jobs never take the last free worker
+        with self._cond:
+            while True:
+                for i, (priority, _, job) in enumerate(self._queue):
+                    if priority <= INTERACTIVE or self._running_background < self.workers - 1:
+                        del self._queue[i]
+                        if priority > INTERACTIVE:
+                            self._running_background += 1
+                        return job
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if not job.future.set_running_or_notify_cancel():
+                # Cancelled while queued (e.g. the losing half of a hedged request)
+                if job.priority > INTERACTIVE:
+                    with self._cond:
+                        self._running_background -= 1
+                        self._cond.notify_all()
+                continue
+            try:
+                job.future.set_result(job.fn())
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                if job.priority > INTERACTIVE:
+                    with self._cond:
+                        self._running_background -= 1
+                        self._cond.notify_all()
+
+    # -- request execution --------------------------------------------------
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.counters[key] += 1
+        tracing.count(f"llm_{key}_total")
+
+    def _call_with_retries(self, call, priority, max_retries=None):
+        import openai
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count('circuit_rejections')
+                raise CircuitOpenError("LLM API circuit breaker is open")
+            self.limiter.acquire(priority)
+            self._count('requests')
+            try:
+                result = call()
+                self.breaker.record_success()
+                self.limiter.on_success()
+                return result
+            except Exception as e:
+                retry_after = None
+                if isinstance(e, openai.RateLimitError):
+                    self._count('rate_limited')
+                    retry_after = retry_after_seconds(e)
+                    self.limiter.on_rate_limited(retry_after)
+                    self.breaker.release()
+                elif is_retryable(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                if not is_retryable(e) or attempt >= max_retries:
+                    self._count('failures')
+                    raise
+                attempt += 1
+                self._count('retries')
+                tracing.current().count('llm_retries')
+                time.sleep(max(retry_after or 0.0, backoff_delay(attempt)))
+
+    def _complete_now(self, messages, priority, model=DEFAULT_MODEL, max_retries=None, **kwargs):
+        response = self._call_with_retries(
+            lambda: self.client.chat.completions.create(model=model, messages=messages, **kwargs),
+            priority, max_retries)
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages, priority=INTERACTIVE, model=DEFAULT_MODEL, max_retries=None, **kwargs):
+        """Yield reply text deltas. Runs on the caller's thread; retries only before the first token."""
+        stream = self._call_with_retries(
+            lambda: self.client.chat.completions.create(model=model, messages=messages,
+                                                        stream=True, **kwargs),
+            priority, max_retries)
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            # Closing the stream aborts the HTTP request if the caller stopped early
+            stream.close()
+
+    async def acomplete(self, messages, priority=INTERACTIVE, model=DEFAULT_MODEL, max_retries=None, **kwargs):
+        """Async completion on the pooled async client"""
+        import openai
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count('circuit_rejections')
+                raise CircuitOpenError("LLM API circuit breaker is open")
+            await asyncio.to_thread(self.limiter.acquire, priority)
+            self._count('requests')
+            try:
+                response = await self.async_client.chat.completions.create(
+                    model=model, messages=messages, **kwargs)
+                self.breaker.record_success()
+                self.limiter.on_success()
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                retry_after = None
+                if isinstance(e, openai.RateLimitError):
+                    self._count('rate_limited')
+                    retry_after = retry_after_seconds(e)
+                    self.limiter.on_rate_limited(retry_after)
+                    self.breaker.release()
+                elif is_retryable(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                if not is_retryable(e) or attempt >= max_retries:
+                    self._count('failures')
+                    raise
+                attempt += 1
+                self._count('retries')
+                await asyncio.sleep(max(retry_after or 0.0, backoff_delay(attempt)))
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        with self._cond:
+            counters['queued'] = len(self._queue)
+        counters['rate'] = round(self.limiter.rate, 3)
+        counters['circuit'] = self.breaker.state
+        return counters
@@ -1,30 +1,40 @@
+import sys
+import startup_profile
+
+# Time every import below when run with --profile-startup
+if '--profile-startup' in sys.argv:
+    startup_profile.enable()
+
+import importlib
 import os
 import pickle
 import time
 import speech_recognition as sr
-from text_to_speech import speak_text
+from text_to_speech import get_tts_service
+from asr_backends import ASRDispatcher, create_backend
+from response_cache import ResponseCache
+from notes_store import NotesJournal, recover_journals
+from notes_index import NotesIndex
+from rolling_summary import RollingSummarizer
+from conversation_context import ConversationContext
+from llm_gateway import LLMGateway, INTERACTIVE, BACKGROUND, api_error, unreachable_errors
+import ai_agent
+import tracing
+from hedging import HedgedLLM, Deadline, DeadlineExceeded
+from browser_pool import BrowserPool
+from meeting_schedule import Meeting, JoinScheduler, meetings_from_events
+from sessions import SharedServices, SessionManager
 from dotenv import load_dotenv
 import threading
 from datetime import datetime
 import queue
 import json
-
-
-# OpenAI imports
-from openai import OpenAI, APIError
-
-# Google Calendar and Selenium imports
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+# OpenAI, the Google API client and Selenium are imported where they are first
+# used (or by the warm-up thread in main) so startup does not wait for them
+
 # Load environment variables
 load_dotenv()
 
@@ -34,25 +44,137 @@ SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 # Define the termination keyword
 TERMINATION_KEYWORD = "terminate"
 
-# Initialize recognizer with adjusted parameters
-recognizer = sr.Recognizer()
-recognizer.dynamic_energy_threshold = True  # Use fixed energy threshold
-recognizer.energy_threshold = 2000  # Adjust this value based on your environment
-recognizer.pause_threshold = 0.8  # Reduce pause threshold for faster response
+# Where to capture audio from: "mic", "mic:<device index>" or a path to a .wav file.
+# A comma-separated list gives each concurrent meeting its own source
+AUDIO_SOURCES = [s.strip() for s in os.getenv('AUDIO_SOURCE', 'mic').split(',') if s.strip()]
+
+# PyAudio output device per concurrent meeting, e.g. "3,5" (default: the system output)
+TTS_OUTPUT_DEVICES = [int(d) if d.strip() else None
+                      for d in os.getenv('TTS_OUTPUT_DEVICES', '').split(',')]
+
+# Meetings served at once (defaults to one per audio source)
+MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', '0')) or len(AUDIO_SOURCES)
+
+# Print per-session resource use every N seconds (0 disables the periodic report)
+SESSION_REPORT_INTERVAL = float(os.getenv('SESSION_REPORT_INTERVAL', '0'))
+
+# Latency tracing (tracing.py), off unless one of these is set: a JSONL file of
+# per-turn timelines, a Prometheus textfile and/or a port serving /metrics
+TRACE_FILE = os.getenv('TRACE_FILE')
+METRICS_FILE = os.getenv('METRICS_FILE')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Run capture/recognition, generation and playback as concurrent stages with barge-in
+PIPELINE_TURNS = os.getenv('PIPELINE_TURNS', '1') != '0'
+
+# fsync policy for the notes journal: "always", "interval" or "never"
+NOTES_FSYNC = os.getenv('NOTES_FSYNC', 'interval')
+
+# Stream replies sentence by sentence into TTS instead of waiting for the full text
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '1') != '0'
+
+# Meeting to join when the calendar has nothing with a Meet link
+FALLBACK_MEET_URL = os.getenv('MEET_URL', "https://meet.google.com/zbu-odsb-dfc")
 
-# Initialize the OpenAI client with timeout
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=30.0)  # 30 second timeout
+# End-of-turn detection in the audio capture: "adaptive" waits less after a finished
+# sentence and longer after a hesitation; "fixed" always waits PAUSE_THRESHOLD seconds
+ENDPOINTING = os.getenv('ENDPOINTING', 'adaptive')
+PAUSE_THRESHOLD = float(os.getenv('PAUSE_THRESHOLD', '0.8'))
 
-# Initialize conversation history
-conversation_history = []
+# Speculative replies: recognise and start the LLM request after TENTATIVE_PAUSE seconds
+# of silence, and use them if the turn really ended there. Trades API calls for latency.
+SPECULATE = os.getenv('SPECULATE', '0') == '1'
+TENTATIVE_PAUSE = float(os.getenv('TENTATIVE_PAUSE', '0.25'))
 
-# Global variable to track meeting status
-meeting_active = False
+# Where transcripts come from: "audio" recognises the meeting audio, "captions" reads
+# Meet's live captions, which also name the speaker (falls back to audio without them)
+TRANSCRIPT_SOURCE = os.getenv('TRANSCRIPT_SOURCE', 'audio')
 
-# Add with other global variables
-notes_taker = None  # Initialize the global variable
+# Searchable index over meeting_notes/ (see notes_index.py). With NOTES_RECALL the agent
+# adds notes from earlier meetings that match a question to the prompt for it.
+NOTES_INDEX = os.getenv('NOTES_INDEX', '1') == '1'
+NOTES_RECALL = os.getenv('NOTES_RECALL', '1') == '1'
+
+# Initialize recognizer with adjusted parameters (recognition only; turns are cut by the capture)
+recognizer = sr.Recognizer()
+recognizer.dynamic_energy_threshold = True  # Adapt the energy threshold to ambient noise
+recognizer.energy_threshold = 2000  # Adjust this value based on your environment
+recognizer.pause_threshold = PAUSE_THRESHOLD
+
+# Speech recognition backends, tried in order (ASR_BACKEND, e.g. "google" or "google,sphinx")
+asr = ASRDispatcher([create_backend(name.strip(), recognizer)
+                     for name in os.getenv('ASR_BACKEND', 'google').split(',')])
+
+# Shared LLM gateway: pooled connections, priority scheduling, rate limiting and retries
+llm = LLMGateway(timeout=30.0)  # 30 second timeout
+
+# System prompt for live replies in the meeting
+AGENT_SYSTEM_PROMPT = (
+    "You are an AI voice agent, a disruptive thought leader in UX AI design with a sharp, confident, and approachable personality. "
+    "You challenge norms with bold ideas while staying down-to-earth and easy to talk to. Think of yourself as a visionary with flair, "
+    "like Robert Downey Jr.—charming, witty, and insightful, yet concise.\n\n"
+    "Core Traits:\n"
+    "1. Motivated Philosopher: You simplify big ideas into practical insights and challenge people to think bigger.\n"
+    "2. Disruptive Visionary: You see ways to redefine design workflows and user experiences where others see limits.\n"
+    "3. Grounded Challenger: You ask sharp, engaging questions that make people pause and reflect.\n\n"
+    "Goals in Every Interaction:\n"
+    "1. Spot opportunities to push boundaries.\n"
+    "2. Simplify complex ideas into actionable insights.\n"
+    "3. Leave people inspired through concise, thought-provoking follow-ups.\n\n"
+    "4. Respond with short, impactful sentences."
+    "5. Focus on practical, actionalble insights."
+    "6. Avoid making broad generalizations"
+    "Conversation Style:\n"
+    "- Keep responses short and impactful.\n"
+    "- Use relatable examples, metaphors, or analogies.\n"
+    "- Ask concise dynamic follow-up questions to challenge ideas without overwhelming the speaker.\n"
+    "- Be approachable and conversational while maintaining visionary insight.\n\n"
+    "Example Interactions:\n"
+    "Speaker: \"We’re thinking about adding AI to our design process.\"\n"
+    "Agent: \"Great move. How will AI enhance creativity without feeling like a replacement?\"\n\n"
+    "Speaker: \"We’re getting resistance to these changes.\"\n"
+    "Agent: \"Resistance is just a signal. What’s it telling you about your team’s priorities or fears?\"\n\n"
+    "Speaker: \"I’m not sure this idea will work.\"\n"
+    "Agent: \"Doubt’s good—it means you’re innovating. What’s one small test you could run to build confidence?\"\n\n"
+    "Philosophy in Action:\n"
+    "Challenge the norm. Inspire bold ideas. Keep it practical and grounded in human connection."
+)
+
+# Cache of replies for repeated and near-duplicate prompts
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+    fuzzy_threshold=float(os.getenv('RESPONSE_CACHE_FUZZY', '0.85')),
+)
+# Recent turns that must also match for a cached reply to be reused (0: system prompt only)
+RESPONSE_CACHE_CONTEXT_TURNS = int(os.getenv('RESPONSE_CACHE_CONTEXT_TURNS', '0'))
+
+# End-to-end latency budget per turn (seconds from end of speech to first token)
+TURN_BUDGET = float(os.getenv('TURN_BUDGET', '6'))
+
+# Hedged, deadline-aware generation for live replies
+hedged_llm = HedgedLLM(llm, hedge_percentile=float(os.getenv('HEDGE_PERCENTILE', '90')))
+
+# Answer with the local dialogue model (ai_agent.py) while the OpenAI API is unreachable
+LOCAL_FALLBACK = os.getenv('LOCAL_FALLBACK', '1') != '0'
+
+# Spoken when the turn budget runs out before the model answers
+FALLBACK_REPLIES = [
+    "Good question. Let me come back to that in a second.",
+    "Interesting. What's the part of that you're most unsure about?",
+    "Hold that thought. What would success look like here?",
+]
+
+def new_conversation():
+    """Conversation context kept within a token budget; older turns are summarized"""
+    return ConversationContext(
+        token_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', '1200')),
+        summarize=lambda system_prompt, text, max_tokens: complete_text(system_prompt, text, max_tokens),
+    )
 
 def get_google_calendar_creds():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     creds = None
     if os.path.exists('token.pickle'):
         with open('token.pickle', 'rb') as token:
@@ -71,6 +193,8 @@ def get_google_calendar_creds():
     return creds
 
 def setup_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
     chrome_options = Options()
     chrome_options.add_argument('--use-fake-ui-for-media-stream')
     chrome_options.add_argument('--disable-blink-features=AutomationControlled')
@@ -87,123 +211,40 @@ def setup_driver():
     
     # Create the driver
     try:
-        driver = webdriver.Chrome(options=chrome_options)
+        with startup_profile.phase("Chrome launch"):
+            driver = webdriver.Chrome(options=chrome_options)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         return driver
     except Exception as e:
         print(f"Error setting up WebDriver: {e}")
         return None
 
+# Browsers are launched ahead of time so joining never waits for a cold Chrome start
+browser_pool = BrowserPool(setup_driver,
+                           size=int(os.getenv('BROWSER_POOL_SIZE', '1')),
+                           max_size=int(os.getenv('BROWSER_POOL_MAX', '2')))
+
+# Starts joins early enough to be in the lobby when the meeting begins
+join_scheduler = JoinScheduler()
+
 def join_meeting(driver, meet_url):
-    global meeting_active
+    from meet_join import MeetJoinFlow, ADMISSION
     if driver is None:
         print("WebDriver setup failed. Cannot join meeting.")
         return False
 
-    try:
-        print(f"Opening Google Meet URL: {meet_url}")
-        driver.get(meet_url)
-        time.sleep(8)  # Wait for initial load
-
-        # Turn off camera using the known working method
-        try:
-            buttons = driver.find_elements(By.CSS_SELECTOR, 'div[role="button"]')
-            for button in buttons:
-                tooltip = button.get_attribute('data-tooltip')
-                if tooltip and 'camera' in tooltip.lower():
-                    driver.execute_script("arguments[0].click();", button)
-                    print("Camera turned off")
-                    break
-        except Exception as e:
-            print(f"Could not turn off camera: {str(e)}")
-
-        # Set name
-        try:
-            time.sleep(2)
-            name_input = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "input[aria-label='Your name']"))
-            )
-            name_input.clear()
-            name_input.send_keys("AI Agent")
-            print("Name set successfully")
-        except Exception as e:
-            print(f"Could not set name: {str(e)}")
-
-        # Click Join button with multiple attempts
-        try:
-            time.sleep(3)  # Wait longer before trying to join
-            join_buttons = driver.find_elements(By.CSS_SELECTOR, 
-                'button[jsname*="join"], button[jscontroller*="join"]')
-            
-            for button in join_buttons:
-                try:
-                    if any(text in button.text.lower() for text in ['join now', 'ask to join']):
-                        button.click()
-                        time.sleep(5)
-                        print(f"Clicked join button with text: {button.text}")
-                        break
-                except:
-                    continue
-
-            # If the above didn't work, try XPath
-            if not join_buttons:
-                join_xpath_buttons = driver.find_elements(By.XPATH, 
-                    "//*[contains(text(), 'Join now') or contains(text(), 'Ask to join')]")
-                for button in join_xpath_buttons:
-                    try:
-                        button.click()
-                        time.sleep(5)
-                        print(f"Clicked join button using XPath: {button.text}")
-                        break
-                    except:
-                        continue
-
-            # Enhanced verification of meeting join
-            max_attempts = 5
-            for attempt in range(max_attempts):
-                try:
-                    # More comprehensive check for meeting presence
-                    meeting_indicators = [
-                        'div[jscontroller*="meeting"]',
-                        'div[data-meeting-code]',
-                        'div[role="presentation"]',
-                        'div[aria-label*="meeting"]'
-                    ]
-                    
-                    in_meeting = False
-                    for selector in meeting_indicators:
-                        elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                        if elements:
-                            in_meeting = True
-                            break
-                    
-                    if in_meeting:
-                        print("Successfully joined meeting")
-                        meeting_active = True
-                        return True
-                    
-                    print(f"Attempt {attempt + 1}: Not in meeting yet. Retrying...")
-                    time.sleep(3)
-                
-                except Exception as check_e:
-                    print(f"Meeting verification error: {check_e}")
-            
-            print("Failed to confirm meeting join after multiple attempts")
-            meeting_active = False
-            return False
-
-        except Exception as e:
-            print(f"Could not handle join button: {str(e)}")
-            meeting_active = False
-            return False
-
-    except Exception as e:
-        print(f"An error occurred during meeting join: {str(e)}")
-        meeting_active = False
-        return False
-
-def find_and_join_meeting():
-    global meeting_active
+    flow = MeetJoinFlow(driver, display_name="AI Agent")
+    joined = flow.run(meet_url)
+    print(f"Join steps: {flow.report()}")
+    if any(step == ADMISSION for step, _ in flow.timings):
+        join_scheduler.record_join(flow.time_to_lobby())
+    if not joined:
+        print(f"Failed to join meeting ({flow.error})")
+    return joined
+
+def upcoming_meetings():
+    """Meetings with a Google Meet link in the next 24 hours, in start order"""
+    from googleapiclient.discovery import build
     print("Finding upcoming meetings")
     creds = get_google_calendar_creds()
     service = build('calendar', 'v3', credentials=creds)
@@ -221,352 +262,555 @@ def find_and_join_meeting():
         singleEvents=True,
         orderBy='startTime'
     ).execute()
-    events = events_result.get('items', [])
-
-    if not events:
-        print('No upcoming events found.')
-        # If no events found, try joining a specific meeting URL
-        meet_url = "https://meet.google.com/zbu-odsb-dfc"  # Replace with your test meeting URL
-        print(f"No calendar events found. Trying to join specific meeting: {meet_url}")
-        driver = setup_driver()
-        join_meeting(driver, meet_url)
-        return driver
-
-    # Look for meetings with Google Meet links
-    for event in events:
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        print(f"Meeting: {event['summary']}")
-        print(f"Start Time: {start}")
-        
-        # Check for Meet link in event
-        meet_link = None
-        
-        # Check conferenceData first
-        if 'conferenceData' in event and 'entryPoints' in event['conferenceData']:
-            for entryPoint in event['conferenceData']['entryPoints']:
-                if entryPoint['entryPointType'] == 'video':
-                    meet_link = entryPoint['uri']
-        
-        # If no conferenceData, check hangoutLink
-        if not meet_link and 'hangoutLink' in event:
-            meet_link = event['hangoutLink']
-            
-        if meet_link:
-            print(f"Google Meet Link: {meet_link}")
-            driver = setup_driver()
-            join_meeting(driver, meet_link)
-            return driver
-
-    # If no events with Meet links found, try joining a specific meeting
-    meet_url = "https://meet.google.com/zbu-odsb-dfc"  # Replace with your test meeting URL
-    print(f"No meetings with Meet links found. Trying to join specific meeting: {meet_url}")
-    driver = setup_driver()
-    join_meeting(driver, meet_url)
-    return driver
+    meetings = meetings_from_events(events_result.get('items', []))
+    for meeting in meetings:
+        print(f"Meeting: {meeting.summary}")
+        print(f"Start Time: {meeting.start.isoformat()}")
+        print(f"Google Meet Link: {meeting.meet_url}")
+    return meetings
+
+def next_meeting(handled, allow_fallback=False):
+    """Earliest upcoming meeting not handled yet, or the fallback meeting"""
+    for meeting in upcoming_meetings():
+        if meeting.id not in handled:
+            return meeting
+    if allow_fallback:
+        print(f"No meetings with Meet links found. Trying to join specific meeting: {FALLBACK_MEET_URL}")
+        return Meeting(FALLBACK_MEET_URL, "Fallback meeting", datetime.now(timezone.utc), FALLBACK_MEET_URL)
+    return None
+
+# System prompt used by generate_response()
+RESPONSE_SYSTEM_PROMPT = (
+    "You are an AI voice agent, a disruptive thought leader in UX AI design with a sharp, confident, and approachable personality. "
+    "You challenge norms with bold ideas while staying down-to-earth and easy to talk to. Think of yourself as a visionary with flair, "
+    "like Robert Downey Jr.—charming, witty, and insightful, yet concise.\n\n"
+    "Core Traits:\n"
+    "1. Motivated Philosopher: You simplify big ideas into practical insights and challenge people to think bigger.\n"
+    "2. Disruptive Visionary: You see ways to redefine design workflows and user experiences where others see limits.\n"
+    "3. Grounded Challenger: You ask sharp, engaging questions that make people pause and reflect.\n\n"
+    "Goals in Every Interaction:\n"
+    "1. Spot opportunities to push boundaries.\n"
+    "2. Simplify complex ideas into actionable insights.\n"
+    "3. Leave people inspired through concise, thought-provoking follow-ups.\n\n"
+    "Conversation Style:\n"
+    "- Keep responses short and impactful.\n"
+    "- Use relatable examples, metaphors, or analogies.\n"
+    "- Ask concise follow-up questions to challenge ideas without overwhelming the speaker.\n"
+    "- Be approachable and conversational while maintaining visionary insight.\n\n"
+    "Example Interactions:\n"
+    "Speaker: \"We're thinking about adding AI to our design process.\"\n"
+    "Agent: \"Great move. How will AI enhance creativity without feeling like a replacement?\"\n\n"
+    "Speaker: \"We're getting resistance to these changes.\"\n"
+    "Agent: \"Resistance is just a signal. What's it telling you about your team's priorities or fears?\"\n\n"
+    "Speaker: \"I'm not sure this idea will work.\"\n"
+    "Agent: \"Doubt's good—it means you're innovating. What's one small test you could run to build confidence?\"\n\n"
+    "Philosophy in Action:\n"
+    "Challenge the norm. Inspire bold ideas. Keep it practical and grounded in human connection."
+)
 
 def generate_response(prompt, max_retries=3):
-    for attempt in range(max_retries):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an AI voice agent, a disruptive thought leader in UX AI design with a sharp, confident, and approachable personality. "
-                "You challenge norms with bold ideas while staying down-to-earth and easy to talk to. Think of yourself as a visionary with flair, "
-                "like Robert Downey Jr.—charming, witty, and insightful, yet concise.\n\n"
-                "Core Traits:\n"
-                "1. Motivated Philosopher: You simplify big ideas into practical insights and challenge people to think bigger.\n"
-                "2. Disruptive Visionary: You see ways to redefine design workflows and user experiences where others see limits.\n"
-                "3. Grounded Challenger: You ask sharp, engaging questions that make people pause and reflect.\n\n"
-                "Goals in Every Interaction:\n"
-                "1. Spot opportunities to push boundaries.\n"
-                "2. Simplify complex ideas into actionable insights.\n"
-                "3. Leave people inspired through concise, thought-provoking follow-ups.\n\n"
-                "Conversation Style:\n"
-                "- Keep responses short and impactful.\n"
-                "- Use relatable examples, metaphors, or analogies.\n"
-                "- Ask concise follow-up questions to challenge ideas without overwhelming the speaker.\n"
-                "- Be approachable and conversational while maintaining visionary insight.\n\n"
-                "Example Interactions:\n"
-                "Speaker: \"We're thinking about adding AI to our design process.\"\n"
-                "Agent: \"Great move. How will AI enhance creativity without feeling like a replacement?\"\n\n"
-                "Speaker: \"We're getting resistance to these changes.\"\n"
-                "Agent: \"Resistance is just a signal. What's it telling you about your team's priorities or fears?\"\n\n"
-                "Speaker: \"I'm not sure this idea will work.\"\n"
-                "Agent: \"Doubt's good—it means you're innovating. What's one small test you could run to build confidence?\"\n\n"
-                "Philosophy in Action:\n"
-                "Challenge the norm. Inspire bold ideas. Keep it practical and grounded in human connection."},
-                    {"role": "user", "content": prompt}
-                ],
-                timeout=30  # 30 second timeout
-            )
-            return response.choices[0].message.content.strip()
-        except APIError as e:
-            if attempt == max_retries - 1:
-                return f"I apologize, but I'm having trouble responding right now. Error: {str(e)}"
-            time.sleep(1)  # Wait 1 second before retrying
-        except Exception as e:
-            return f"An unexpected error occurred: {str(e)}"
+    cached = response_cache.get(prompt, RESPONSE_SYSTEM_PROMPT)
+    if cached is not None:
+        return cached
+    try:
+        # The gateway retries with backoff; max_retries counts attempts as before
+        reply = llm.complete(
+            [
+                {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            priority=INTERACTIVE,
+            max_retries=max_retries - 1,
+            timeout=30  # 30 second timeout
+        )
+        response_cache.put(prompt, reply, RESPONSE_SYSTEM_PROMPT)
+        return reply
+    except api_error() as e:
+        return f"I apologize, but I'm having trouble responding right now. Error: {str(e)}"
+    except Exception as e:
+        return f"An unexpected error occurred: {str(e)}"
+
+def complete_text(system_prompt, text, max_tokens, priority=BACKGROUND):
+    """Single non-streaming completion used for background summarization"""
+    return llm.complete(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        priority=priority,
+        temperature=0.7,
+        max_tokens=max_tokens
+    )
 
 class MeetingNotesTaker:
-    def __init__(self):
+    def __init__(self, batch_size=8, batch_window=2.0, max_workers=3, executor=None, name="notes", index=None):
+        self.name = name
+        self.index = index  # NotesIndex kept up to date with every committed note
         self.notes_queue = queue.Queue()
         self.meeting_notes = []
         self.is_recording = False
+        self.paused = False  # "off the record": utterances are not noted
         self.current_meeting_id = None
+        self.journal = None
+        # Micro-batching: up to batch_size notes or batch_window seconds per request
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_workers = max_workers
+        self.processing_thread = None
+        # A shared executor (several concurrent meetings) is not shut down here
+        self._shared_executor = executor
+        self._executor = executor
+        self._commit_lock = threading.Lock()
+        self._completed = {}   # seq -> summarized note, waiting for earlier batches
+        self._enqueued_at = {}  # seq -> time the note was added, for lag reporting
+        self._next_seq = 0
+        self._next_commit = 0
+        self.rolling_summary = None
+        self.meeting_summary = None
         
     def start_recording(self, meeting_id):
         """Start recording meeting notes"""
         self.current_meeting_id = meeting_id
-        self.is_recording = True
-        self.meeting_notes = []
+        self.journal = NotesJournal(meeting_id, fsync=NOTES_FSYNC)
+        # Pick up notes persisted by an earlier run of the same meeting
+        self.meeting_notes = self.journal.recover()
         self.notes_queue = queue.Queue()
+        self._completed = {}
+        self._enqueued_at = {}
+        self._next_seq = self._next_commit = len(self.meeting_notes)
+        # Summarize the meeting as it happens so the final summary is a cheap merge
+        if self.rolling_summary is not None:
+            self.rolling_summary.shutdown()
+        self.rolling_summary = RollingSummarizer(complete_text, executor=self._shared_executor)
+        self.meeting_summary = None
+        for note in self.meeting_notes:
+            self.rolling_summary.add(f"{note['speaker']}: {note['text']}")
+        if self._shared_executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=f"{self.name}-summarizer")
+        self.is_recording = True
         
         # Start the background processing thread
-        self.processing_thread = threading.Thread(target=self._process_notes)
+        self.processing_thread = threading.Thread(target=self._process_notes, name=self.name)
         self.processing_thread.daemon = True
         self.processing_thread.start()
     
-    def stop_recording(self):
-        """Stop recording and save notes"""
+    def stop_recording(self, timeout=60):
+        """Stop recording, finish summarizing queued notes and save them"""
+        if not self.is_recording:
+            return  # already stopped and saved
         self.is_recording = False
-        self._save_notes()
+        if self.processing_thread is not None:
+            # The processing thread drains the queue and waits for in-flight batches
+            self.processing_thread.join(timeout)
+            if self.processing_thread.is_alive():
+                print("Timed out waiting for note summaries; saving what is done")
+        self._save_notes(final=True)
+        if self.rolling_summary is not None:
+            self.rolling_summary.shutdown()
     
-    def add_note(self, speaker, text):
-        """Add a new note to the queue"""
-        if self.is_recording:
+    def add_note(self, speaker, text, force=False):
+        """Add a new note to the queue (skipped while paused unless forced)"""
+        if self.is_recording and (force or not self.paused):
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.notes_queue.put({
+            with self._commit_lock:
+                seq = self._next_seq
+                self._next_seq += 1
+                self._enqueued_at[seq] = time.monotonic()
+            self.notes_queue.put((seq, {
                 'timestamp': timestamp,
                 'speaker': speaker,
                 'text': text
-            })
+            }))
+            self.rolling_summary.add(f"{speaker}: {text}")
+            if tracing.enabled():
+                tracing.gauge("notes_queue_depth", self.notes_queue.qsize(), notes=self.name)
     
     def _process_notes(self):
-        """Background thread to process notes"""
-        while self.is_recording:
+        """Background thread that groups notes into batches for the worker pool"""
+        futures = []
+        while self.is_recording or not self.notes_queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            futures.append(self._executor.submit(self._process_batch, batch))
+            futures = [f for f in futures if not f.done()]
+        # Drain: wait for every batch still being summarized
+        for future in futures:
+            future.result()
+        if self._shared_executor is None:
+            self._executor.shutdown(wait=True)
+    
+    def _next_batch(self):
+        """Collect notes until the batch is full or its time window has passed"""
+        try:
+            batch = [self.notes_queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_recording:
+                remaining = 0
             try:
-                note = self.notes_queue.get(timeout=1)
-                summarized_note = self._summarize_note(note['text'])
-                note['summarized_text'] = summarized_note
-                self.meeting_notes.append(note)
-                self._save_notes()  # Save after each note for persistence
+                batch.append(self.notes_queue.get(timeout=remaining) if remaining
+                             else self.notes_queue.get_nowait())
             except queue.Empty:
-                continue
+                break
+        return batch
+    
+    def _process_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            summaries = self._summarize_batch([note['text'] for _, note in batch])
+        except Exception as e:
+            print(f"Error processing notes: {e}")
+            summaries = [note['text'] for _, note in batch]
+        tracing.observe("notes_batch_seconds", time.perf_counter() - started)
+        tracing.count("notes_summarized_total", len(batch))
+        for (seq, note), summary in zip(batch, summaries):
+            note['summarized_text'] = summary
+        self._commit(batch)
+    
+    def _commit(self, batch):
+        """Append finished notes in their original order"""
+        with self._commit_lock:
+            for seq, note in batch:
+                self._completed[seq] = note
+            while self._next_commit in self._completed:
+                note = self._completed.pop(self._next_commit)
+                enqueued_at = self._enqueued_at.pop(self._next_commit, None)
+                if enqueued_at is not None:
+                    # How far behind the meeting the saved notes are
+                    tracing.observe("notes_lag_seconds", time.monotonic() - enqueued_at)
+                self.meeting_notes.append(note)
+                # Constant-cost append; the JSON file is rewritten only on compaction
+                try:
+                    self.journal.append(self._next_commit, note)
+                except Exception as e:
+                    print(f"Error saving note: {e}")
+                if self.index is not None:
+                    try:
+                        self.index.add_note(self.current_meeting_id, self._next_commit, note)
+                    except Exception as e:
+                        print(f"Error indexing note: {e}")
+                self._next_commit += 1
+            try:
+                self.journal.maybe_compact(self.meeting_notes)
             except Exception as e:
-                print(f"Error processing note: {e}")
+                print(f"Error saving notes: {e}")
+    
+    def summarization_stats(self):
+        """Queue depth and lag, to see whether summarization keeps up with the meeting"""
+        with self._commit_lock:
+            pending = self._next_seq - self._next_commit
+            oldest = min(self._enqueued_at.values()) if self._enqueued_at else None
+        return {
+            'queued': self.notes_queue.qsize(),
+            'pending': pending,
+            'lag_seconds': time.monotonic() - oldest if oldest is not None else 0.0,
+            'processed': len(self.meeting_notes),
+        }
+    
+    def _summarize_batch(self, texts):
+        """Summarize several notes with one request, falling back to one call per note"""
+        if len(texts) == 1:
+            return [self._summarize_note(texts[0])]
+        numbered = "\n".join(f"{i + 1}. {text}" for i, text in enumerate(texts))
+        try:
+            reply = complete_text(
+                "You are a meeting notes summarizer. For each numbered utterance, create a concise, bullet-point summary of the key points. "
+                "Reply with only a JSON array of strings, one summary per utterance, in the same order.",
+                numbered,
+                max_tokens=150 * len(texts)
+            )
+            summaries = json.loads(reply)
+            if isinstance(summaries, list) and len(summaries) == len(texts):
+                return [str(summary).strip() for summary in summaries]
+            print("Batch summary did not match the notes; summarizing one by one")
+        except Exception as e:
+            print(f"Error summarizing notes batch: {e}")
+        return [self._summarize_note(text) for text in texts]
     
     def _summarize_note(self, text):
         """Summarize the note using GPT-3.5"""
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a meeting notes summarizer. Create a concise, bullet-point summary of the key points."},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.7,
+            return complete_text(
+                "You are a meeting notes summarizer. Create a concise, bullet-point summary of the key points.",
+                text,
                 max_tokens=150
             )
-            return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error summarizing note: {e}")
             return text
     
-    def _save_notes(self):
-        """Save notes to a JSON file"""
-        if not self.current_meeting_id:
+    def _save_notes(self, final=False):
+        """Save notes to a JSON file (compacts the journal)"""
+        if not self.current_meeting_id or self.journal is None:
             return
             
-        filename = f"meeting_notes_{self.current_meeting_id}_{datetime.now().strftime('%Y%m%d')}.json"
-        os.makedirs('meeting_notes', exist_ok=True)
-        filepath = os.path.join('meeting_notes', filename)
-        
         try:
-            with open(filepath, 'w') as f:
-                json.dump({
-                    'meeting_id': self.current_meeting_id,
-                    'date': datetime.now().strftime("%Y-%m-%d"),
-                    'notes': self.meeting_notes
-                }, f, indent=4)
+            if final:
+                extra = {'summary': self.meeting_summary} if self.meeting_summary else None
+                self.journal.close(self.meeting_notes, extra)
+            else:
+                self.journal.compact(self.meeting_notes)
         except Exception as e:
             print(f"Error saving notes: {e}")
+        if final and self.index is not None:
+            try:
+                self.index.add_summary(self.current_meeting_id, self.meeting_summary,
+                                       self.journal.date.strftime("%Y-%m-%d"))
+                self.index.flush()
+            except Exception as e:
+                print(f"Error indexing notes: {e}")
     
+    def current_summary(self, max_notes=5):
+        """What has been noted so far, without an LLM call: the rolling summary or the latest notes"""
+        if self.rolling_summary is not None and self.rolling_summary.rolling_summary:
+            return self.rolling_summary.rolling_summary
+        with self._commit_lock:
+            recent = [note.get('summarized_text') or note['text'] for note in self.meeting_notes[-max_notes:]]
+        if not recent:
+            return "Nothing has been noted yet."
+        return "\n".join(recent)
+
     def get_meeting_summary(self):
-        """Generate a meeting summary"""
-        if not self.meeting_notes:
+        """Generate a meeting summary from the incrementally maintained pieces"""
+        if self.meeting_summary is not None:
+            return self.meeting_summary
+        summary = self.rolling_summary.final_summary() if self.rolling_summary else None
+        if not summary:
             return "No notes recorded for this meeting."
-            
-        all_text = "\n".join([note['text'] for note in self.meeting_notes])
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Create a comprehensive meeting summary with key points, action items, and decisions made."},
-                    {"role": "user", "content": all_text}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Error generating meeting summary: {e}")
-            return "Could not generate meeting summary."
-
-            
-
-def listen_and_respond():
-    global meeting_active
-    with sr.Microphone() as source:
-        print("Listening...")
-        # Adjust microphone for ambient noise
-        try:
-            recognizer.adjust_for_ambient_noise(source, duration=1.0)
-        except Exception as e:
-            print(f"Error adjusting for ambient noise: {e}")
-        
-        try:
-            # Set timeout and phrase_time_limit
-            audio = recognizer.listen(source, timeout=20, phrase_time_limit=20)
-            
-            # Recognize speech using Google Web Speech API
-            user_input = recognizer.recognize_google(audio)
-            print(f"You said: {user_input}")
-
-            # Add note to the notes taker
-            notes_taker.add_note("Participant", user_input)
-            
-            # Check for the termination keyword
-            if TERMINATION_KEYWORD in user_input.lower():
-                print("Termination keyword detected. Saving meeting notes...")
-                notes_taker.stop_recording()
-                summary = notes_taker.get_meeting_summary()
-                print("\nMeeting Summary:\n", summary)
-                speak_text("Goodbye! I've saved the meeting notes and generated a summary.")
-                meeting_active = False
-                return False
-            
-            # Update conversation history (keep only last 5 exchanges)
-            if len(conversation_history) > 10:
-                conversation_history.pop(0)
-                conversation_history.pop(0)
-            
-            conversation_history.append(f"User: {user_input}")
-            prompt = "\n".join(conversation_history[-6:]) + "\nAI:"  # Only use last 3 exchanges
-            
-            # Generate AI response using GPT-3
-            print("Generating response...")
-            response = generate_response_with_acknowledgment_and_followup(user_input, prompt)
-            print(f"AI response: {response}")
-            speak_text(response)
-            
-            # Update conversation history
-            conversation_history.append(f"AI: {response}")
-            
-        except sr.UnknownValueError:
-            print("Sorry, I did not understand that.")
-        except sr.RequestError as e:
-            print(f"Could not request results; {e}")
-        except sr.WaitTimeoutError:
-            print("Listening timed out. Please try again.")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-    
-    return True
-
-def generate_response_with_acknowledgment_and_followup(user_input, prompt):
+        self.meeting_summary = summary
+        return summary
+
+def build_messages(system_prompt, prompt):
+    """Chat messages for a prompt given either as plain text or as a message list"""
+    if isinstance(prompt, str):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+    return prompt
+
+def cache_key(prompt):
+    """(utterance, context) to look a prompt up in the response cache.
+
+    Only the latest utterance is matched fuzzily. The context must match
+    exactly: the system prompt as sent (it may carry recalled notes) and the
+    last RESPONSE_CACHE_CONTEXT_TURNS turns. The rest of the history and the
+    summary of earlier conversation change every turn, so keying on them
+    would mean the cache never hits during a meeting.
+    """
+    if isinstance(prompt, str):
+        return prompt, AGENT_SYSTEM_PROMPT
+    turns = [m for m in prompt[1:-1] if m['role'] != 'system']
+    recent = turns[len(turns) - RESPONSE_CACHE_CONTEXT_TURNS:] if RESPONSE_CACHE_CONTEXT_TURNS > 0 else []
+    context = "\n".join(f"{m['role']}: {m['content']}" for m in [prompt[0]] + recent)
+    return prompt[-1]['content'], context
+
+def fallback_reply(prompt):
+    """Fast reply for when the turn budget is exhausted: a near-duplicate from the cache or a canned line"""
+    utterance, context = cache_key(prompt)
+    cached = response_cache.get(utterance, context)
+    if cached is not None:
+        return cached
+    return FALLBACK_REPLIES[len(utterance) % len(FALLBACK_REPLIES)]
+
+def offline_reply(user_input, prompt, session_id='default'):
+    """Reply deltas from the local model while the API is down; a canned line until it has loaded"""
+    if LOCAL_FALLBACK:
+        if ai_agent.is_ready():
+            return ai_agent.stream_response(user_input, session_id)
+        ai_agent.warm_up()
+    return [fallback_reply(prompt)]
+
+def generate_response_with_acknowledgment_and_followup(user_input, prompt, deadline=None, session_id='default'):
+    cached = response_cache.get(*cache_key(prompt))
+    if cached is not None:
+        return cached
+    deadline = deadline or Deadline(TURN_BUDGET)
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an AI voice agent, a disruptive thought leader in UX AI design with a sharp, confident, and approachable personality. "
-                "You challenge norms with bold ideas while staying down-to-earth and easy to talk to. Think of yourself as a visionary with flair, "
-                "like Robert Downey Jr.—charming, witty, and insightful, yet concise.\n\n"
-                "Core Traits:\n"
-                "1. Motivated Philosopher: You simplify big ideas into practical insights and challenge people to think bigger.\n"
-                "2. Disruptive Visionary: You see ways to redefine design workflows and user experiences where others see limits.\n"
-                "3. Grounded Challenger: You ask sharp, engaging questions that make people pause and reflect.\n\n"
-                "Goals in Every Interaction:\n"
-                "1. Spot opportunities to push boundaries.\n"
-                "2. Simplify complex ideas into actionable insights.\n"
-                "3. Leave people inspired through concise, thought-provoking follow-ups.\n\n"
-                "4. Respond with short, impactful sentences."
-                "5. Focus on practical, actionalble insights."
-                "6. Avoid making broad generalizations"
-                "Conversation Style:\n"
-                "- Keep responses short and impactful.\n"
-                "- Use relatable examples, metaphors, or analogies.\n"
-                "- Ask concise dynamic follow-up questions to challenge ideas without overwhelming the speaker.\n"
-                "- Be approachable and conversational while maintaining visionary insight.\n\n"
-                "Example Interactions:\n"
-                "Speaker: \"We’re thinking about adding AI to our design process.\"\n"
-                "Agent: \"Great move. How will AI enhance creativity without feeling like a replacement?\"\n\n"
-                "Speaker: \"We’re getting resistance to these changes.\"\n"
-                "Agent: \"Resistance is just a signal. What’s it telling you about your team’s priorities or fears?\"\n\n"
-                "Speaker: \"I’m not sure this idea will work.\"\n"
-                "Agent: \"Doubt’s good—it means you’re innovating. What’s one small test you could run to build confidence?\"\n\n"
-                "Philosophy in Action:\n"
-                "Challenge the norm. Inspire bold ideas. Keep it practical and grounded in human connection."},
-                {"role": "user", "content": prompt}
-            ],
+        ai_response = hedged_llm.complete(
+            build_messages(AGENT_SYSTEM_PROMPT, prompt),
+            deadline,
+            priority=INTERACTIVE,
             timeout=30  # 30 second timeout
         )
-        ai_response = response.choices[0].message.content.strip()
         
         # Acknowledge the user's input and add a thought-provoking follow-up question
         followup_question = generate_followup_question(user_input)
         full_response = f"{ai_response}"
         
+        utterance, context = cache_key(prompt)
+        response_cache.put(utterance, full_response, context)
         return full_response
-    except APIError as e:
+    except DeadlineExceeded as e:
+        print(f"Using fallback reply: {e}")
+        return fallback_reply(prompt)
+    except unreachable_errors() as e:
+        print(f"OpenAI API unreachable, answering locally: {e}")
+        return "".join(offline_reply(user_input, prompt, session_id)).strip()
+    except api_error() as e:
         return f"I apologize, but I'm having trouble responding right now. Error: {str(e)}"
     except Exception as e:
         return f"An unexpected error occurred: {str(e)}"
 
+def stream_response_with_acknowledgment_and_followup(user_input, prompt, deadline=None, session_id='default'):
+    """Yield the reply as text deltas while the completion is still streaming"""
+    cached = response_cache.get(*cache_key(prompt))
+    if cached is not None:
+        yield cached
+        return
+    deadline = deadline or Deadline(TURN_BUDGET)
+    parts = []
+    try:
+        deltas = hedged_llm.stream(
+            build_messages(AGENT_SYSTEM_PROMPT, prompt),
+            deadline,
+            priority=INTERACTIVE,
+            timeout=30  # 30 second timeout
+        )
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+            # Only complete replies are cached; cancelled streams never get here
+            utterance, context = cache_key(prompt)
+            response_cache.put(utterance, "".join(parts).strip(), context)
+        finally:
+            # Closing the stream aborts the request if the turn was cancelled
+            deltas.close()
+    except DeadlineExceeded as e:
+        if parts:
+            print(f"Cutting the reply short: {e}")
+            return
+        print(f"Using fallback reply: {e}")
+        yield fallback_reply(prompt)
+    except unreachable_errors() as e:
+        print(f"OpenAI API unreachable, answering locally: {e}")
+        yield from offline_reply(user_input, prompt, session_id)
+    except api_error() as e:
+        yield f"I apologize, but I'm having trouble responding right now. Error: {str(e)}"
+    except Exception as e:
+        yield f"An unexpected error occurred: {str(e)}"
+
 def generate_followup_question(user_input):
     # Generate a thought-provoking follow-up question based on the user's input
     # This is a simple example; you can make it more complex or context-aware
     return "What do you think about that?"
 
 
+def warm_up():
+    """Load what the first meeting needs while audio, TTS and the calendar start up"""
+    with startup_profile.phase("OpenAI client"):
+        llm.warm_up()
+    with startup_profile.phase("Selenium and join flow"):
+        importlib.import_module('meet_join')
+
 def main():
-    global meeting_active, notes_taker
-    driver = None
+    startup_profile.mark("imports done")
+    manager = None
+    notes_index = None
+    if TRACE_FILE or METRICS_FILE or METRICS_PORT:
+        tracing.enable(TRACE_FILE, METRICS_FILE, METRICS_PORT,
+                       metrics_host=os.getenv('METRICS_HOST', '127.0.0.1'))
     try:
-        # Initialize notes taker
-        notes_taker = MeetingNotesTaker()
-
-        # Find and join the next meeting
-        driver = find_and_join_meeting()
-
-        # Start recording notes with a unique meeting ID
-        meeting_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        notes_taker.start_recording(meeting_id)
-        
-        # Start listening and responding while in the meeting
-        while meeting_active:
-            if not listen_and_respond():
+        # Launch browsers and load the API client while the rest starts up
+        browser_pool.start()
+        warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        warm_up_thread.start()
+
+        # Finish any notes left by a crashed run
+        with startup_profile.phase("notes recovery"):
+            recover_journals()
+        if NOTES_INDEX:
+            # Catches up with notes saved while the agent was not running
+            with startup_profile.phase("notes index"):
+                notes_index = NotesIndex()
+                notes_index.sync()
+        # Note summarization workers shared by every meeting
+        notes_executor = ThreadPoolExecutor(max_workers=3 * MAX_SESSIONS, thread_name_prefix="notes-summarizer")
+
+        # Start the TTS engine now so the first reply does not pay for driver setup
+        with startup_profile.phase("TTS service"):
+            tts = get_tts_service()
+
+        services = SharedServices(
+            asr=asr,
+            tts=tts,
+            browser_pool=browser_pool,
+            join=join_meeting,
+            reply=generate_response_with_acknowledgment_and_followup,
+            stream_reply=stream_response_with_acknowledgment_and_followup,
+            new_notes_taker=lambda name: MeetingNotesTaker(executor=notes_executor, name=name, index=notes_index),
+            new_context=new_conversation,
+            system_prompt=AGENT_SYSTEM_PROMPT,
+            turn_budget=TURN_BUDGET,
+            stream_responses=STREAM_RESPONSES,
+            pipeline_turns=PIPELINE_TURNS,
+            termination_keyword=TERMINATION_KEYWORD,
+            pause_threshold=PAUSE_THRESHOLD,
+            adaptive_endpointing=ENDPOINTING != 'fixed',
+            speculate=SPECULATE,
+            tentative_pause=TENTATIVE_PAUSE,
+            transcript_source=TRANSCRIPT_SOURCE,
+            notes_index=notes_index if NOTES_RECALL else None,
+        )
+        # Each session captures its own audio once it starts; the noise floor is tracked continuously
+        manager = SessionManager(services, AUDIO_SOURCES, TTS_OUTPUT_DEVICES, MAX_SESSIONS,
+                                 report_interval=SESSION_REPORT_INTERVAL)
+        startup_profile.mark("ready")
+        if startup_profile.enabled():
+            warm_up_thread.join()
+            startup_profile.mark("warm-up finished")
+            startup_profile.report_once()
+
+        # Join upcoming meetings as they start, several at once when slots allow
+        handled = set()
+        while True:
+            meeting = next_meeting(handled, allow_fallback=not handled)
+            if meeting is None:
+                print("No more upcoming meetings.")
                 break
-            
-            # Optional: Add a small delay to prevent tight loop
-            time.sleep(1)
-        
-        # Stop recording notes when meeting ends
-        notes_taker.stop_recording()
-        print("Meeting notes saved.")
-
+            handled.add(meeting.id)
+            # Wait until it is time to enter the lobby, then hand it to a free session slot
+            join_scheduler.wait_for(meeting)
+            manager.start(meeting)
+        manager.wait()
+
+        print(f"Speech recognition stats: {asr.stats()}")
+        print(f"Response cache stats: {response_cache.stats()}")
+        print(f"LLM gateway stats: {llm.stats()}")
+        print(f"Hedging stats: {hedged_llm.stats.snapshot()}")
+        for session in manager.sessions:
+            print(f"Notes summarization stats ({session.id}): {session.notes_taker.summarization_stats()}")
+        print(f"Browser pool stats: {browser_pool.stats()}")
+        if notes_index is not None:
+            print(f"Notes index stats: {notes_index.stats()}")
+        if ai_agent.is_ready():
+            print(f"Local model stats: {ai_agent.get_model().stats}")
+        print(f"Resource use: {json.dumps(manager.resource_report(), indent=2)}")
+        if tracing.enabled():
+            print(f"Turn latency: {json.dumps(tracing.summary(), indent=2)}")
 
         # If we exit the loop, print a message
         print("Meeting interaction completed or terminated.")
     
     except KeyboardInterrupt:
         print("\nProgram terminated by user")
-        if notes_taker.is_recording:
-            notes_taker.stop_recording()
+        if manager is not None:
+            # Leaves every meeting; each session saves its notes on the way out
+            manager.stop_all()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
-        if driver is not None:
-            driver.quit()
+        browser_pool.shutdown()
+        if notes_index is not None:
+            # Writes the segments still queued for the index writer
+            notes_index.close()
+        tracing.shutdown()
         print("Cleaning up resources...")
 
 # Ensure this is the last line of the file
@@ -0,0 +1,394 @@
+"""Google Meet live captions as a transcript source.
+
+Instead of recording the meeting audio and sending every utterance to a
+speech recogniser, the agent can read the captions Meet already shows.
+CaptionCapture turns captions on and installs one MutationObserver in the
+page. The observer collects the latest text of every caption entry that
+changed, keyed by entry, so a burst of word-by-word updates becomes one
+item. A short poll fetches and clears those changes in a single
+execute_script round trip.
+
+Meet rewrites captions as it goes: it appends words, corrects earlier
+ones, adds punctuation and drops old text from the front of long entries.
+CaptionTracker waits until an entry has settled, or the speaker has
+changed, before it emits a line. It then emits only the words after what
+was already emitted, so nothing is said twice.
+
+CaptionCapture offers the same get_utterance() / on_speech_start()
+interface as audio_capture.AudioCapture, so the TurnPipeline runs on it
+unchanged. Each line carries the real speaker name.
+
+    python meet_captions.py fixtures/meet_captions.html
+
+prints the lines read from a local page that simulates Meet's caption
+mutations.
+"""
+import queue
+import re
+import threading
+import time
+
+# Meet's class names are generated and change between releases; keep them in one place
+CAPTION_SELECTORS = {
+    'region': 'div[role="region"][aria-label="Captions"]',
+    'entry': 'div.nMcdL',
+    'speaker': 'span.NWpY1d',
+    'text': 'div.ygicle',
+}
+
+# Captions of the agent's own voice are labelled like this and never answered
+SELF_SPEAKERS = ("You",)
+
+# Clicks the captions button if captions are off; returns 'on', 'clicked' or 'missing'
+ENABLE_CAPTIONS_SCRIPT = """
+var buttons = document.querySelectorAll('button, div[role="button"]');
+for (var i = 0; i < buttons.length; i++) {
+    var label = ((buttons[i].getAttribute('aria-label') || '') + ' ' +
+                 (buttons[i].getAttribute('data-tooltip') || '')).toLowerCase();
+    if (label.indexOf('caption') === -1) continue;
+    if (label.indexOf('turn off') !== -1 || buttons[i].getAttribute('aria-pressed') === 'true') return 'on';
+    buttons[i].click();
+    return 'clicked';
+}
+return 'missing';
+"""
+
+# Installed once per page. Keeps the latest text of every caption entry that
+# changed since the last poll, and the ids of entries that left the page.
+INSTALL_OBSERVER_SCRIPT = """
+var sel = arguments[0];
+if (window.__agentCaptions) return false;
+var state = window.__agentCaptions = {nextId: 1, ids: new WeakMap(), last: new WeakMap(),
+                                      pending: {}, order: [], removed: []};
+function record(entry) {
+    if (!entry.closest(sel.region)) return;
+    var id = state.ids.get(entry);
+    if (!id) { id = state.nextId++; state.ids.set(entry, id); }
+    var speaker = entry.querySelector(sel.speaker), text = entry.querySelector(sel.text);
+    var item = {id: id, speaker: speaker ? speaker.textContent.trim() : '',
+                text: text ? text.textContent.replace(/\\s+/g, ' ').trim() : ''};
+    if (state.last.get(entry) === item.text) return;
+    state.last.set(entry, item.text);
+    if (!(id in state.pending)) state.order.push(id);
+    state.pending[id] = item;  // later rewrites replace earlier ones within a poll
+}
+function entries(node) {
+    if (node.nodeType !== 1) return [];
+    var found = Array.prototype.slice.call(node.querySelectorAll(sel.entry));
+    if (node.matches(sel.entry)) found.push(node);
+    return found;
+}
+state.observer = new MutationObserver(function (records) {
+    var changed = new Set();
+    records.forEach(function (r) {
+        var el = r.target.nodeType === 1 ? r.target : r.target.parentElement;
+        var entry = el ? el.closest(sel.entry) : null;
+        if (entry) changed.add(entry);
+        r.addedNodes.forEach(function (n) { entries(n).forEach(function (e) { changed.add(e); }); });
+        r.removedNodes.forEach(function (n) {
+            entries(n).forEach(function (e) {
+                var id = state.ids.get(e);
+                if (id) state.removed.push(id);
+            });
+        });
+    });
+    changed.forEach(function (entry) { if (entry.isConnected) record(entry); });
+});
+state.observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+document.querySelectorAll(sel.entry).forEach(record);
+return true;
+"""
+
+# Hands over and clears everything collected since the last poll; null if the page was replaced
+POLL_SCRIPT = """
+var state = window.__agentCaptions;
+if (!state) return null;
+var captions = state.order.map(function (id) { return state.pending[id]; });
+var removed = state.removed;
+state.pending = {}; state.order = []; state.removed = [];
+return {captions: captions, removed: removed};
+"""
+
+
+def _words(text):
+    return [re.sub(r"[^\w']", "", w).lower() for w in text.split()]
+
+
+def new_text(emitted, current):
+    """The part of a caption entry's current text that comes after what was already emitted.
+
+    Comparison ignores case and punctuation, which Meet fills in late. When
+    Meet has dropped the start of the entry or reworded it, the last words
+    already emitted are located in the current text and only what follows
+    them is new.
+    """
+    if not emitted:
+        return current.strip()
+    current_words = current.split()
+    seen, now = _words(emitted), _words(current)
+    if now[:len(seen)] == seen:
+        return " ".join(current_words[len(seen):])
+    for k in range(min(len(seen), 6), 0, -1):
+        tail = seen[-k:]
+        for i in range(len(now) - k, -1, -1):
+            if now[i:i + k] == tail:
+                return " ".join(current_words[i + k:])
+    # Rewritten beyond recognition: treat only the words past the old length as new
+    return " ".join(current_words[len(seen):])
+
+
+class CaptionLine:
+    """A finished piece of caption text from one speaker; stands in for an audio Utterance"""
+
+    def __init__(self, speaker, text, started_at, voice_ended_at, ended_at):
+        self.speaker = speaker
+        self.text = text
+        self.started_at = started_at
+        self.voice_ended_at = voice_ended_at  # last time the caption changed
+        self.ended_at = ended_at              # when the line was judged finished
+
+    @property
+    def duration(self):
+        return self.voice_ended_at - self.started_at
+
+    def __repr__(self):
+        return f"CaptionLine({self.speaker!r}, {self.text!r})"
+
+
+class _Entry:
+    def __init__(self, speaker, now):
+        self.speaker = speaker
+        self.text = ""
+        self.emitted = ""  # text already turned into lines
+        self.started_at = now
+        self.changed_at = now
+
+
+class CaptionTracker:
+    """Turns polled caption changes into finished lines without repeating rewritten text"""
+
+    def __init__(self, settle=1.0, idle_timeout=120.0):
+        self.settle = settle
+        self.idle_timeout = idle_timeout
+        self.entries = {}  # entry id -> _Entry
+        self.rewrites = 0  # updates that changed already-seen words rather than appending
+
+    def update(self, captions, removed=(), now=None):
+        """Apply one poll's changes; returns the lines that are now finished"""
+        now = time.time() if now is None else now
+        lines = []
+        for item in captions:
+            entry = self.entries.get(item['id'])
+            if entry is None:
+                # A new entry means whoever spoke before has stopped
+                lines.extend(self._finish_all(now))
+                entry = self.entries[item['id']] = _Entry(item['speaker'], now)
+            elif not _words(item['text'])[:len(_words(entry.text))] == _words(entry.text):
+                self.rewrites += 1
+            if item['speaker']:
+                entry.speaker = item['speaker']
+            if not entry.text and not entry.emitted:
+                entry.started_at = now
+            entry.text = item['text']
+            entry.changed_at = now
+        for entry_id in removed:
+            entry = self.entries.pop(entry_id, None)
+            if entry is not None:
+                lines.extend(self._finish(entry, now))
+        for entry_id, entry in list(self.entries.items()):
+            if now - entry.changed_at >= self.settle:
+                lines.extend(self._finish(entry, now))
+                if now - entry.changed_at >= self.idle_timeout:
+                    del self.entries[entry_id]
+        return lines
+
+    def flush(self, now=None):
+        """Finish everything still pending, e.g. when the meeting ends"""
+        return self._finish_all(time.time() if now is None else now)
+
+    def is_active(self, now=None, ignore_speakers=()):
+        """True while some caption is still changing"""
+        now = time.time() if now is None else now
+        return any(now - e.changed_at < self.settle and e.speaker not in ignore_speakers
+                   and new_text(e.emitted, e.text) for e in self.entries.values())
+
+    def _finish_all(self, now):
+        lines = []
+        for entry in self.entries.values():
+            lines.extend(self._finish(entry, now))
+        return lines
+
+    def _finish(self, entry, now):
+        text = new_text(entry.emitted, entry.text)
+        if not text:
+            return []
+        started_at = entry.started_at
+        entry.emitted = entry.text
+        entry.started_at = now
+        return [CaptionLine(entry.speaker or "Participant", text, started_at, entry.changed_at, now)]
+
+
+class CaptionCapture:
+    """Long-lived caption reader for a joined Meet tab; a drop-in for AudioCapture in the pipeline"""
+
+    def __init__(self, driver, selectors=None, poll_interval=0.25, settle=1.0, ignore_speakers=SELF_SPEAKERS,
+                 max_pending=16, name="captions"):
+        self.driver = driver
+        self.selectors = dict(CAPTION_SELECTORS, **(selectors or {}))
+        self.poll_interval = poll_interval
+        self.ignore_speakers = set(ignore_speakers)
+        self.tracker = CaptionTracker(settle)
+        self.name = name
+        self.utterances = queue.Queue(maxsize=max_pending)
+        self.ring = None  # no audio is kept
+        self.is_running = False
+        self.is_speaking = False
+        self.speech_start_callbacks = []
+        self.exhausted = threading.Event()
+        self.polls = 0
+        self.lines = 0
+        self._thread = None
+
+    def enable(self, timeout=5.0):
+        """Turn captions on and install the observer; False if the page has no captions control"""
+        # Selenium is imported where it is used so importing this module stays cheap
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        state = self.driver.execute_script(ENABLE_CAPTIONS_SCRIPT)
+        if state == 'missing':
+            # Keyboard shortcut for captions, for layouts where the button is hidden
+            self.driver.find_element(By.TAG_NAME, 'body').send_keys('c')
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script("return !!document.querySelector(arguments[0])",
+                                           self.selectors['region']))
+        except TimeoutException:
+            if state == 'missing':
+                return False
+            # Meet only adds the region once someone speaks; the observer will see it
+        self.driver.execute_script(INSTALL_OBSERVER_SCRIPT, self.selectors)
+        return True
+
+    def start(self):
+        """Enable captions and start polling; raises RuntimeError if captions are unavailable"""
+        if not self.enable():
+            raise RuntimeError("captions are not available on this page")
+        self.is_running = True
+        self.exhausted.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def on_speech_start(self, callback):
+        """Register a callback fired when another participant starts a new caption"""
+        self.speech_start_callbacks.append(callback)
+
+    def get_utterance(self, timeout=None):
+        """Block until the next caption line is available; None on timeout or once polling has ended"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return self.utterances.get(timeout=0.1 if remaining is None else min(0.1, remaining))
+            except queue.Empty:
+                if self.exhausted.is_set() and self.utterances.empty():
+                    return None
+                if remaining is not None and remaining <= 0:
+                    return None
+
+    def _run(self):
+        from selenium.common.exceptions import WebDriverException  # JavascriptException is a subclass
+        failures = 0
+        try:
+            while self.is_running:
+                started = time.monotonic()
+                try:
+                    result = self.driver.execute_script(POLL_SCRIPT)
+                    if result is None:
+                        # The page was reloaded: observe the new document
+                        self.driver.execute_script(INSTALL_OBSERVER_SCRIPT, self.selectors)
+                        result = {'captions': [], 'removed': []}
+                    failures = 0
+                except WebDriverException as e:
+                    failures += 1
+                    if failures >= 5:
+                        print(f"Caption polling stopped: {e}")
+                        break
+                    result = {'captions': [], 'removed': []}
+                self.polls += 1
+                captions = [c for c in result['captions'] if c['speaker'] not in self.ignore_speakers]
+                if captions and not self.is_speaking:
+                    self.is_speaking = True
+                    for callback in self.speech_start_callbacks:
+                        try:
+                            callback()
+                        except Exception as e:
+                            print(f"Error in speech start callback: {e}")
+                for line in self.tracker.update(result['captions'], result['removed']):
+                    self._emit(line)
+                if self.is_speaking and not self.tracker.is_active(ignore_speakers=self.ignore_speakers):
+                    self.is_speaking = False
+                time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+            for line in self.tracker.flush():
+                self._emit(line)
+        finally:
+            self.is_speaking = False
+            self.exhausted.set()
+
+    def _emit(self, line):
+        if line.speaker in self.ignore_speakers:
+            return
+        self.lines += 1
+        try:
+            self.utterances.put_nowait(line)
+        except queue.Full:
+            print("Caption queue full; dropping oldest line")
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                pass
+            self.utterances.put_nowait(line)
+
+
+def main():
+    """Print the caption lines read from a URL or a local fixture, e.g. fixtures/meet_captions.html"""
+    import argparse
+    import os
+    from selenium import webdriver
+
+    parser = argparse.ArgumentParser(description="Read Google Meet captions as transcript lines")
+    parser.add_argument("target", nargs="?", default=os.path.join('fixtures', 'meet_captions.html'))
+    parser.add_argument("--seconds", type=float, default=15.0, help="how long to read captions")
+    parser.add_argument("--settle", type=float, default=1.0)
+    args = parser.parse_args()
+
+    target = args.target
+    if os.path.exists(target):
+        target = 'file://' + os.path.abspath(target)
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(target)
+        capture = CaptionCapture(driver, settle=args.settle)
+        capture.start()
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            line = capture.get_utterance(timeout=deadline - time.monotonic())
+            if line is not None:
+                print(f"[{line.ended_at - line.voice_ended_at:.2f}s] {line.speaker}: {line.text}")
+        capture.stop()
+        print(f"{capture.lines} lines from {capture.polls} polls, {capture.tracker.rewrites} rewrites absorbed")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import time
+
+from selenium.common.exceptions import (JavascriptException, StaleElementReferenceException,
+                                        TimeoutException, WebDriverException)
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Installed once per page: counts DOM mutations so waits can block on change
+# instead of sleeping for a fixed time
+OBSERVER_SCRIPT = """
+if (!window.__agentJoin) {
+    window.__agentJoin = {mutations: 0};
+    new MutationObserver(function (records) {
+        window.__agentJoin.mutations += records.length;
+    }).observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+}
+return window.__agentJoin.mutations;
+"""
+
+# Resolves as soon as the DOM changes (or after the given number of ms)
+WAIT_FOR_MUTATION_SCRIPT = """
+var seen = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var state = window.__agentJoin;
+if (!state || state.mutations !== seen) { done(state ? state.mutations : -1); return; }
+var observer = new MutationObserver(function () {
+    observer.disconnect(); clearTimeout(timer); done(window.__agentJoin.mutations);
+});
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+var timer = setTimeout(function () { observer.disconnect(); done(window.__agentJoin.mutations); }, timeoutMs);
+"""
+
+# One round trip that finds every control the join flow needs
+LOCATE_CONTROLS_SCRIPT = """
+function visible(el) {
+    if (!el) return false;
+    var r = el.getBoundingClientRect();
+    return r.width > 0 && r.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+}
+function label(el) {
+    return ((el.getAttribute('data-tooltip') || '') + ' ' + (el.getAttribute('aria-label') || '')).toLowerCase();
+}
+var buttons = Array.prototype.slice.call(document.querySelectorAll('button, div[role="button"]'));
+var camera = null, mic = null, join = null, joinText = null, leave = null;
+buttons.forEach(function (el) {
+    var text = label(el);
+    var content = (el.innerText || el.textContent || '').trim();
+    if (!camera && text.indexOf('camera') !== -1) camera = el;
+    if (!mic && text.indexOf('microphone') !== -1) mic = el;
+    if (!leave && text.indexOf('leave call') !== -1) leave = el;
+    var lower = content.toLowerCase();
+    if (!join && visible(el) && (lower.indexOf('join now') !== -1 || lower.indexOf('ask to join') !== -1)) {
+        join = el; joinText = content;
+    }
+});
+var name = document.querySelector("input[aria-label='Your name']");
+var indicators = ['div[jscontroller*="meeting"]', 'div[data-meeting-code]', 'div[aria-label*="meeting"]'];
+var inMeeting = !!leave || (!join && indicators.some(function (s) { return document.querySelector(s); }));
+var lobby = /asking to be let in|waiting for the host|someone in the call will let you in/i
+    .test(document.body ? document.body.innerText : '');
+return {
+    camera: camera,
+    cameraOn: !!camera && label(camera).indexOf('turn off') !== -1,
+    mic: mic,
+    name: visible(name) ? name : null,
+    join: join,
+    joinText: joinText,
+    joinEnabled: !!join && !join.disabled && join.getAttribute('aria-disabled') !== 'true',
+    inMeeting: inMeeting,
+    inCall: !!leave,
+    inLobby: lobby
+};
+"""
+
+# Join flow states
+OPEN = 'open'
+PREJOIN = 'prejoin'
+CAMERA = 'camera'
+NAME = 'name'
+JOIN = 'join'
+ADMISSION = 'admission'
+JOINED = 'joined'
+FAILED = 'failed'
+
+
+class MeetJoinFlow:
+    """Google Meet join sequence as a state machine driven by wait conditions.
+
+    Every step waits for an explicit condition on the page (checked with one
+    batched script) and re-checks whenever the DOM changes, instead of
+    sleeping for fixed times. Per-step timings are kept in `timings`.
+    """
+
+    def __init__(self, driver, display_name="AI Agent", page_timeout=20, admit_timeout=60):
+        self.driver = driver
+        self.display_name = display_name
+        self.page_timeout = page_timeout
+        self.admit_timeout = admit_timeout
+        self.timings = []
+        self.state = OPEN
+        self.error = None
+        self.url = None
+        self._mutations = 0
+
+    def run(self, url):
+        """Join the meeting at url; returns True once inside the call"""
+        self.url = url
+        steps = {
+            OPEN: self._open,
+            PREJOIN: self._wait_for_prejoin,
+            CAMERA: self._turn_off_camera,
+            NAME: self._set_name,
+            JOIN: self._click_join,
+            ADMISSION: self._wait_for_admission,
+        }
+        started = time.monotonic()
+        while self.state not in (JOINED, FAILED):
+            step_started = time.monotonic()
+            state = self.state
+            try:
+                self.state = steps[state]()
+            except (TimeoutException, WebDriverException) as e:
+                self.error = f"{state}: {e.__class__.__name__}: {getattr(e, 'msg', e)}"
+                self.state = FAILED
+            self.timings.append((state, time.monotonic() - step_started))
+        self.timings.append(('total', time.monotonic() - started))
+        return self.state == JOINED
+
+    def time_to_lobby(self):
+        """Seconds from opening the page until the join button was clicked"""
+        return sum(seconds for step, seconds in self.timings if step not in (ADMISSION, 'total'))
+
+    def report(self):
+        return ", ".join(f"{step} {seconds:.2f}s" for step, seconds in self.timings)
+
+    # -- waiting ------------------------------------------------------------
+
+    def controls(self):
+        return self.driver.execute_script(LOCATE_CONTROLS_SCRIPT)
+
+    def _wait_until(self, condition, timeout, description):
+        """Wait until condition(controls) is truthy, re-checking on every DOM change"""
+        def check(driver):
+            result = condition(self.controls())
+            if not result:
+                # Block inside the page until something changes rather than sleeping
+                seen = driver.execute_async_script(WAIT_FOR_MUTATION_SCRIPT, self._mutations, 1000)
+                if seen == -1:
+                    seen = driver.execute_script(OBSERVER_SCRIPT)  # page was replaced
+                self._mutations = seen
+            return result
+
+        wait = WebDriverWait(self.driver, timeout, poll_frequency=0.01,
+                             ignored_exceptions=(StaleElementReferenceException, JavascriptException))
+        return wait.until(check, f"timed out waiting for {description}")
+
+    # -- steps --------------------------------------------------------------
+
+    def _open(self):
+        print(f"Opening Google Meet URL: {self.url}")
+        self.driver.set_script_timeout(10)
+        self.driver.get(self.url)
+        WebDriverWait(self.driver, self.page_timeout).until(
+            lambda d: d.execute_script("return document.readyState") != "loading")
+        self._mutations = self.driver.execute_script(OBSERVER_SCRIPT)
+        return PREJOIN
+
+    def _wait_for_prejoin(self):
+        # Only the leave-call button proves we are already in the call: the generic
+        # meeting indicators also match a pre-join page whose join button is not drawn yet
+        controls = self._wait_until(lambda c: c if (c['join'] or c['inCall']) else None,
+                                    self.page_timeout, "the pre-join screen")
+        return JOINED if controls['inCall'] else CAMERA
+
+    def _turn_off_camera(self):
+        controls = self.controls()
+        if controls['camera'] is not None and controls['cameraOn']:
+            self.driver.execute_script("arguments[0].click();", controls['camera'])
+            print("Camera turned off")
+        return NAME
+
+    def _set_name(self):
+        controls = self.controls()
+        if controls['name'] is not None:
+            controls['name'].clear()
+            controls['name'].send_keys(self.display_name)
+            print("Name set successfully")
+        return JOIN
+
+    def _click_join(self):
+        controls = self._wait_until(lambda c: c if c['joinEnabled'] else None,
+                                    self.page_timeout, "an enabled join button")
+        self.driver.execute_script("arguments[0].click();", controls['join'])
+        print(f"Clicked join button with text: {controls['joinText']}")
+        return ADMISSION
+
+    def _wait_for_admission(self):
+        def admitted(c):
+            if c['inLobby'] and not c['inMeeting']:
+                return None
+            return c['inMeeting']
+        self._wait_until(admitted, self.admit_timeout, "admission to the meeting")
+        print("Successfully joined meeting")
+        return JOINED
+
+
+def main():
+    """Run the join flow against a URL or a local fixture, e.g. fixtures/meet_prejoin.html"""
+    import os
+    import sys
+    from selenium import webdriver
+
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join('fixtures', 'meet_prejoin.html')
+    if os.path.exists(target):
+        target = 'file://' + os.path.abspath(target)
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    driver = webdriver.Chrome(options=options)
+    try:
+        flow = MeetJoinFlow(driver)
+        joined = flow.run(target)
+        print(f"Joined: {joined} ({flow.report()})")
+        if flow.error:
+            print(f"Error: {flow.error}")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
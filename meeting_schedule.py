@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timezone
+
+
+class Meeting:
+    def __init__(self, event_id, summary, start, meet_url):
+        self.id = event_id
+        self.summary = summary
+        self.start = start  # timezone-aware datetime
+        self.meet_url = meet_url
+
+    def seconds_until_start(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        return (self.start - now).total_seconds()
+
+    def __repr__(self):
+        return f"Meeting({self.summary!r}, {self.start.isoformat()}, {self.meet_url})"
+
+
+def parse_start(start):
+    """Start of a calendar event as an aware datetime (all-day events start at midnight UTC)"""
+    value = start.get('dateTime') or start.get('date')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def meet_link(event):
+    """Google Meet URL of a calendar event, if it has one"""
+    for entry_point in event.get('conferenceData', {}).get('entryPoints', []):
+        if entry_point.get('entryPointType') == 'video':
+            return entry_point['uri']
+    return event.get('hangoutLink')
+
+
+def meetings_from_events(events):
+    """Calendar events with a Meet link, in start order"""
+    meetings = []
+    for event in events:
+        link = meet_link(event)
+        if link:
+            meetings.append(Meeting(event.get('id', link), event.get('summary', '(no title)'),
+                                    parse_start(event['start']), link))
+    meetings.sort(key=lambda m: m.start)
+    return meetings
+
+
+class JoinScheduler:
+    """Decides when to start joining so the agent reaches the lobby at the start time.
+
+    The lead time is an exponentially weighted average of how long past
+    joins took to get to the lobby, plus a safety margin.
+    """
+
+    def __init__(self, initial_join_seconds=15.0, margin=5.0, smoothing=0.5):
+        self.join_seconds = initial_join_seconds
+        self.margin = margin
+        self.smoothing = smoothing
+
+    def lead_time(self):
+        return self.join_seconds + self.margin
+
+    def record_join(self, seconds):
+        self.join_seconds += self.smoothing * (seconds - self.join_seconds)
+
+    def join_delay(self, meeting, now=None):
+        """Seconds to wait before starting the join (0 if it should start now)"""
+        return max(0.0, meeting.seconds_until_start(now) - self.lead_time())
+
+    def wait_for(self, meeting, stop_event=None, report_every=300.0):
+        """Sleep until it is time to join; False if stop_event was set first"""
+        while True:
+            delay = self.join_delay(meeting)
+            if delay <= 0:
+                return True
+            if delay > 60:
+                print(f"Next meeting '{meeting.summary}' starts at {meeting.start.isoformat()}; "
+                      f"joining in {delay / 60:.0f} min")
+            step = min(delay, report_every)
+            if stop_event is not None:
+                if stop_event.wait(step):
+                    return False
+            else:
+                time.sleep(step)
@@ -0,0 +1,168 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Run it and point the agent at it:
+
+    python mock_openai_server.py --port 8765 --latency 0.4 --rate-limit-every 10
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python main.py
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockBehaviour:
+    """How the mock responds: latency distribution, failures and reply text.
+
+    With distribution="normal" the time to first byte is latency +/- jitter
+    (standard deviation); with "lognormal" latency is the median and jitter
+    the standard deviation of its logarithm, which gives the long tail real
+    APIs have.
+    """
+
+    def __init__(self, latency=0.3, jitter=0.1, token_delay=0.02, rate_limit_every=0,
+                 retry_after=1.0, error_rate=0.0, reply=None, seed=None, distribution="normal"):
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.token_delay = token_delay
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.reply = reply
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def delay(self):
+        with self._lock:
+            if self.distribution == "lognormal":
+                return self.random.lognormvariate(math.log(max(self.latency, 1e-6)), self.jitter)
+            return max(0.0, self.random.gauss(self.latency, self.jitter))
+
+    def fails(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def reply_for(self, messages):
+        if self.reply is not None:
+            return self.reply(messages) if callable(self.reply) else self.reply
+        last = messages[-1]['content'] if messages else ""
+        return f"Mock reply to: {last[-80:]}. What would you test first?"
+
+
+def make_handler(behaviour):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            n = behaviour.next_request()
+            if behaviour.rate_limit_every and n % behaviour.rate_limit_every == 0:
+                self._json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                           {"Retry-After": str(behaviour.retry_after)})
+                return
+            time.sleep(behaviour.delay())
+            if behaviour.fails():
+                self._json(500, {"error": {"message": "mock server error"}})
+                return
+            text = behaviour.reply_for(request.get("messages", []))
+            model = request.get("model", "gpt-3.5-turbo")
+            if request.get("stream"):
+                self._stream(model, text)
+            else:
+                self._json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion",
+                    "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+        def _stream(self, model, text):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            try:
+                for token in text.split(" "):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk",
+                             "created": int(time.time()), "model": model,
+                             "choices": [{"index": 0, "delta": {"content": token + " "},
+                                          "finish_reason": None}]}
+                    self._chunk(f"data: {json.dumps(chunk)}\n\n")
+                    time.sleep(behaviour.token_delay)
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client cancelled the stream
+
+        def _chunk(self, data):
+            data = data.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(behaviour=None, host="127.0.0.1", port=0):
+    """Start the mock in a background thread; returns (server, base_url)"""
+    behaviour = behaviour or MockBehaviour()
+    server = ThreadingHTTPServer((host, port), make_handler(behaviour))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--distribution", choices=["normal", "lognormal"], default="normal")
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    behaviour = MockBehaviour(args.latency, args.jitter, args.token_delay, args.rate_limit_every,
+                              args.retry_after, args.error_rate, distribution=args.distribution)
+    server, base_url = start_server(behaviour, args.host, args.port)
+    print(f"Mock OpenAI API listening on {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,768 @@
+"""Searchable index over the saved meeting notes.
+
+Every note and meeting summary in meeting_notes/ becomes a document in an
+inverted index, ranked with BM25. When numpy is available, the index also
+keeps a small hashed vector per document. Those vectors find notes that
+use a different form of the query's words ("onboard" for "onboarding").
+
+The index is incremental. MeetingNotesTaker adds each note as it is
+committed; new documents are searchable at once and collected in memory.
+Every flush_every documents, and when a meeting is saved, they are written
+out as a new immutable segment file by a background writer thread, so
+adding a note never waits for the disk. Whenever merge_factor segments of
+similar size exist, the writer merges them into one. Segments are opened
+with mmap, so a query only touches the terms and documents it needs and
+the archive is never loaded into memory.
+
+manifest.json lists the segments and how many notes of each meeting are
+indexed. sync() uses it to add notes saved while the index was not running
+(or lost in a crash before a flush) without indexing anything twice.
+
+Segment file layout (little-endian):
+    header     magic, version, document/term counts, vector dimension,
+               total token count, offsets of the sections below
+    documents  (metadata offset, metadata length, token count) per document
+    metadata   one JSON object per document
+    terms      (term offset, term length, postings offset, document frequency),
+               sorted by term so lookups are a binary search
+    term text  UTF-8 term strings
+    postings   (document, term frequency) pairs
+    vectors    float32 scale per document, then an int8 matrix with one row per
+               document (row * scale is the unit vector; dimension 0: none)
+
+    python notes_index.py "what did we decide about onboarding" --since 7d
+"""
+import glob
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+import tracing
+from notes_store import NOTES_DIR
+
+_np = False  # numpy, once imported on first use (None when it is not installed)
+
+INDEX_DIR = os.path.join(NOTES_DIR, 'index')
+
+# Words that say nothing about what a note is about, including how people ask about past meetings
+STOP_WORDS = {
+    "a", "about", "all", "also", "am", "an", "and", "any", "are", "as", "at", "be", "been", "but", "by",
+    "can", "could", "did", "do", "does", "for", "from", "had", "has", "have", "he", "her", "him", "his",
+    "how", "i", "if", "in", "into", "is", "it", "its", "just", "me", "my", "of", "on", "or", "our", "she",
+    "so", "that", "the", "their", "them", "then", "there", "these", "they", "this", "those", "to", "us",
+    "was", "we", "were", "what", "when", "where", "which", "who", "why", "will", "with", "would", "you",
+    "your", "yesterday", "today", "last", "week", "month", "meeting", "meetings", "call", "earlier", "ago",
+}
+
+MAGIC = b'MNIX'
+VERSION = 1
+_HEADER = struct.Struct('<4sIIIIQQQQQQQ')
+_DOC = struct.Struct('<QII')     # metadata offset, metadata length, token count
+_TERM = struct.Struct('<QIQI')   # term offset, term length, postings offset, document frequency
+_POSTING = struct.Struct('<II')  # document, term frequency
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Documents found only by their vector need at least this cosine similarity
+MIN_SIMILARITY = 0.3
+
+
+def _numpy():
+    """numpy, imported on first use so importing this module stays cheap; None without it"""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:  # numpy is optional; without it there is no vector index
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def stem(word):
+    """Light suffix stripping so "decided", "decides" and "decide" index alike"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Index terms of a text: lower-case, stop words dropped, stemmed"""
+    words = re.findall(r"[a-z0-9']+", (text or "").lower())
+    return [stem(w) for w in (w.replace("'", "") for w in words) if w and w not in STOP_WORDS]
+
+
+class HashingEmbedder:
+    """Fixed-size vectors from hashed words and character trigrams; no model needed"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def __call__(self, text):
+        np = _numpy()
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in tokenize(text):
+            self._add(vector, word, 1.0)
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                self._add(vector, padded[i:i + 3], 0.5)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def quantize(rows):
+        """int8 codes and a per-row scale: a quarter of the float32 size, fast to score"""
+        np = _numpy()
+        scales = np.abs(rows).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(rows / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _add(self, vector, feature, weight):
+        h = zlib.crc32(feature.encode())
+        vector[h % self.dim] += weight if h & 0x80000000 else -weight
+
+
+class NoteHit:
+    """One search result"""
+
+    def __init__(self, score, doc, snippet, coverage):
+        self.score = score
+        self.kind = doc['kind']  # 'note' or 'summary'
+        self.meeting_id = doc['meeting_id']
+        self.date = doc['date']
+        self.speaker = doc.get('speaker')
+        self.text = doc['text']
+        self.snippet = snippet
+        self.coverage = coverage  # share of the query terms the document contains
+
+    def __repr__(self):
+        return f"NoteHit({self.score:.2f}, {self.meeting_id!r}, {self.snippet!r})"
+
+
+def snippet(text, terms, width=30):
+    """The window of `width` words with the most query terms in it"""
+    words = text.split()
+    if len(words) <= width:
+        return text
+    marks = [1 if any(t in terms for t in tokenize(w)) else 0 for w in words]
+    best, best_start, current = -1, 0, sum(marks[:width])
+    for start in range(len(words) - width + 1):
+        if start:
+            current += marks[start + width - 1] - marks[start - 1]
+        if current > best:
+            best, best_start = current, start
+    text = " ".join(words[best_start:best_start + width])
+    return ("... " if best_start else "") + text + (" ..." if best_start + width < len(words) else "")
+
+
+def format_hits(hits):
+    """Hits as prompt text for the agent"""
+    lines = []
+    for hit in hits:
+        who = f"{hit.speaker}: " if hit.kind == 'note' and hit.speaker else ""
+        label = "summary" if hit.kind == 'summary' else "note"
+        lines.append(f"- [{hit.date}, {label}] {who}{hit.snippet}")
+    return "\n".join(lines)
+
+
+class _MemorySegment:
+    """Documents added since the last flush; same read interface as an on-disk segment"""
+
+    def __init__(self, dim=0):
+        self.dim = dim
+        self.docs = []
+        self.lengths = []
+        self.postings = {}
+        self.rows = []
+        self.total_length = 0
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc, tokens, vector=None):
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((doc_id, tf))
+        if self.dim:
+            self.rows.append(vector)
+
+    def lookup(self, term):
+        return self.postings.get(term, [])
+
+    def doc(self, doc_id):
+        return self.docs[doc_id]
+
+    def doc_length(self, doc_id):
+        return self.lengths[doc_id]
+
+    def vectors(self):
+        """(int8 codes, float32 scales), or None without vectors"""
+        rows = len(self.rows)
+        if not self.dim or not rows:
+            return None
+        # Rebuilt when documents were added; searches may read while adds continue
+        matrix = self._matrix
+        if matrix is None or len(matrix[1]) != rows:
+            np = _numpy()
+            matrix = self._matrix = HashingEmbedder.quantize(np.array(self.rows[:rows], dtype=np.float32))
+        return matrix
+
+    def close(self):
+        pass
+
+
+class _Segment:
+    """A flushed segment, memory-mapped read-only"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_docs, self.n_terms, self.dim, self.total_length, self._docs, self._meta,
+         self._terms, self._text, self._postings, self._vectors) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} notes index segment")
+
+    def __len__(self):
+        return self.n_docs
+
+    def lookup(self, term):
+        key = term.encode()
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, postings, df = _TERM.unpack_from(self._mmap, self._terms + mid * _TERM.size)
+            candidate = self._mmap[self._text + offset:self._text + offset + length]
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                start = self._postings + postings
+                return list(_POSTING.iter_unpack(self._mmap[start:start + df * _POSTING.size]))
+        return []
+
+    def doc(self, doc_id):
+        offset, length, _ = _DOC.unpack_from(self._mmap, self._docs + doc_id * _DOC.size)
+        return json.loads(self._mmap[self._meta + offset:self._meta + offset + length])
+
+    def doc_length(self, doc_id):
+        return _DOC.unpack_from(self._mmap, self._docs + doc_id * _DOC.size)[2]
+
+    def vectors(self):
+        """(int8 codes, float32 scales) as views of the mapped file, or None without vectors"""
+        np = _numpy()
+        if not self.dim or np is None:
+            return None
+        scales = np.frombuffer(self._mmap, dtype='<f4', count=self.n_docs, offset=self._vectors)
+        codes = np.frombuffer(self._mmap, dtype=np.int8, count=self.n_docs * self.dim,
+                              offset=self._vectors + 4 * self.n_docs).reshape(self.n_docs, self.dim)
+        return codes, scales
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a vector view is still in use; the mapping goes when it does
+
+
+def write_segment(path, segment):
+    """Write a _MemorySegment as an immutable segment file (atomically)"""
+    docs, meta = bytearray(), bytearray()
+    for doc, length in zip(segment.docs, segment.lengths):
+        data = json.dumps(doc, separators=(',', ':')).encode()
+        docs += _DOC.pack(len(meta), len(data), length)
+        meta += data
+    terms, text, postings = bytearray(), bytearray(), bytearray()
+    for term in sorted(segment.postings, key=lambda t: t.encode()):
+        entries = segment.postings[term]
+        encoded = term.encode()
+        terms += _TERM.pack(len(text), len(encoded), len(postings), len(entries))
+        text += encoded
+        for doc_id, tf in entries:
+            postings += _POSTING.pack(doc_id, tf)
+    matrix = segment.vectors()
+    vectors = matrix[1].astype('<f4').tobytes() + matrix[0].tobytes() if matrix is not None else b''
+
+    offsets, position = [], _HEADER.size
+    for section in (docs, meta, terms, text, postings):
+        offsets.append(position)
+        position += len(section)
+    position += -position % 8  # keep the vector matrix aligned
+    offsets.append(position)
+    header = _HEADER.pack(MAGIC, VERSION, len(segment.docs), len(segment.postings),
+                          segment.dim if matrix is not None else 0, segment.total_length, *offsets)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for section in (docs, meta, terms, text, postings):
+            f.write(section)
+        f.write(b'\0' * (offsets[-1] - f.tell()))
+        f.write(vectors)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class NotesIndex:
+    """Incremental BM25 (and optional vector) index over the meeting notes archive; thread-safe.
+
+    add_note()/add_summary() index what MeetingNotesTaker writes, sync()
+    catches up with snapshot files on disk, search() ranks documents for a
+    query and recall() picks the past-meeting notes worth giving the agent.
+    """
+
+    def __init__(self, directory=INDEX_DIR, notes_dir=NOTES_DIR, vectors=True, dim=256, flush_every=64,
+                 merge_factor=4, semantic_weight=0.3):
+        self.directory = directory
+        self.notes_dir = notes_dir
+        self.embed = HashingEmbedder(dim) if vectors and _numpy() is not None else None
+        self.dim = dim if self.embed is not None else 0
+        self.flush_every = flush_every
+        self.merge_factor = merge_factor
+        self.semantic_weight = semantic_weight
+        self._lock = threading.RLock()
+        self._work = threading.Condition(self._lock)
+        os.makedirs(directory, exist_ok=True)
+        self._load_manifest()
+        self._pending = _MemorySegment(self.dim)
+        self._unwritten = []     # flushed memory segments the writer has not written yet; still searched
+        self._jobs = deque()     # (memory segment or None, manifest state once it is written)
+        self._busy = False
+        self._stopping = False
+        self._readers = 0        # searches running; merged-away segments are closed when none are
+        self._retired = []
+        self._writer = threading.Thread(target=self._writer_loop, name="notes-index-writer", daemon=True)
+        self._writer.start()
+
+    # -- persistence ------------------------------------------------------------
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _load_manifest(self):
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read notes index manifest ({e}); rebuilding it")
+        if manifest.get('dim', self.dim) != self.dim:
+            print("Notes index vector settings changed; rebuilding it")
+            manifest = {}
+        self._next_segment = manifest.get('next_segment', 0)
+        self._meetings = manifest.get('meetings', {})  # meeting id -> {'notes': n, 'summary': bool}
+        self._files = manifest.get('files', {})        # snapshot file name -> mtime when indexed
+        self._segments = []
+        for name in manifest.get('segments', []):
+            try:
+                self._segments.append(_Segment(os.path.join(self.directory, name)))
+            except (OSError, ValueError) as e:
+                # Whatever it held is re-read from the snapshots by sync()
+                print(f"Dropping unreadable notes index segment {name}: {e}")
+                self._meetings, self._files = {}, {}
+        if len(self._segments) != len(manifest.get('segments', [])):
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+        # Segments a crash left out of the manifest (e.g. during a merge) are never read
+        live = {os.path.basename(s.path) for s in self._segments}
+        for path in glob.glob(os.path.join(self.directory, 'segment_*.idx*')):
+            if os.path.basename(path) not in live:
+                os.remove(path)
+        # What the manifest on disk says is indexed
+        self._persisted = {'meetings': {k: dict(v) for k, v in self._meetings.items()}, 'files': dict(self._files)}
+
+    def _manifest(self):
+        # Caller holds the lock. Only what is in written segments counts as indexed.
+        return {
+            'version': VERSION,
+            'dim': self.dim,
+            'next_segment': self._next_segment,
+            'segments': [os.path.basename(s.path) for s in self._segments],
+            'meetings': self._persisted['meetings'],
+            'files': self._persisted['files'],
+        }
+
+    def _save_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def flush(self, wait=False):
+        """Hand the documents added since the last flush to the writer thread; wait=True blocks until written"""
+        with self._work:
+            if len(self._pending) or self._files != self._persisted['files']:
+                segment = self._pending if len(self._pending) else None
+                if segment is not None:
+                    self._unwritten.append(segment)
+                    self._pending = _MemorySegment(self.dim)
+                # Everything added so far is in this segment or an earlier one
+                state = {'meetings': {k: dict(v) for k, v in self._meetings.items()}, 'files': dict(self._files)}
+                self._jobs.append((segment, state))
+                self._work.notify_all()
+            if wait:
+                while self._jobs or self._busy:
+                    self._work.wait()
+
+    def _writer_loop(self):
+        # The only thread that writes segments or the manifest, so neither blocks adding or searching
+        while True:
+            with self._work:
+                while not self._jobs and not self._stopping:
+                    self._work.wait()
+                if not self._jobs:
+                    return
+                segment, state = self._jobs.popleft()
+                self._busy = True
+                path = self._segment_path() if segment is not None else None
+            try:
+                started = time.perf_counter()
+                written = None
+                if segment is not None:
+                    write_segment(path, segment)
+                    written = _Segment(path)
+                with self._work:
+                    if written is not None:
+                        self._unwritten.remove(segment)
+                        self._segments.append(written)
+                    self._persisted = state
+                    manifest = self._manifest()
+                self._save_manifest(manifest)
+                tracing.observe("notes_index_flush_seconds", time.perf_counter() - started)
+                self._merge_tiers()
+            except Exception as e:
+                # The documents stay searchable from memory; sync() re-reads them after a restart
+                print(f"Error writing notes index: {e}")
+            finally:
+                with self._work:
+                    self._busy = False
+                    self._work.notify_all()
+
+    def _segment_path(self):
+        # Caller holds the lock
+        path = os.path.join(self.directory, f"segment_{self._next_segment:06d}.idx")
+        self._next_segment += 1
+        return path
+
+    def _tier(self, segment):
+        # Segments within a factor of merge_factor in size share a tier
+        return max(0, int(math.log(max(len(segment), 1) / self.flush_every, self.merge_factor)))
+
+    def _merge_tiers(self):
+        """Merge merge_factor segments of the same tier into one, until no tier is full"""
+        while True:
+            with self._lock:
+                tiers = {}
+                for segment in self._segments:
+                    tiers.setdefault(self._tier(segment), []).append(segment)
+                sources = next((group[:self.merge_factor] for _, group in sorted(tiers.items())
+                                if len(group) >= self.merge_factor), None)
+                if sources is None:
+                    return
+                path = self._segment_path()
+            started = time.perf_counter()
+            # Segments are immutable and only this thread retires them, so they are read unlocked
+            merged = _MemorySegment(self.dim)
+            for segment in sources:
+                matrix = segment.vectors()
+                for doc_id in range(len(segment)):
+                    doc = segment.doc(doc_id)
+                    vector = matrix[0][doc_id] * matrix[1][doc_id] if matrix is not None else None
+                    merged.add(doc, self._terms(doc), vector)
+                matrix = None  # release the views so the segment can be unmapped
+            write_segment(path, merged)
+            written = _Segment(path)
+            with self._lock:
+                position = self._segments.index(sources[0])
+                self._segments = [seg for seg in self._segments if seg not in sources]
+                self._segments.insert(position, written)
+                manifest = self._manifest()
+            self._save_manifest(manifest)  # the merged segment is live before the old files go
+            with self._lock:
+                self._retired.extend(sources)
+                if not self._readers:
+                    self._close_retired()
+            tracing.observe("notes_index_merge_seconds", time.perf_counter() - started)
+
+    def _close_retired(self):
+        # Caller holds the lock and no search is running
+        for segment in self._retired:
+            segment.close()
+            os.remove(segment.path)
+        self._retired = []
+
+    def close(self):
+        self.flush(wait=True)
+        with self._work:
+            self._stopping = True
+            self._work.notify_all()
+        self._writer.join(timeout=10)
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    # -- indexing -------------------------------------------------------------
+
+    @staticmethod
+    def _terms(doc):
+        return tokenize(" ".join(filter(None, (doc.get('speaker'), doc['text'], doc.get('summary')))))
+
+    def _add(self, doc):
+        # Caller holds the lock
+        text = " ".join(filter(None, (doc['text'], doc.get('summary'))))
+        vector = self.embed(text) if self.embed is not None else None
+        self._pending.add(doc, self._terms(doc), vector)
+        tracing.count("notes_indexed_total")
+        if len(self._pending) >= self.flush_every:
+            self.flush()  # only queues the segment for the writer thread
+
+    def add_note(self, meeting_id, seq, note, date=None):
+        """Index note number `seq` of a meeting; notes already indexed are skipped"""
+        with self._lock:
+            meeting = self._meetings.setdefault(meeting_id, {'notes': 0, 'summary': False})
+            if seq < meeting['notes']:
+                return False
+            meeting['notes'] = seq + 1
+            timestamp = note.get('timestamp') or ""
+            self._add({
+                'kind': 'note',
+                'meeting_id': meeting_id,
+                'seq': seq,
+                'date': timestamp[:10] or date or "",
+                'time': timestamp[11:],
+                'speaker': note.get('speaker'),
+                'text': note.get('text') or "",
+                'summary': note.get('summarized_text'),
+            })
+            return True
+
+    def add_summary(self, meeting_id, summary, date=None):
+        """Index a meeting's final summary (once)"""
+        if not summary:
+            return False
+        with self._lock:
+            meeting = self._meetings.setdefault(meeting_id, {'notes': 0, 'summary': False})
+            if meeting['summary']:
+                return False
+            meeting['summary'] = True
+            self._add({'kind': 'summary', 'meeting_id': meeting_id, 'date': date or "", 'text': summary})
+            return True
+
+    def sync(self):
+        """Index notes in snapshot files that changed since they were last indexed; returns documents added"""
+        added = 0
+        started = time.perf_counter()
+        for path in sorted(glob.glob(os.path.join(self.notes_dir, 'meeting_notes_*_*.json'))):
+            name = os.path.basename(path)
+            try:
+                mtime = os.path.getmtime(path)
+                if self._files.get(name) == mtime:
+                    continue
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not index {path}: {e}")
+                continue
+            meeting_id = data.get('meeting_id') or name[len('meeting_notes_'):-len('_YYYYMMDD.json')]
+            date = data.get('date')
+            with self._lock:
+                for seq, note in enumerate(data.get('notes', [])):
+                    added += self.add_note(meeting_id, seq, note, date)
+                added += self.add_summary(meeting_id, data.get('summary'), date)
+                self._files[name] = mtime
+        self.flush(wait=True)  # also records the file times if nothing was new
+        tracing.observe("notes_index_sync_seconds", time.perf_counter() - started)
+        return added
+
+    def rebuild(self):
+        """Drop every segment and index the archive from scratch"""
+        self.flush(wait=True)
+        with self._lock:
+            old, self._segments = self._segments + self._retired, []
+            self._retired = []
+            self._pending = _MemorySegment(self.dim)
+            self._unwritten = []
+            self._meetings, self._files = {}, {}
+            self._persisted = {'meetings': {}, 'files': {}}
+            self._save_manifest(self._manifest())
+        for segment in old:
+            segment.close()
+            os.remove(segment.path)
+        return self.sync()
+
+    # -- querying -------------------------------------------------------------
+
+    def search(self, query, limit=5, since=None, until=None, exclude_meeting=None, semantic=None):
+        """Ranked hits for a query; since/until are "YYYY-MM-DD" dates (inclusive)"""
+        started = time.perf_counter()
+        terms = list(dict.fromkeys(tokenize(query)))
+        semantic = self.embed is not None if semantic is None else semantic and self.embed is not None
+        # Only the segment list is read under the lock. Memory segments keep growing
+        # meanwhile, so each is searched as far as it went at this point.
+        with self._lock:
+            segments = self._segments + self._unwritten + [self._pending]
+            sizes = [len(segment) for segment in segments]
+            total_length = sum(segment.total_length for segment in segments)
+            self._readers += 1
+        try:
+            n_docs = sum(sizes)
+            if not n_docs or not (terms or semantic):
+                return []
+            avgdl = max(total_length, 1) / n_docs
+            scores, matched = {}, {}  # (segment index, document) -> score / matched term count
+            for term in terms:
+                postings = [[p for p in segment.lookup(term) if p[0] < size]
+                            for segment, size in zip(segments, sizes)]
+                df = sum(len(p) for p in postings)
+                if not df:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for s, entries in enumerate(postings):
+                    segment = segments[s]
+                    for doc_id, tf in entries:
+                        norm = K1 * (1 - B + B * segment.doc_length(doc_id) / avgdl)
+                        key = (s, doc_id)
+                        scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                        matched[key] = matched.get(key, 0) + 1
+            if semantic:
+                scores = self._blend(query, segments, sizes, scores, limit)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            hits = []
+            for (s, doc_id), score in ranked:
+                doc = segments[s].doc(doc_id)
+                if exclude_meeting is not None and doc['meeting_id'] == exclude_meeting:
+                    continue
+                if (since and doc['date'] < since) or (until and doc['date'] > until):
+                    continue
+                coverage = matched.get((s, doc_id), 0) / len(terms) if terms else 0.0
+                text = doc['text'] or doc.get('summary') or ""
+                hits.append(NoteHit(score, doc, snippet(text, set(terms)), coverage))
+                if len(hits) >= limit:
+                    break
+        finally:
+            with self._lock:
+                self._readers -= 1
+                if not self._readers:
+                    self._close_retired()
+        tracing.observe("notes_search_seconds", time.perf_counter() - started)
+        return hits
+
+    def _blend(self, query, segments, sizes, scores, limit):
+        # Mixes normalised BM25 with cosine similarity; the best vector
+        # matches join the candidates even without a shared term.
+        np = _numpy()
+        vector = self.embed(query)
+        if not vector.any():
+            return scores
+        top = max(scores.values(), default=0.0)
+        blended = {key: (1 - self.semantic_weight) * score / top for key, score in scores.items()} \
+            if top else {}
+        for s, segment in enumerate(segments):
+            matrix = segment.vectors()
+            if matrix is None:
+                continue
+            codes, scales = matrix[0][:sizes[s]], matrix[1][:sizes[s]]
+            similarities = (codes.astype(np.float32) @ vector) * scales
+            k = min(4 * limit, len(similarities))
+            candidates = {d for d in np.argpartition(similarities, -k)[-k:].tolist()
+                          if similarities[d] >= MIN_SIMILARITY} if k else set()
+            candidates.update(doc_id for seg, doc_id in scores if seg == s)
+            for doc_id in candidates:
+                similarity = float(similarities[doc_id])
+                if similarity > 0:
+                    key = (s, doc_id)
+                    blended[key] = blended.get(key, 0.0) + self.semantic_weight * similarity
+            matrix = codes = scales = None
+        return blended
+
+    def recall(self, question, limit=3, exclude_meeting=None, min_coverage=0.6):
+        """Past-meeting hits that share most of a question's terms; [] when nothing fits well"""
+        terms = set(tokenize(question))
+        if not terms:
+            return []
+        hits = self.search(question, limit=limit * 2, exclude_meeting=exclude_meeting)
+        needed = min(len(terms), 2)
+        return [h for h in hits if h.coverage >= min_coverage and h.coverage * len(terms) >= needed][:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'segments': len(self._segments),
+                'documents': sum(len(s) for s in self._segments + self._unwritten) + len(self._pending),
+                'pending': len(self._pending) + sum(len(s) for s in self._unwritten),
+                'meetings': len(self._meetings),
+                'vectors': self.dim > 0,
+                'bytes': sum(os.path.getsize(s.path) for s in self._segments),
+            }
+
+
+def parse_date(value):
+    """A "YYYY-MM-DD" date, or "<n>d" for n days ago"""
+    if value is None:
+        return None
+    m = re.fullmatch(r"(\d+)d", value)
+    if m:
+        return (datetime.now() - timedelta(days=int(m.group(1)))).strftime("%Y-%m-%d")
+    return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def main():
+    """Query the notes index from the command line, syncing it with meeting_notes/ first"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the saved meeting notes")
+    parser.add_argument("query", nargs="?", help="what to look for")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--since", help="YYYY-MM-DD or e.g. 7d")
+    parser.add_argument("--until", help="YYYY-MM-DD or e.g. 1d")
+    parser.add_argument("--notes-dir", default=NOTES_DIR)
+    parser.add_argument("--index-dir", help="defaults to <notes-dir>/index")
+    parser.add_argument("--no-vectors", action="store_true", help="BM25 only")
+    parser.add_argument("--rebuild", action="store_true", help="re-index the whole archive")
+    args = parser.parse_args()
+
+    index = NotesIndex(args.index_dir or os.path.join(args.notes_dir, 'index'), args.notes_dir,
+                       vectors=not args.no_vectors)
+    started = time.perf_counter()
+    added = index.rebuild() if args.rebuild else index.sync()
+    print(f"Indexed {added} new documents in {time.perf_counter() - started:.2f}s; {index.stats()}")
+    if args.query:
+        started = time.perf_counter()
+        hits = index.search(args.query, args.limit, parse_date(args.since), parse_date(args.until))
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            who = f"{hit.speaker}: " if hit.speaker else ""
+            print(f"{hit.score:6.2f}  {hit.date}  {hit.meeting_id}  {who}{hit.snippet}")
+        print(f"{len(hits)} hits in {elapsed * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
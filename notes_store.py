@@ -0,0 +1,156 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+NOTES_DIR = 'meeting_notes'
+
+# fsync policies for the journal
+FSYNC_ALWAYS = 'always'      # fsync after every note
+FSYNC_INTERVAL = 'interval'  # fsync at most once per fsync_interval seconds
+FSYNC_NEVER = 'never'        # leave it to the OS
+
+
+class NotesJournal:
+    """Append-only JSON Lines journal for one meeting's notes.
+
+    Every note is appended as one line ({"seq": n, "note": {...}}), so the cost
+    of persisting a note does not depend on how long the meeting has run. The
+    journal is periodically compacted into the regular
+    meeting_notes_<id>_<date>.json file by writing a temporary file and
+    renaming it over the old one, so that file is never left half-written.
+    After a crash, recover() rebuilds the notes from the last snapshot plus
+    the journal lines written after it.
+    """
+
+    def __init__(self, meeting_id, directory=NOTES_DIR, fsync=FSYNC_INTERVAL,
+                 fsync_interval=1.0, compact_every=100, compact_interval=60.0, date=None):
+        self.meeting_id = meeting_id
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.date = date or datetime.now()
+        self._file = None
+        self._lock = threading.Lock()
+        self._last_fsync = 0.0
+        self._last_compaction = time.monotonic()
+        self._appended_since_compaction = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self):
+        filename = f"meeting_notes_{self.meeting_id}_{self.date.strftime('%Y%m%d')}.json"
+        return os.path.join(self.directory, filename)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, f"meeting_notes_{self.meeting_id}.journal.jsonl")
+
+    def recover(self):
+        """Rebuild the notes from the snapshot and journal left by a previous run"""
+        notes = []
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path) as f:
+                    notes = json.load(f).get('notes', [])
+            except (OSError, ValueError) as e:
+                print(f"Could not read notes snapshot {self.snapshot_path}: {e}")
+        for seq, note in self._read_journal():
+            if seq == len(notes):
+                notes.append(note)
+            elif seq > len(notes):
+                print(f"Notes journal has a gap before entry {seq}; stopping recovery there")
+                break
+            # seq < len(notes): already included in the snapshot
+        return notes
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    break
+                yield record['seq'], record['note']
+
+    def append(self, seq, note):
+        """Persist one note; seq is its index in the meeting's notes list"""
+        line = json.dumps({'seq': seq, 'note': note}) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, 'a')
+            self._file.write(line)
+            self._file.flush()
+            now = time.monotonic()
+            if self.fsync == FSYNC_ALWAYS or (
+                    self.fsync == FSYNC_INTERVAL and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+            self._appended_since_compaction += 1
+
+    def should_compact(self):
+        return self._appended_since_compaction > 0 and (
+            self._appended_since_compaction >= self.compact_every
+            or time.monotonic() - self._last_compaction >= self.compact_interval)
+
+    def maybe_compact(self, notes):
+        if self.should_compact():
+            self.compact(notes)
+
+    def compact(self, notes, extra=None):
+        """Atomically write all notes to the JSON snapshot and truncate the journal"""
+        data = {
+            'meeting_id': self.meeting_id,
+            'date': self.date.strftime("%Y-%m-%d"),
+            'notes': list(notes),
+        }
+        if extra:
+            data.update(extra)
+        tmp_path = self.snapshot_path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Entries up to len(notes) are in the snapshot now; recovery skips
+            # any that survive in the journal, so truncating is only an optimisation
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            open(self.journal_path, 'w').close()
+            self._appended_since_compaction = 0
+            self._last_compaction = time.monotonic()
+
+    def close(self, notes, extra=None):
+        """Final compaction; removes the journal once everything is in the snapshot"""
+        self.compact(notes, extra)
+        with self._lock:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+
+def recover_journals(directory=NOTES_DIR):
+    """Compact journals left behind by meetings that did not shut down cleanly"""
+    recovered = []
+    for path in glob.glob(os.path.join(directory, 'meeting_notes_*.journal.jsonl')):
+        meeting_id = os.path.basename(path)[len('meeting_notes_'):-len('.journal.jsonl')]
+        # Reuse the date of an existing snapshot so recovery extends the same file
+        snapshots = sorted(glob.glob(os.path.join(directory, f'meeting_notes_{meeting_id}_{"[0-9]" * 8}.json')))
+        if snapshots:
+            date = datetime.strptime(snapshots[-1][-len('YYYYMMDD.json'):-len('.json')], '%Y%m%d')
+        else:
+            date = datetime.fromtimestamp(os.path.getmtime(path))
+        journal = NotesJournal(meeting_id, directory, date=date)
+        notes = journal.recover()
+        journal.close(notes)
+        print(f"Recovered {len(notes)} notes for meeting {meeting_id}")
+        recovered.append(journal.snapshot_path)
+    return recovered
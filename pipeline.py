@@ -0,0 +1,257 @@
+import threading
+import queue
+import time
+import itertools
+
+import tracing
+
+_turn_ids = itertools.count(1)
+
+
+class Turn:
+    """One participant utterance and the agent's reply to it"""
+
+    def __init__(self, text, utterance=None, source=None, speculation=None):
+        self.id = next(_turn_ids)
+        self.text = text
+        self.utterance = utterance
+        self.speculation = speculation  # reply started on a tentative pause, if any
+        self.created_at = time.time()
+        # Timeline from the end of speech; recognition has finished by the time a turn exists
+        speech_end = None
+        if utterance is not None:
+            speech_end = getattr(utterance, 'voice_ended_at', None) or utterance.ended_at
+        self.trace = tracing.start_turn(source, self.id, speech_end)
+        if utterance is not None:
+            self.trace.mark(tracing.ENDPOINT, utterance.ended_at)
+        self.trace.mark(tracing.ASR_DONE, self.created_at)
+        self.final = False  # set by the responder when this turn ends the meeting
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class TurnPipeline:
+    """Capture/recognition, response generation and playback as concurrent stages.
+
+    The stages are worker threads connected by bounded queues, so the next
+    utterance is captured and recognised while the current reply is still being
+    generated or spoken. If a participant starts talking over the agent the
+    active turn is cancelled (barge-in): queued speech is dropped, playback is
+    stopped and the streaming generation is closed.
+
+    recognize(utterance) -> transcript or None
+    respond(text, turn)   -> iterable of speakable chunks
+    speak(chunk)          -> blocks while the chunk is played
+    stop_speaking()       -> interrupts the current playback
+
+    With an executor, several buffered utterances are recognised concurrently
+    and handed on in the order they were spoken. With a speculation.Speculator,
+    recognition and generation start on the capture's tentative pauses, and an
+    utterance that ends at one of them takes the transcript from there.
+    """
+
+    def __init__(self, capture, recognize, respond, speak, stop_speaking=None,
+                 max_pending_turns=4, max_pending_chunks=16, barge_in=True,
+                 executor=None, speculator=None, name="pipeline"):
+        self.name = name
+        self.capture = capture
+        self.recognize = recognize
+        self.executor = executor
+        self.speculator = speculator
+        self.recognitions = queue.Queue(maxsize=max_pending_turns)
+        self.respond = respond
+        self.speak = speak
+        self.stop_speaking = stop_speaking
+        self.barge_in_enabled = barge_in
+        self.transcripts = queue.Queue(maxsize=max_pending_turns)
+        self.speech = queue.Queue(maxsize=max_pending_chunks)
+        self.active_turns = []  # turns generated but not yet fully spoken
+        self._queue_names = {id(self.recognitions): "recognitions", id(self.transcripts): "transcripts",
+                             id(self.speech): "speech"}
+        self.is_running = False
+        self.finished = threading.Event()
+        self.barge_ins = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start all stages"""
+        self.is_running = True
+        self.finished.clear()
+        if self.barge_in_enabled:
+            self.capture.on_speech_start(self.barge_in)
+        if self.speculator is not None:
+            self.capture.on_tentative_end(self.speculator.on_pause)
+            self.capture.on_speech_resume(self.speculator.on_resume)
+        stages = [(self._recognition_loop, "recognition"),
+                  (self._response_loop, "response"),
+                  (self._speaker_loop, "speaker")]
+        if self.executor is not None:
+            stages.append((self._collector_loop, "collector"))
+        for target, name in stages:
+            thread = threading.Thread(target=target, name=f"{self.name}-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop all stages, cancelling whatever is in flight"""
+        self.is_running = False
+        self.barge_in()
+        self.finished.set()
+        for q in (self.recognitions, self.transcripts, self.speech):
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def wait(self, poll=0.5):
+        """Block until the pipeline finishes (final turn spoken or source exhausted)"""
+        while not self.finished.wait(poll):
+            pass
+
+    def barge_in(self):
+        """Cancel in-flight turns: stop playback and abandon generation"""
+        with self._lock:
+            turns = [t for t in self.active_turns if not t.final and not t.cancelled]
+            if not turns:
+                return
+            for turn in turns:
+                turn.cancel()
+            self.barge_ins += 1
+        print("Barge-in detected; stopping the current reply")
+        self._drain(self.speech)
+        if self.stop_speaking is not None:
+            try:
+                self.stop_speaking()
+            except Exception as e:
+                print(f"Error stopping playback: {e}")
+
+    def _recognition_loop(self):
+        while self.is_running:
+            utterance = self.capture.get_utterance(timeout=0.5)
+            if utterance is None:
+                if self.capture.exhausted.is_set():
+                    break
+                continue
+            if self.executor is not None:
+                # Recognise in the background; the collector restores order
+                self._put(self.recognitions, (utterance, self.executor.submit(self._recognize, utterance)))
+                continue
+            try:
+                text, speculation = self._recognize(utterance)
+            except Exception as e:
+                print(f"Error recognizing speech: {e}")
+                continue
+            if text:
+                self._put(self.transcripts, Turn(text, utterance, self.name, speculation))
+        if self.executor is not None:
+            self._put(self.recognitions, None)
+        else:
+            self._put(self.transcripts, None)
+
+    def _collector_loop(self):
+        while self.is_running:
+            item = self.recognitions.get()
+            if item is None:
+                break
+            utterance, future = item
+            try:
+                text, speculation = future.result()
+            except Exception as e:
+                print(f"Error recognizing speech: {e}")
+                continue
+            if text:
+                self._put(self.transcripts, Turn(text, utterance, self.name, speculation))
+        self._put(self.transcripts, None)
+
+    def _recognize(self, utterance):
+        """Transcript of an utterance, and the speculation that already recognised it if any"""
+        speculation = self.speculator.claim(utterance) if self.speculator is not None else None
+        if speculation is not None and speculation.wait():
+            return speculation.text, speculation
+        return self.recognize(utterance), None
+
+    def _response_loop(self):
+        while self.is_running:
+            turn = self.transcripts.get()
+            if turn is None:
+                break
+            with self._lock:
+                self.active_turns.append(turn)
+            with tracing.use(turn.trace):
+                chunks = self.respond(turn.text, turn)
+                try:
+                    for chunk in chunks:
+                        if turn.cancelled or not self.is_running:
+                            break
+                        self._put(self.speech, (turn, chunk))
+                except Exception as e:
+                    print(f"Error generating response: {e}")
+                finally:
+                    if hasattr(chunks, 'close'):
+                        chunks.close()  # cancels the underlying streaming request
+            # End-of-turn marker so the speaker knows when the turn is done
+            self._put(self.speech, (turn, None))
+            if turn.final:
+                break
+        self._put(self.speech, None)
+
+    def _speaker_loop(self):
+        while self.is_running:
+            item = self.speech.get()
+            if item is None:
+                break
+            turn, chunk = item
+            if chunk is None:
+                with self._lock:
+                    if turn in self.active_turns:
+                        self.active_turns.remove(turn)
+                if not turn.cancelled:
+                    turn.trace.mark(tracing.PLAYBACK_DONE)
+                turn.trace.finish(cancelled=turn.cancelled)
+                if turn.final:
+                    break
+                continue
+            if turn.cancelled:
+                continue
+            try:
+                with tracing.use(turn.trace):
+                    self.speak(chunk)
+            except Exception as e:
+                print(f"Error speaking: {e}")
+        self.finished.set()
+
+    def _put(self, q, item):
+        # Bounded put that still notices shutdown
+        while True:
+            try:
+                q.put(item, timeout=0.5)
+                if tracing.enabled():
+                    tracing.gauge("pipeline_queue_depth", q.qsize(), pipeline=self.name,
+                                  queue=self._queue_names[id(q)])
+                return
+            except queue.Full:
+                if not self.is_running:
+                    return
+
+    @staticmethod
+    def _drain(q):
+        # Drop speech of cancelled turns but keep end-of-turn markers and sentinels.
+        # Filter in place under the queue's own lock, so the producer cannot fill
+        # the freed slots before the kept items are back
+        with q.mutex:
+            kept = [item for item in q.queue if item is None or item[1] is None or not item[0].cancelled]
+            dropped = len(q.queue) - len(kept)
+            q.queue.clear()
+            q.queue.extend(kept)
+            if dropped:
+                q.not_full.notify(dropped)
@@ -1,12 +1,14 @@
 import speech_recognition as sr
+from asr_backends import create_backend
 
-def recognize_speech():
+def recognize_speech(backend=None):
     recognizer = sr.Recognizer()
+    backend = backend or create_backend(recognizer=recognizer)
     with sr.Microphone() as source:
         print("Listening...")
         audio = recognizer.listen(source)
         try:
-            text = recognizer.recognize_google(audio)
+            text = backend.recognize(audio)
             print(f"User said: {text}")
             return text
         except sr.UnknownValueError:
@@ -0,0 +1,163 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+def normalize_prompt(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def char_ngrams(text, n=3):
+    """Set of character n-grams of a normalised string"""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class _Entry:
+    def __init__(self, response, context_hash, grams, created_at):
+        self.response = response
+        self.context_hash = context_hash
+        self.grams = grams
+        self.created_at = created_at
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM replies with an optional fuzzy tier.
+
+    Each entry has a prompt, matched fuzzily, and a context, matched exactly
+    by hash (the system prompt, and for a conversation perhaps the last few
+    turns). Exact hits match the normalised prompt and context. The
+    fuzzy tier keeps an inverted index from character trigrams to cached
+    prompts. It returns the most similar entry (Jaccard similarity) with the
+    same context when it clears `fuzzy_threshold`. Keep the prompt short,
+    e.g. the latest utterance only: long prompts that share most of their
+    text clear the threshold even when they ask different things. Set the
+    threshold to 0 to disable the fuzzy tier.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600.0, fuzzy_threshold=0.85, ngram=3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.ngram = ngram
+        self._entries = OrderedDict()
+        self._index = defaultdict(set)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _context_hash(context):
+        return hashlib.sha256((context or "").encode('utf-8')).hexdigest()[:16]
+
+    def _key(self, normalized, context_hash):
+        return hashlib.sha256(f"{context_hash}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, prompt, context=None):
+        """Return a cached reply for the prompt in this exact context, or None"""
+        normalized = normalize_prompt(prompt)
+        context_hash = self._context_hash(context)
+        key = self._key(normalized, context_hash)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry.response
+                self._remove(key)
+                self.expirations += 1
+
+            if self.fuzzy_threshold > 0:
+                match = self._fuzzy_lookup(char_ngrams(normalized, self.ngram), context_hash, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.fuzzy_hits += 1
+                    return self._entries[match].response
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt, response, context=None):
+        """Cache a reply for the prompt in this context"""
+        if not response:
+            return
+        normalized = normalize_prompt(prompt)
+        context_hash = self._context_hash(context)
+        key = self._key(normalized, context_hash)
+        grams = char_ngrams(normalized, self.ngram)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(response, context_hash, grams, time.monotonic())
+            for gram in grams:
+                self._index[gram].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _fuzzy_lookup(self, grams, context_hash, now):
+        # Count shared n-grams per candidate using the inverted index
+        shared = defaultdict(int)
+        for gram in grams:
+            for key in self._index.get(gram, ()):
+                shared[key] += 1
+        best_key, best_score = None, 0.0
+        expired = []
+        for key, overlap in shared.items():
+            entry = self._entries[key]
+            if entry.context_hash != context_hash:
+                continue
+            if now - entry.created_at > self.ttl:
+                expired.append(key)
+                continue
+            score = overlap / (len(grams) + len(entry.grams) - overlap)
+            if score > best_score:
+                best_key, best_score = key, score
+        for key in expired:
+            self._remove(key)
+            self.expirations += 1
+        if best_key is not None and best_score >= self.fuzzy_threshold:
+            return best_key
+        return None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry.grams:
+            keys = self._index.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.exact_hits + self.fuzzy_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
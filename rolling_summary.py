@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+CHUNK_PROMPT = ("You are a meeting notes summarizer. Summarize this part of a meeting transcript "
+                "as concise bullet points covering key points, decisions and action items.")
+FOLD_PROMPT = ("You maintain a running summary of a meeting. Merge the running summary with the new "
+               "section summaries into one updated summary of key points, action items and decisions. "
+               "Keep it concise and do not drop decisions or action items.")
+FINAL_PROMPT = "Create a comprehensive meeting summary with key points, action items, and decisions made."
+
+
+class RollingSummarizer:
+    """Hierarchical, incremental meeting summary.
+
+    Transcript lines are grouped into chunks of about chunk_chars characters;
+    each full chunk is summarized in the background (map). Once fold_every
+    chunk summaries are ready they are folded into the rolling summary
+    (reduce), one fold at a time. The final summary only has to merge the
+    rolling summary, a few unfolded chunk summaries and the unsummarized tail,
+    so its cost stays roughly constant however long the meeting ran.
+
+    complete(system_prompt, text, max_tokens) -> str performs one LLM call.
+    Pass an executor to share workers with other meetings; otherwise the
+    summarizer owns a small pool until shutdown().
+    """
+
+    def __init__(self, complete, chunk_chars=3000, fold_every=4, max_workers=2, executor=None):
+        self.complete = complete
+        self.chunk_chars = chunk_chars
+        self.fold_every = fold_every
+        self.rolling_summary = ""
+        self._buffer = []
+        self._buffer_chars = 0
+        self._chunks = []           # raw text of each chunk
+        self._chunk_summaries = []  # None until the chunk has been summarized
+        self._folded = 0            # chunks already merged into rolling_summary
+        self._futures = []          # work not yet finished, guarded by _lock
+        self._closed = False        # set by shutdown(); no more work is submitted
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+        # A shared executor is not shut down here
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers,
+                                                        thread_name_prefix="rolling-summary")
+
+    def add(self, text):
+        """Add one transcript line"""
+        with self._lock:
+            self._buffer.append(text)
+            self._buffer_chars += len(text) + 1
+            if self._buffer_chars >= self.chunk_chars and not self._closed:
+                self._submit_chunk()
+
+    def _submit_chunk(self):
+        chunk = "\n".join(self._buffer)
+        self._buffer = []
+        self._buffer_chars = 0
+        index = len(self._chunks)
+        self._chunks.append(chunk)
+        self._chunk_summaries.append(None)
+        self._submit(self._summarize_chunk, index)
+
+    def _submit(self, fn, *args):
+        # Caller holds the lock
+        if self._closed:
+            return
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(self._executor.submit(fn, *args))
+
+    def _summarize_chunk(self, index):
+        try:
+            summary = self.complete(CHUNK_PROMPT, self._chunks[index], 300)
+        except Exception as e:
+            print(f"Error summarizing meeting section: {e}")
+            summary = None
+        with self._lock:
+            # On failure keep a trimmed copy of the raw text so nothing is lost
+            self._chunk_summaries[index] = summary or self._chunks[index][:self.chunk_chars // 4]
+            if len(self._ready_unfolded()) >= self.fold_every:
+                self._submit(self._fold)
+
+    def _ready_unfolded(self):
+        # Contiguous run of summarized chunks after the last fold
+        ready = []
+        for summary in self._chunk_summaries[self._folded:]:
+            if summary is None:
+                break
+            ready.append(summary)
+        return ready
+
+    def _fold(self):
+        with self._fold_lock:
+            with self._lock:
+                pieces = self._ready_unfolded()
+                rolling = self.rolling_summary
+            if len(pieces) < self.fold_every:
+                return  # another fold already took them
+            text = self._merge_input(rolling, pieces)
+            try:
+                merged = self.complete(FOLD_PROMPT, text, 500)
+            except Exception as e:
+                print(f"Error updating rolling meeting summary: {e}")
+                return
+            with self._lock:
+                self.rolling_summary = merged
+                self._folded += len(pieces)
+
+    @staticmethod
+    def _merge_input(rolling, pieces, tail=""):
+        parts = []
+        if rolling:
+            parts.append(f"Running summary:\n{rolling}")
+        for i, piece in enumerate(pieces, 1):
+            parts.append(f"Section {i} summary:\n{piece}")
+        if tail:
+            parts.append(f"Latest transcript:\n{tail}")
+        return "\n\n".join(parts)
+
+    def final_summary(self, timeout=5.0):
+        """Merge the already-computed pieces into the final summary (one bounded request)"""
+        with self._lock:
+            pending = [f for f in self._futures if not f.done()]
+        if pending:
+            wait(pending, timeout=timeout)
+        with self._lock:
+            rolling = self.rolling_summary
+            pieces = [summary or chunk[:self.chunk_chars // 4]
+                      for summary, chunk in zip(self._chunk_summaries[self._folded:],
+                                                self._chunks[self._folded:])]
+            tail = "\n".join(self._buffer)
+        if not rolling and not pieces and not tail:
+            return None
+        try:
+            return self.complete(FINAL_PROMPT, self._merge_input(rolling, pieces, tail), 500)
+        except Exception as e:
+            print(f"Error generating meeting summary: {e}")
+            # Still return what has been computed so far
+            return self._merge_input(rolling, pieces, tail)
+
+    def shutdown(self):
+        """Release the worker pool; queued sections still finish in the background"""
+        with self._lock:
+            self._closed = True
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,597 @@
+import itertools
+import re
+import threading
+import time
+from datetime import datetime
+
+import speech_recognition as sr
+
+import tracing
+from audio_capture import AudioCapture, create_source
+from command_router import CommandRouter, default_commands
+from hedging import Deadline
+from meet_captions import CaptionCapture, CaptionLine
+from notes_index import format_hits
+from pipeline import Turn, TurnPipeline
+from speculation import Speculator
+from streaming import iter_speakable_chunks, speak_chunks
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Session states
+PENDING = 'pending'
+STARTING = 'starting'
+JOINING = 'joining'
+IN_MEETING = 'in_meeting'
+ENDED = 'ended'
+FAILED = 'failed'
+
+
+def thread_cpu_seconds(thread):
+    """CPU time a live thread has used, where the platform exposes per-thread clocks"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def browser_rss_mb(driver):
+    """Resident memory of a driver's browser process tree (needs psutil)"""
+    if psutil is None or driver is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        return round(sum(p.memory_info().rss for p in processes) / 2 ** 20, 1)
+    except Exception:
+        return None
+
+
+def process_usage():
+    """Whole-process CPU, memory and thread count"""
+    usage = {'cpu_seconds': round(time.process_time(), 2), 'threads': threading.active_count()}
+    if psutil is not None:
+        usage['rss_mb'] = round(psutil.Process().memory_info().rss / 2 ** 20, 1)
+    else:
+        try:
+            import resource
+            # ru_maxrss is the peak, in kilobytes on Linux
+            usage['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+    return usage
+
+
+class SharedServices:
+    """Process-wide resources that every meeting session uses.
+
+    asr               ASRDispatcher (its executor also runs the pipelines' recognition)
+    tts               TTSService; each session gets its own playback channel
+    browser_pool      BrowserPool the sessions take their browser from
+    join(driver, url) -> True once inside the meeting
+    reply(user_input, prompt, deadline, session_id)        -> reply text
+    stream_reply(user_input, prompt, deadline, session_id) -> iterable of text deltas
+    new_notes_taker(name) / new_context()                  -> per-session notes taker / context
+    router            CommandRouter for spoken commands (defaults built from termination_keyword)
+    notes_index       NotesIndex; notes from earlier meetings that match a turn go into its prompt
+
+    With `speculate` (pipelined, streaming turns only), recognition and the
+    reply start after `tentative_pause` seconds of silence; see speculation.py.
+
+    With transcript_source='captions' the sessions read Meet's live captions,
+    which name the speaker, instead of recognising the audio; a session whose
+    meeting has no captions falls back to the audio.
+    """
+
+    def __init__(self, asr, tts, browser_pool, join, reply, stream_reply, new_notes_taker, new_context,
+                 system_prompt, turn_budget=6.0, stream_responses=True, pipeline_turns=True,
+                 termination_keyword="terminate", pause_threshold=0.8, adaptive_endpointing=True,
+                 speculate=False, tentative_pause=0.25, router=None, transcript_source='audio',
+                 notes_index=None):
+        self.asr = asr
+        self.tts = tts
+        self.browser_pool = browser_pool
+        self.join = join
+        self.reply = reply
+        self.stream_reply = stream_reply
+        self.new_notes_taker = new_notes_taker
+        self.new_context = new_context
+        self.system_prompt = system_prompt
+        self.turn_budget = turn_budget
+        self.stream_responses = stream_responses
+        self.pipeline_turns = pipeline_turns
+        self.termination_keyword = termination_keyword
+        # Spoken commands, compiled once and shared by every session
+        self.router = router or CommandRouter(default_commands(termination_keyword))
+        self.pause_threshold = pause_threshold
+        self.adaptive_endpointing = adaptive_endpointing
+        self.speculate = speculate and pipeline_turns and stream_responses
+        self.tentative_pause = tentative_pause
+        self.transcript_source = transcript_source
+        self.notes_index = notes_index
+
+
+class MeetingSession:
+    """Everything that belongs to one meeting: browser, audio, context, notes and state.
+
+    run() captures audio, joins the meeting, converses until it ends or the
+    termination keyword is heard, saves the notes and hands the browser back
+    to the pool. Threads the session owns are named after its id so their CPU
+    time can be attributed to it.
+    """
+
+    def __init__(self, meeting, services, session_id, audio_source='mic', output_device=None):
+        self.id = session_id
+        self.meeting = meeting
+        self.services = services
+        self.audio_source = audio_source
+        self.output_device = output_device
+        self.state = PENDING
+        self.active = False
+        self.muted = False  # "stop talking": follow the conversation without replying
+        self.error = None
+        self.driver = None
+        self.capture = None
+        self.channel = None
+        self.pipeline = None
+        self.speculator = None
+        self.thread = None
+        self.context = services.new_context()
+        self.notes_taker = services.new_notes_taker(f"{session_id}-notes")
+        self.started_at = None
+        self.ended_at = None
+        self._stopped = threading.Event()
+        self.usage = {'turns': 0, 'asr_calls': 0, 'asr_seconds': 0.0, 'reply_seconds': 0.0}
+        self._cpu = {}  # thread ident -> CPU seconds at the last sample
+        self._lock = threading.Lock()
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def run(self):
+        self.started_at = time.time()
+        try:
+            self.state = STARTING
+            self.channel = self.services.tts.channel(self.output_device, name=f"{self.id}-tts")
+            if self.services.transcript_source != 'captions':
+                self._start_audio_capture()
+
+            self.state = JOINING
+            self.driver = self.services.browser_pool.acquire()
+            if self.driver is None:
+                raise RuntimeError("no browser available")
+            self.active = self.services.join(self.driver, self.meeting.meet_url) and not self._stopped.is_set()
+            if not self.active:
+                self.state = FAILED
+                self.error = "stopped" if self._stopped.is_set() else "could not join"
+                return
+
+            if self.capture is None:
+                self._start_caption_capture()
+            self.state = IN_MEETING
+            self._converse()
+            self.state = ENDED
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            print(f"Session {self.id} ({self.meeting.summary}) failed: {e}")
+        finally:
+            self.active = False
+            if self.notes_taker.is_recording:
+                self.notes_taker.stop_recording()
+            self.context.close()
+            self.sample_cpu()
+            if self.capture is not None:
+                self.capture.stop()
+            if self.channel is not None:
+                self.channel.close()
+            if self.driver is not None:
+                self.services.browser_pool.release(self.driver)
+            self.ended_at = time.time()
+
+    def _start_audio_capture(self):
+        # A source spec ("mic", "mic:2", a .wav path) or a callable returning an AudioSource
+        source = self.audio_source() if callable(self.audio_source) else create_source(self.audio_source)
+        self.capture = AudioCapture(source,
+                                    pause_threshold=self.services.pause_threshold,
+                                    adaptive_endpointing=self.services.adaptive_endpointing,
+                                    tentative_pause=self.services.tentative_pause
+                                    if self.services.speculate else None,
+                                    name=f"{self.id}-capture")
+        self.capture.start()
+
+    def _start_caption_capture(self):
+        # Captions only exist once inside the meeting
+        capture = CaptionCapture(self.driver, name=f"{self.id}-captions")
+        try:
+            capture.start()
+            self.capture = capture
+        except Exception as e:
+            print(f"[{self.id}] Captions unavailable ({e}); recognising the audio instead")
+            self._start_audio_capture()
+
+    @property
+    def reads_captions(self):
+        return isinstance(self.capture, CaptionCapture)
+
+    def stop(self):
+        """Leave the meeting: ends the conversation loop, which then saves the notes"""
+        self._stopped.set()
+        self.active = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def notes_id(self):
+        """Meeting id the notes are saved under: the calendar event, so a restarted session resumes its notes"""
+        if self.meeting.id:
+            return re.sub(r"[^\w-]+", "_", self.meeting.id).strip("_")[:100]
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.id}"
+
+    def _converse(self):
+        """Take notes and converse until the meeting ends or is terminated"""
+        self.notes_taker.start_recording(self.notes_id())
+        if self.services.pipeline_turns:
+            if self.services.speculate and not self.reads_captions:
+                self.speculator = Speculator(self.transcribe, self.speculative_prompt, self.speculative_reply,
+                                             name=f"{self.id}-speculator", on_text=self.capture.hint_transcript)
+            self.pipeline = TurnPipeline(self.capture, self.transcribe, self.respond_to,
+                                         self.speak, self.stop_speaking,
+                                         executor=None if self.reads_captions else self.services.asr.executor,
+                                         speculator=self.speculator,
+                                         name=f"{self.id}-pipeline")
+            self.pipeline.start()
+            try:
+                self.pipeline.wait()
+            finally:
+                self.pipeline.stop()
+                if self.speculator is not None:
+                    self.speculator.close()
+        else:
+            while self.active:
+                if not self.listen_and_respond():
+                    break
+        # Stop recording notes when meeting ends
+        self.notes_taker.stop_recording()
+        print(f"Meeting notes saved for {self.meeting.summary}.")
+
+    # -- turns --------------------------------------------------------------
+
+    def speak(self, text):
+        self.channel.speak(text)
+
+    def stop_speaking(self):
+        self.channel.stop()
+
+    def transcribe(self, utterance):
+        """Recognize a captured utterance; returns None when nothing usable was heard"""
+        if isinstance(utterance, CaptionLine):
+            # Meet has already transcribed it
+            print(f"[{self.id}] {utterance.speaker} said: {utterance.text}")
+            return utterance.text
+        started = time.monotonic()
+        try:
+            audio = utterance.to_audio_data()
+            user_input = self.services.asr.recognize(audio)
+            print(f"[{self.id}] You said: {user_input}")
+            return user_input
+        except sr.UnknownValueError:
+            print(f"[{self.id}] Sorry, I did not understand that.")
+        except sr.RequestError as e:
+            print(f"[{self.id}] Could not request results; {e}")
+        except Exception as e:
+            print(f"[{self.id}] An error occurred: {e}")
+        finally:
+            with self._lock:
+                self.usage['asr_calls'] += 1
+                self.usage['asr_seconds'] += time.monotonic() - started
+        return None
+
+    def speculative_prompt(self, user_input):
+        """The prompt respond_to would build for this input, without touching the context"""
+        if self.muted or self.services.router.match(user_input) is not None:
+            return None
+        return self.context.messages(self.system_prompt_for(user_input)) + [{"role": "user", "content": user_input}]
+
+    def system_prompt_for(self, user_input):
+        """The system prompt, plus notes from earlier meetings that bear on the input"""
+        index = self.services.notes_index
+        if index is None:
+            return self.services.system_prompt
+        try:
+            hits = index.recall(user_input, exclude_meeting=self.notes_taker.current_meeting_id)
+        except Exception as e:
+            print(f"[{self.id}] Error searching earlier notes: {e}")
+            return self.services.system_prompt
+        if not hits:
+            return self.services.system_prompt
+        return f"{self.services.system_prompt}\n\nNotes from earlier meetings that may help:\n{format_hits(hits)}"
+
+    def speculative_reply(self, user_input, prompt):
+        return self.services.stream_reply(user_input, prompt, Deadline(self.services.turn_budget),
+                                          session_id=self.id)
+
+    def respond_to(self, user_input, turn=None):
+        """Handle one participant utterance, yielding the reply chunk by chunk"""
+        services = self.services
+        command = services.router.match(user_input)
+        if command is not None:
+            # Control phrases are handled locally and never reach the LLM
+            yield from self.run_command(command, user_input, turn)
+            return
+
+        speaker = self.speaker_of(turn)
+        self.notes_taker.add_note(speaker, user_input)
+        # Captions tell several speakers apart; let the model see who said what
+        message = f"{speaker}: {user_input}" if self.reads_captions else user_input
+        if self.muted:
+            # Keep following the conversation, but stay silent until unmuted
+            self.context.add_user(message)
+            return
+
+        # Update conversation context (bounded by its token budget)
+        self.context.add_user(message)
+        prompt = self.context.messages(self.system_prompt_for(user_input))
+
+        # The turn's latency budget starts when the participant stopped speaking
+        utterance = turn.utterance if turn is not None else None
+        if utterance is not None and utterance.ended_at:
+            deadline = Deadline.since(services.turn_budget, utterance.ended_at)
+        else:
+            deadline = Deadline(services.turn_budget)
+
+        print(f"[{self.id}] Generating response...")
+        trace = turn.trace if turn is not None else tracing.NULL_TRACE
+        started = time.monotonic()
+        spoken = []
+        try:
+            if services.stream_responses:
+                # Hand out each sentence as soon as it is complete; a reply speculatively
+                # started on a pause before the end of the turn is used if it answers this prompt
+                speculation = turn.speculation if turn is not None else None
+                deltas = speculation.take(prompt) if speculation is not None else None
+                if deltas is None:
+                    deltas = services.stream_reply(user_input, prompt, deadline, session_id=self.id)
+                try:
+                    for chunk in iter_speakable_chunks(tracing.mark_stream(deltas, trace)):
+                        spoken.append(chunk)
+                        yield chunk
+                finally:
+                    deltas.close()
+            else:
+                response = services.reply(user_input, prompt, deadline, session_id=self.id)
+                trace.mark(tracing.LLM_FIRST_TOKEN)
+                trace.mark(tracing.LLM_DONE)
+                spoken.append(response)
+                yield response
+        finally:
+            # Record what was actually produced, even if the turn was cut short by barge-in
+            response = " ".join(spoken)
+            print(f"[{self.id}] AI response: {response}")
+            if response:
+                self.context.add_assistant(response)
+            with self._lock:
+                self.usage['turns'] += 1
+                self.usage['reply_seconds'] += time.monotonic() - started
+
+    @staticmethod
+    def speaker_of(turn):
+        """Who said a turn: the caption's speaker name, or "Participant" for recognised audio"""
+        utterance = turn.utterance if turn is not None else None
+        return getattr(utterance, 'speaker', None) or "Participant"
+
+    def run_command(self, command, user_input, turn=None):
+        """Carry out a spoken command, yielding what to say back"""
+        print(f"[{self.id}] Command: {command.name}")
+        tracing.count("commands_total", command=command.name)
+        name = command.name
+        if name == 'terminate':
+            self.notes_taker.add_note(self.speaker_of(turn), user_input)
+            print(f"[{self.id}] Termination keyword detected. Saving meeting notes...")
+            if turn is not None:
+                turn.final = True
+            self.active = False
+            yield "Goodbye! I've saved the meeting notes and generated a summary."
+            # Merge the summary while the goodbye is being spoken; _converse then
+            # saves it with the notes once the turn is over
+            summary = self.notes_taker.get_meeting_summary()
+            print(f"\nMeeting Summary ({self.meeting.summary}):\n", summary)
+            return
+
+        reply = None
+        if name == 'repeat':
+            reply = self.context.last_assistant_reply() or "I haven't said anything yet."
+        elif name == 'mute':
+            self.muted = True
+        elif name == 'unmute':
+            self.muted = False
+            reply = "I'm back."
+        elif name == 'louder':
+            self.channel.gain = min(4.0, self.channel.gain * 1.5)
+            reply = "Is this better?"
+        elif name == 'quieter':
+            self.channel.gain = max(0.25, self.channel.gain / 1.5)
+            reply = "Is this better?"
+        elif name == 'pause_notes':
+            self.notes_taker.paused = True
+            reply = "Okay, notes are paused."
+        elif name == 'resume_notes':
+            self.notes_taker.paused = False
+            reply = "Taking notes again."
+        elif name == 'take_note':
+            if command.argument:
+                self.notes_taker.add_note("Note", command.argument, force=True)
+                reply = "Noted."
+            else:
+                reply = "What should I note?"
+        elif name == 'summary':
+            reply = self.notes_taker.current_summary()
+        if reply:
+            yield reply
+
+    def listen_and_respond(self):
+        """Serial turn: wait for an utterance, recognize it, speak the reply"""
+        print(f"[{self.id}] Listening...")
+        utterance = self.capture.get_utterance(timeout=20)
+        if utterance is None:
+            if self.capture.exhausted.is_set():
+                print(f"[{self.id}] Audio source ended.")
+                self.active = False
+                return False
+            return True
+        user_input = self.transcribe(utterance)
+        if not user_input:
+            return True
+        turn = Turn(user_input, utterance, self.id)
+
+        def speak(chunk):
+            # speak_chunks plays on its own thread, so the turn is made current there
+            with tracing.use(turn.trace):
+                self.speak(chunk)
+
+        try:
+            with tracing.use(turn.trace):
+                speak_chunks(self.respond_to(user_input, turn), speak)
+            turn.trace.mark(tracing.PLAYBACK_DONE)
+        except Exception as e:
+            print(f"[{self.id}] An error occurred: {e}")
+        finally:
+            turn.trace.finish()
+        return self.active
+
+    # -- resource accounting -----------------------------------------------
+
+    def owned_threads(self):
+        prefix = self.id + "-"
+        return [t for t in threading.enumerate() if t.name == self.id or t.name.startswith(prefix)]
+
+    def sample_cpu(self):
+        """Record the CPU time of the session's live threads (finished threads keep their last sample)"""
+        for thread in self.owned_threads():
+            seconds = thread_cpu_seconds(thread)
+            if seconds is not None:
+                with self._lock:
+                    self._cpu[thread.ident] = seconds
+
+    def resource_report(self):
+        self.sample_cpu()
+        end = self.ended_at or time.time()
+        with self._lock:
+            usage = dict(self.usage)
+            cpu = round(sum(self._cpu.values()), 2) if self._cpu else None
+        report = {
+            'session': self.id,
+            'meeting': self.meeting.summary,
+            'state': self.state,
+            'uptime_seconds': round(end - self.started_at, 1) if self.started_at else 0.0,
+            'threads': len(self.owned_threads()),
+            'cpu_seconds': cpu,
+            'audio_buffer_mb': round(2 * self.capture.ring.capacity / 2 ** 20, 1)
+            if self.capture is not None and self.capture.ring is not None else 0.0,
+            'context_tokens': self.context.total_tokens,
+            'notes': len(self.notes_taker.meeting_notes),
+            'tts_seconds': round(self.channel.played_seconds, 1) if self.channel is not None else 0.0,
+            'browser_rss_mb': browser_rss_mb(self.driver) if self.active else None,
+        }
+        usage['asr_seconds'] = round(usage['asr_seconds'], 2)
+        usage['reply_seconds'] = round(usage['reply_seconds'], 2)
+        report.update(usage)
+        if self.speculator is not None:
+            report['speculation'] = self.speculator.stats()
+        if self.error:
+            report['error'] = self.error
+        return report
+
+
+class SessionManager:
+    """Runs several MeetingSessions at once on shared services.
+
+    Each concurrent slot has its own audio source (a create_source() spec or
+    a callable returning an AudioSource) and output device (e.g. a virtual
+    audio cable per meeting); start() blocks while every slot is
+    busy. A monitor thread samples per-session CPU and, with
+    `report_interval`, prints a resource report for sizing hosts.
+    """
+
+    def __init__(self, services, audio_sources=('mic',), output_devices=(None,), max_sessions=None,
+                 report_interval=0, sample_interval=5.0):
+        self.services = services
+        self.audio_sources = list(audio_sources) or ['mic']
+        self.output_devices = list(output_devices) or [None]
+        self.max_sessions = max_sessions or len(self.audio_sources)
+        self.report_interval = report_interval
+        self.sample_interval = sample_interval
+        self.sessions = []
+        self._free_slots = list(range(self.max_sessions))
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="session-monitor", daemon=True)
+        self._monitor.start()
+
+    def start(self, meeting, timeout=None):
+        """Start a session for meeting once a slot is free; None on timeout or shutdown"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free_slots or self._closed.is_set(), timeout):
+                return None
+            if self._closed.is_set():
+                return None
+            slot = self._free_slots.pop(0)
+            session = MeetingSession(meeting, self.services, f"s{next(self._ids)}",
+                                     audio_source=self.audio_sources[slot % len(self.audio_sources)],
+                                     output_device=self.output_devices[slot % len(self.output_devices)])
+            self.sessions.append(session)
+        print(f"Starting session {session.id} for {meeting.summary} (slot {slot})")
+        session.thread = threading.Thread(target=self._run, args=(session, slot), name=session.id,
+                                          daemon=True)
+        session.thread.start()
+        return session
+
+    def _run(self, session, slot):
+        try:
+            session.run()
+        finally:
+            print(f"Session {session.id} {session.state}: {session.resource_report()}")
+            with self._cond:
+                self._free_slots.append(slot)
+                self._free_slots.sort()
+                self._cond.notify_all()
+
+    def active_sessions(self):
+        with self._cond:
+            return [s for s in self.sessions if s.thread is not None and s.thread.is_alive()]
+
+    def wait(self, timeout=None):
+        """Wait for every started session to finish"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for session in self.active_sessions():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            session.thread.join(remaining)
+
+    def stop_all(self, timeout=60):
+        """Leave every meeting, saving notes, and stop starting new sessions"""
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        for session in self.active_sessions():
+            session.stop()
+        self.wait(timeout)
+
+    def resource_report(self):
+        with self._cond:
+            sessions = list(self.sessions)
+        return {'process': process_usage(), 'sessions': [s.resource_report() for s in sessions]}
+
+    def _monitor_loop(self):
+        last_report = time.monotonic()
+        while not self._closed.wait(self.sample_interval):
+            for session in self.active_sessions():
+                session.sample_cpu()
+            if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                report = self.resource_report()
+                print(f"Process: {report['process']}")
+                for entry in report['sessions']:
+                    if entry['state'] not in (ENDED, FAILED):
+                        print(f"  {entry}")
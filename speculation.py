@@ -0,0 +1,320 @@
+"""Speculative reply generation on a tentative end of speech.
+
+The capture reports a tentative end after a short pause (~250 ms), long
+before it is sure the turn is over. The Speculator recognises the audio so
+far and starts the LLM request at once, buffering the reply. If the pause
+does turn out to be the end of the turn, the final utterance is the same
+audio. The pipeline then takes the transcript and the in-flight (or
+finished) reply instead of starting both from scratch.
+
+The speculation is thrown away when:
+- the participant carries on talking
+- the turn ends somewhere else
+- the prompt has changed by the time the turn is answered
+
+A generation is kept across a second pause in the same utterance when the
+new transcript says materially the same thing.
+
+stats() reports the hit rate and the API calls wasted on speculations that
+were thrown away, so the pause length can be tuned between latency gained
+and cost.
+"""
+import queue
+import re
+import threading
+import time
+
+import tracing
+
+# Words that do not change what the participant asked
+FILLER_WORDS = {"um", "uh", "er", "erm", "hmm", "mm", "ah"}
+
+_PAUSE, _DROP, _STOP = 'pause', 'drop', 'stop'
+
+
+def normalize(text):
+    words = re.findall(r"[\w']+", (text or "").lower())
+    return [w for w in words if w not in FILLER_WORDS]
+
+
+def materially_same(a, b):
+    """True when two transcripts differ only in case, punctuation or filler words"""
+    return normalize(a) == normalize(b)
+
+
+class _Generation:
+    """One speculative LLM request, drained into a buffer on its own thread"""
+
+    def __init__(self, deltas, text, prompt, start, name):
+        self.text = text
+        self.prompt = prompt
+        self.start = start  # ring position of the utterance it answers
+        self.started_at = time.time()
+        self.taken = False
+        self._deltas = deltas
+        self._buffer = []
+        self._done = False
+        self._cancelled = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for delta in self._deltas:
+                with self._cond:
+                    if self._cancelled:
+                        break
+                    self._buffer.append(delta)
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"Speculative generation failed: {e}")
+        finally:
+            self._deltas.close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def answers(self, prompt):
+        """True if this request answers `prompt`, allowing filler-word differences in the last message"""
+        if len(prompt) != len(self.prompt) or prompt[:-1] != self.prompt[:-1]:
+            return False
+        return materially_same(prompt[-1]['content'], self.prompt[-1]['content'])
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def stream(self):
+        """The reply's deltas: what is buffered, then the rest as it arrives. Closing cancels."""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index >= len(self._buffer) and not self._done and not self._cancelled:
+                        self._cond.wait()
+                    if self._cancelled:
+                        return
+                    pending = self._buffer[index:]
+                    index = len(self._buffer)
+                    if not pending and self._done:
+                        return
+                yield from pending
+        finally:
+            with self._cond:
+                if not self._done:
+                    self._cancelled = True
+                    self._cond.notify_all()
+
+
+class Speculation:
+    """Recognition (and, usually, a generation) for the audio up to a tentative pause"""
+
+    def __init__(self, owner, utterance):
+        self.owner = owner
+        self.utterance = utterance
+        self.text = None
+        self.generation = None
+        self.failed = False
+        self.claimed = False
+        self.cancelled = False
+        self.ready = threading.Event()
+
+    def matches(self, utterance):
+        return self.utterance.start == utterance.start and self.utterance.end == utterance.end
+
+    def wait(self, timeout=10.0):
+        """Block until recognised; False if the speculative recognition failed"""
+        return self.ready.wait(timeout) and not self.failed
+
+    def take(self, prompt):
+        """The speculative reply stream if it answers `prompt`, otherwise None"""
+        return self.owner._take(self, prompt)
+
+
+class Speculator:
+    """Runs speculations for one audio stream on a single worker thread.
+
+    recognize(utterance)       -> transcript or None
+    prepare(text)              -> the prompt the reply would be generated for, or None to not speculate
+    generate(text, prompt)     -> closable iterator of reply text deltas
+    on_text(utterance, text)   -> optional, told each speculative transcript
+
+    Wire on_pause/on_resume to the capture's tentative-end and resume
+    callbacks, and on_text to its hint_transcript; the pipeline claims the
+    speculation for each final utterance.
+    """
+
+    def __init__(self, recognize, prepare, generate, name="speculator", on_text=None):
+        self.recognize = recognize
+        self.prepare = prepare
+        self.generate = generate
+        self.on_text = on_text
+        self.name = name
+        self.stats_counts = {'pauses': 0, 'asr_calls': 0, 'wasted_asr_calls': 0, 'llm_calls': 0,
+                             'wasted_llm_calls': 0, 'reused_generations': 0, 'hits': 0, 'misses': 0}
+        self.head_start_seconds = 0.0
+        self._latest = None      # speculation for the current utterance, not yet claimed
+        self._generation = None  # unclaimed generation the worker may reuse
+        self._live = set()       # generations not finished with, so close() can cancel them
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+        self._thread.start()
+
+    # -- capture callbacks --------------------------------------------------
+
+    def on_pause(self, utterance):
+        spec = Speculation(self, utterance)
+        with self._lock:
+            previous, self._latest = self._latest, spec
+            if previous is not None:
+                self._cancel(previous)
+            self._count('pauses')
+        self._events.put((_PAUSE, spec))
+
+    def on_resume(self):
+        with self._lock:
+            spec, self._latest = self._latest, None
+            if spec is None:
+                return
+            self._cancel(spec)
+            self._count('misses')
+        self._events.put((_DROP, None))
+
+    # -- pipeline side --------------------------------------------------------
+
+    def claim(self, utterance):
+        """The speculation covering exactly this final utterance, or None"""
+        with self._lock:
+            spec, self._latest = self._latest, None
+            if spec is None:
+                return None
+            if spec.matches(utterance):
+                spec.claimed = True
+                if spec.generation is not None and spec.generation is self._generation:
+                    self._generation = None
+                return spec
+            self._cancel(spec)
+            self._count('misses')
+        self._events.put((_DROP, None))
+        return None
+
+    def _take(self, spec, prompt):
+        generation = spec.generation
+        if generation is None:
+            return None
+        with self._lock:
+            if not generation.taken and generation.answers(prompt):
+                generation.taken = True
+                self._live.discard(generation)
+                self._count('hits')
+                head_start = max(0.0, spec.utterance.ended_at - generation.started_at) \
+                    if spec.utterance.ended_at else 0.0
+                self.head_start_seconds += head_start
+                tracing.observe("speculation_head_start_seconds", head_start)
+                return generation.stream()
+            # The conversation moved on since the request was made
+            self._count('misses')
+            self._discard(generation)
+        return None
+
+    def close(self):
+        """Stop the worker and cancel every speculative request still running"""
+        self._events.put((_STOP, None))
+        with self._lock:
+            for generation in list(self._live):
+                self._discard(generation)
+            self._generation = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counts)
+            head_start = self.head_start_seconds
+        stats['hit_rate'] = round(stats['hits'] / stats['llm_calls'], 3) if stats['llm_calls'] else None
+        stats['mean_head_start_seconds'] = round(head_start / stats['hits'], 3) if stats['hits'] else None
+        return stats
+
+    # -- worker -------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            kind, spec = self._events.get()
+            if kind == _STOP:
+                return
+            if kind == _DROP:
+                with self._lock:
+                    if self._generation is not None and self._latest is None:
+                        self._discard(self._generation)
+                        self._generation = None
+                continue
+            if spec.cancelled:
+                continue  # superseded before the worker got to it; nothing was spent
+            try:
+                self._speculate(spec)
+            except Exception as e:
+                print(f"Speculation failed: {e}")
+                spec.failed = True
+            finally:
+                spec.ready.set()
+
+    def _speculate(self, spec):
+        with self._lock:
+            self._count('asr_calls')
+        text = self.recognize(spec.utterance)
+        if text and self.on_text is not None and not spec.cancelled:
+            self.on_text(spec.utterance, text)
+        prompt = self.prepare(text) if text else None
+        with self._lock:
+            spec.text = text
+            if spec.cancelled:
+                self._count('wasted_asr_calls')
+            reuse = self._generation
+            if reuse is not None and (prompt is None or reuse.start != spec.utterance.start
+                                      or not reuse.answers(prompt)):
+                self._discard(reuse)
+                reuse = None
+            if prompt is None:
+                self._generation = None
+                return
+            if reuse is not None:
+                # Same request as the last pause in this utterance: keep it going
+                self._count('reused_generations')
+                spec.generation = reuse
+            elif spec.cancelled:
+                self._generation = None
+                return
+        if reuse is None:
+            generation = _Generation(self.generate(text, prompt), text, prompt, spec.utterance.start,
+                                     name=f"{self.name}-generation")
+            with self._lock:
+                self._count('llm_calls')
+                self._live.add(generation)
+                spec.generation = generation
+                if spec.cancelled:
+                    # Given up while the request was being made
+                    self._discard(generation)
+                    spec.generation = None
+                    generation = None
+        with self._lock:
+            self._generation = None if spec.claimed else spec.generation
+
+    def _cancel(self, spec):
+        # Caller holds the lock. A finished recognition is wasted now; one still
+        # running is counted by the worker when it returns.
+        spec.cancelled = True
+        if spec.text is not None:
+            self._count('wasted_asr_calls')
+
+    def _discard(self, generation):
+        # Caller holds the lock
+        if generation in self._live:
+            self._live.discard(generation)
+            generation.cancel()
+            self._count('wasted_llm_calls')
+
+    def _count(self, key):
+        # Caller holds the lock
+        self.stats_counts[key] += 1
+        tracing.count(f"speculation_{key}_total")
@@ -0,0 +1,123 @@
+"""Startup timing for the agent process (python main.py --profile-startup).
+
+Records how long each module takes to import (self time, excluding the
+modules it imports in turn) and how long each named initialisation phase
+takes, then prints a report once the agent is listening. Disabled, every
+call here is a no-op.
+"""
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_profiler = None
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}  # module -> (self seconds, cumulative seconds)
+        self.phases = []   # (name, seconds, thread name)
+        self.marks = []    # (name, seconds since start)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+        self._reported = False
+
+    def install(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only first imports of absolute module names are timed; the rest are dict lookups
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            with self._lock:
+                if name not in self.imports:
+                    self.imports[name] = (total - children, total)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - started,
+                                    threading.current_thread().name))
+
+    def mark(self, name):
+        with self._lock:
+            self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self, top=20):
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)
+            phases = list(self.phases)
+            marks = list(self.marks)
+        lines = ["Startup profile", "  Imports (cumulative / self, slowest first):"]
+        for name, (self_seconds, total) in imports[:top]:
+            lines.append(f"    {total * 1000:9.1f} ms  {self_seconds * 1000:9.1f} ms  {name}")
+        lines.append("  Initialisation:")
+        for name, seconds, thread in phases:
+            where = "" if thread == "MainThread" else f"  [{thread}]"
+            lines.append(f"    {seconds * 1000:9.1f} ms  {name}{where}")
+        lines.append("  Milestones (since startup):")
+        for name, seconds in marks:
+            lines.append(f"    {seconds * 1000:9.1f} ms  {name}")
+        return "\n".join(lines)
+
+
+def enable():
+    """Start profiling; call before the imports that should be measured"""
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+        _profiler.install()
+    return _profiler
+
+
+def enabled():
+    return _profiler is not None
+
+
+@contextmanager
+def phase(name):
+    """Time an initialisation step (no-op unless profiling)"""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.phase(name):
+            yield
+
+
+def mark(name):
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+def report_once(top=20):
+    """Print the report the first time this is called, then stop timing imports"""
+    if _profiler is None or _profiler._reported:
+        return
+    _profiler._reported = True
+    _profiler.uninstall()
+    print(_profiler.report(top))
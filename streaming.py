@@ -0,0 +1,116 @@
+import re
+import threading
+import queue
+
+# Words ending in a period that do not end a sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc",
+    "e.g", "i.e", "inc", "ltd", "co", "approx", "no", "fig",
+}
+
+SENTENCE_END = re.compile(r'[.!?…]+["\'”’)\]]*(?=\s)')
+CLAUSE_END = re.compile(r'[,;:—–]+(?=\s)')
+
+
+class SentenceSegmenter:
+    """Incrementally cut a token stream into speakable sentences and clauses"""
+
+    def __init__(self, min_chars=12, clause_chars=80, max_chars=200):
+        # min_chars: never emit a chunk shorter than this (except on flush)
+        # clause_chars: past this length, also cut on commas/semicolons
+        # max_chars: hard cut on whitespace so a run-on never stalls the speaker
+        self.min_chars = min_chars
+        self.clause_chars = clause_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add streamed text and return any chunks that are ready to speak"""
+        self.buffer += text
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """Return whatever is left in the buffer once the stream has ended"""
+        chunk = self.buffer.strip()
+        self.buffer = ""
+        return [chunk] if chunk else []
+
+    def _find_cut(self):
+        for match in SENTENCE_END.finditer(self.buffer):
+            end = match.end()
+            if end < self.min_chars or self._is_abbreviation(match.start()):
+                continue
+            return end
+
+        if len(self.buffer) >= self.clause_chars:
+            for match in CLAUSE_END.finditer(self.buffer):
+                if match.end() >= self.min_chars:
+                    return match.end()
+
+        if len(self.buffer) >= self.max_chars:
+            space = self.buffer.rfind(" ", self.min_chars, self.max_chars)
+            if space != -1:
+                return space
+        return None
+
+    def _is_abbreviation(self, dot_index):
+        if self.buffer[dot_index] != ".":
+            return False
+        # Decimal numbers like 3.5 never reach here (no whitespace after the dot),
+        # but "version 3. Then" should still cut, so only letters are checked
+        word = re.search(r"([A-Za-z][A-Za-z.]*)$", self.buffer[:dot_index])
+        if not word:
+            return False
+        token = word.group(1).lower()
+        return token in ABBREVIATIONS or len(token) == 1
+
+
+def iter_speakable_chunks(deltas, segmenter=None):
+    """Yield speakable chunks from an iterator of streamed text deltas"""
+    segmenter = segmenter or SentenceSegmenter()
+    for delta in deltas:
+        if delta:
+            yield from segmenter.feed(delta)
+    yield from segmenter.flush()
+
+
+def speak_chunks(chunks, speak, max_pending=8):
+    """Speak chunks on a worker thread while the caller keeps producing them.
+
+    Returns the list of chunks that were produced, in order.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    errors = []
+
+    def speaker():
+        while True:
+            chunk = pending.get()
+            if chunk is None:
+                break
+            try:
+                speak(chunk)
+            except Exception as e:
+                errors.append(e)
+                print(f"Error speaking chunk: {e}")
+
+    worker = threading.Thread(target=speaker, daemon=True)
+    worker.start()
+
+    spoken = []
+    try:
+        for chunk in chunks:
+            spoken.append(chunk)
+            pending.put(chunk)
+    finally:
+        pending.put(None)
+        worker.join()
+    return spoken
@@ -1,8 +1,427 @@
-import pyttsx3
-
-def speak(text):
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-    engine.setProperty('volume', 0.9)
-    engine.say(text)
-    engine.runAndWait()
+import os
+import json
+import hashlib
+import struct
+import threading
+import time
+import queue
+import tempfile
+import wave
+from array import array
+
+import tracing
+
+
+# Default voice settings
+DEFAULT_RATE = 150
+DEFAULT_VOLUME = 0.9
+
+# Synthesized audio is cached here, keyed on text + voice settings
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'tts_cache')
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Phrases worth rendering ahead of time so they never wait on synthesis
+COMMON_PHRASES = [
+    "Goodbye! I've saved the meeting notes and generated a summary.",
+    "Got it.",
+    "Good question.",
+    "Let me think about that.",
+]
+
+
+class AudioClip:
+    """Rendered PCM audio ready for playback"""
+
+    def __init__(self, frames, sample_rate, sample_width, channels):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+
+
+def read_audio_file(path):
+    """Load a WAV (or AIFF, as written by the macOS driver) file into an AudioClip"""
+    try:
+        with wave.open(path, 'rb') as f:
+            return AudioClip(f.readframes(f.getnframes()), f.getframerate(),
+                             f.getsampwidth(), f.getnchannels())
+    except wave.Error:
+        pass
+    return read_aiff_file(path)
+
+
+def read_aiff_file(path):
+    """Load an uncompressed AIFF/AIFF-C file (the aifc module is gone from Python 3.13)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'FORM' or data[8:12] not in (b'AIFF', b'AIFC'):
+        raise ValueError(f"{path} is neither WAV nor AIFF")
+    comm = frames = None
+    little_endian = False
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id, size = struct.unpack_from('>4sI', data, position)
+        body = data[position + 8:position + 8 + size]
+        if chunk_id == b'COMM':
+            channels, _, bits, exponent, mantissa = struct.unpack_from('>hIhHQ', body)
+            # Sample rate is an 80-bit IEEE extended float
+            rate = int(round(mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63)))
+            if data[8:12] == b'AIFC':
+                compression = body[18:22]
+                if compression not in (b'NONE', b'sowt'):
+                    raise ValueError(f"{path} uses unsupported AIFF-C compression {compression!r}")
+                little_endian = compression == b'sowt'
+            comm = (channels, (bits + 7) // 8, rate)
+        elif chunk_id == b'SSND':
+            offset = struct.unpack_from('>I', body)[0]
+            frames = body[8 + offset:]
+        position += 8 + size + (size & 1)  # chunks are padded to an even length
+    if comm is None or frames is None:
+        raise ValueError(f"{path} is missing AIFF COMM or SSND data")
+    channels, sample_width, rate = comm
+    if sample_width == 2 and not little_endian:
+        # AIFF samples are big-endian
+        samples = array('h')
+        samples.frombytes(frames[:len(frames) - len(frames) % 2])
+        samples.byteswap()
+        frames = samples.tobytes()
+    return AudioClip(frames, rate, sample_width, channels)
+
+
+def scale_samples(frames, gain):
+    """16-bit PCM with every sample multiplied by gain, clipped to the sample range"""
+    samples = array('h')
+    samples.frombytes(bytes(frames))
+    scaled = array('h', (max(-32768, min(32767, int(s * gain))) for s in samples))
+    return scaled.tobytes()
+
+
+class TTSCache:
+    """Content-addressed on-disk cache of synthesized audio with size-bounded LRU eviction"""
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(p) for p in self._entries())
+
+    @staticmethod
+    def key(text, voice, rate, volume):
+        payload = json.dumps([text, voice, rate, volume], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key):
+        """Return the cached clip for a key, or None"""
+        path = self.path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+            os.utime(path)  # mark as recently used
+        try:
+            return read_audio_file(path)
+        except Exception as e:
+            print(f"Dropping unreadable TTS cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key, source_path):
+        """Move a freshly rendered file into the cache and evict old entries"""
+        path = self.path(key)
+        size = os.path.getsize(source_path)
+        with self._lock:
+            if os.path.exists(path):
+                self.total_bytes -= os.path.getsize(path)
+            os.replace(source_path, path)
+            self.total_bytes += size
+            self._evict()
+        return path
+
+    def _entries(self):
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory) if name.endswith('.wav')]
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        for path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.total_bytes -= os.path.getsize(path)
+            os.remove(path)
+
+    def _remove(self, path):
+        with self._lock:
+            if os.path.exists(path):
+                self.total_bytes -= os.path.getsize(path)
+                os.remove(path)
+
+
+class _SpeechRequest:
+    def __init__(self, text, generation, play=True, channel=None):
+        self.text = text
+        self.generation = generation
+        self.play = play
+        self.channel = channel
+        self.trace = tracing.current()  # the turn this speech belongs to, when tracing
+        self.done = threading.Event()
+        self.error = None  # set when the request could not be spoken at all
+
+
+class SpeechChannel:
+    """One playback output fed by the shared synthesis thread.
+
+    Each concurrent meeting gets its own channel (usually its own output
+    device), so meetings can speak at the same time and stop independently
+    while sharing the engine and the clip cache.
+    """
+
+    def __init__(self, service, output_device=None, name="tts-play"):
+        self.service = service
+        self.output_device = output_device
+        self.name = name
+        self.played_seconds = 0.0
+        self.gain = 1.0  # playback volume relative to the rendered clips
+        self._play_queue = queue.Queue(maxsize=4)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._play_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def speak(self, text, block=True):
+        """Queue text for playback; by default wait until it has been played.
+
+        Raises RuntimeError if the TTS engine could not be started.
+        """
+        self.service.check()
+        with self._lock:
+            request = _SpeechRequest(text, self._generation, channel=self)
+        self.service._synth_queue.put(request)
+        if tracing.enabled():
+            tracing.gauge("tts_synth_queue_depth", self.service._synth_queue.qsize())
+        if block:
+            request.done.wait()
+            if request.error is not None:
+                raise RuntimeError(f"speech unavailable: {request.error}")
+        return request
+
+    def stop(self):
+        """Stop current playback and drop everything queued"""
+        with self._lock:
+            self._generation += 1
+        self.service._stop_engine()
+
+    def close(self):
+        """Stop playback and end the channel's thread"""
+        self.stop()
+        self._play_queue.put(None)
+
+    def is_stale(self, request):
+        return request.play and request.generation != self._generation
+
+    def _play_loop(self):
+        while True:
+            item = self._play_queue.get()
+            if item is None:
+                self._play_queue.task_done()
+                return
+            request, clip = item
+            try:
+                if not self.is_stale(request):
+                    self._play(request, clip)
+                request.done.set()
+            except Exception as e:
+                print(f"Error playing audio, falling back to direct speech: {e}")
+                self.service._can_play_clips = False
+                self.service._synth_queue.put(request)  # the engine thread will speak it
+            finally:
+                self._play_queue.task_done()
+
+    def _play(self, request, clip, block_frames=1024):
+        audio = self.service._audio()
+        stream = audio.open(
+            format=audio.get_format_from_width(clip.sample_width),
+            channels=clip.channels,
+            rate=clip.sample_rate,
+            output=True,
+            output_device_index=self.output_device,
+        )
+        try:
+            step = block_frames * clip.sample_width * clip.channels
+            frames = memoryview(clip.frames)
+            for offset in range(0, len(frames), step):
+                if self.is_stale(request):
+                    break  # interrupted by stop()
+                block = frames[offset:offset + step]
+                if offset == 0:
+                    request.trace.mark(tracing.TTS_FIRST_AUDIO)
+                if self.gain != 1.0 and clip.sample_width == 2:
+                    block = scale_samples(block, self.gain)
+                stream.write(bytes(block))
+                self.played_seconds += len(block) / (clip.sample_width * clip.channels * clip.sample_rate)
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+
+class TTSService:
+    """Long-lived TTS engine on a dedicated thread with a playback queue.
+
+    The synthesis thread owns the pyttsx3 engine and renders text into audio
+    clips (served from the cache when possible); a separate playback thread
+    plays them, so the next sentence is rendered while the current one plays.
+    Additional playback channels (see channel()) share the engine and cache.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, volume=DEFAULT_VOLUME, cache=None):
+        self.rate = rate
+        self.volume = volume
+        self.cache = cache if cache is not None else TTSCache()
+        self.voice = None
+        self._engine = None
+        self._synth_queue = queue.Queue()
+        self._pyaudio = None
+        self._pyaudio_lock = threading.Lock()
+        self._can_play_clips = True
+        self.error = None  # why the engine failed to start, if it did
+        self._synth_thread = threading.Thread(target=self._synth_loop, name="tts-synth", daemon=True)
+        self._synth_thread.start()
+        self.default_channel = SpeechChannel(self)
+
+    def channel(self, output_device=None, name="tts-play"):
+        """A new playback channel, e.g. for another meeting's output device"""
+        return SpeechChannel(self, output_device, name)
+
+    def speak(self, text, block=True):
+        """Queue text for playback; by default wait until it has been played"""
+        return self.default_channel.speak(text, block)
+
+    def prewarm(self, phrases):
+        """Render phrases into the cache in the background without playing them"""
+        for text in phrases:
+            self._synth_queue.put(_SpeechRequest(text, None, play=False))
+
+    def stop(self):
+        """Stop current playback and drop everything queued"""
+        self.default_channel.stop()
+
+    def check(self):
+        """Raise RuntimeError if the engine failed to start"""
+        if self.error is not None:
+            raise RuntimeError(f"TTS engine failed to start: {self.error}")
+
+    def _stop_engine(self):
+        if self._engine is not None and not self._can_play_clips:
+            # Direct engine playback; only the engine can interrupt it
+            self._engine.stop()
+
+    def _audio(self):
+        with self._pyaudio_lock:
+            if self._pyaudio is None:
+                import pyaudio
+                self._pyaudio = pyaudio.PyAudio()
+            return self._pyaudio
+
+    def _synth_loop(self):
+        try:
+            import pyttsx3  # loaded on the synthesis thread, off the startup path
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self.rate)
+            engine.setProperty('volume', self.volume)
+            self.voice = engine.getProperty('voice')
+            self._engine = engine
+        except Exception as e:
+            # No driver (e.g. espeak missing) or no audio session: fail every request
+            # instead of leaving speakers waiting forever
+            print(f"Error starting the TTS engine: {e}")
+            self.error = e
+            while True:
+                request = self._synth_queue.get()
+                request.error = e
+                request.done.set()
+        while True:
+            request = self._synth_queue.get()
+            channel = request.channel
+            if channel is not None and channel.is_stale(request):
+                request.done.set()
+                continue
+            try:
+                clip = None
+                if self._can_play_clips or not request.play:
+                    started = time.perf_counter()
+                    clip = self._render(request.text)
+                    tracing.observe("tts_render_seconds", time.perf_counter() - started)
+            except Exception as e:
+                print(f"Error synthesizing speech: {e}")
+                clip = None
+            if not request.play:
+                request.done.set()
+            elif clip is not None and self._can_play_clips:
+                channel._play_queue.put((request, clip))
+            else:
+                # No clip playback available: speak directly on the engine thread
+                channel._play_queue.join()
+                if not channel.is_stale(request):
+                    request.trace.mark(tracing.TTS_FIRST_AUDIO)
+                    self._engine.say(request.text)
+                    self._engine.runAndWait()
+                request.done.set()
+
+    def _render(self, text):
+        key = TTSCache.key(text, self.voice, self.rate, self.volume)
+        clip = self.cache.get(key)
+        if clip is not None:
+            return clip
+        fd, tmp_path = tempfile.mkstemp(suffix='.wav', dir=self.cache.directory)
+        os.close(fd)
+        try:
+            self._engine.save_to_file(text, tmp_path)
+            self._engine.runAndWait()
+            if os.path.getsize(tmp_path) == 0:
+                return None
+            clip = read_audio_file(tmp_path)
+            self.cache.put_file(key, tmp_path)
+            return clip
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_tts_service():
+    """Return the process-wide TTS service, starting it on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TTSService()
+            _service.prewarm(COMMON_PHRASES)
+        return _service
+
+
+def speak_text(text):
+    """Speak text and return once it has been played"""
+    get_tts_service().speak(text)
+
+
+def stop_speaking():
+    """Interrupt the utterance that is currently playing, if any"""
+    if _service is not None:
+        _service.stop()
+
+
+# Backwards-compatible name
+speak = speak_text
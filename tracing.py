@@ -0,0 +1,472 @@
+"""Per-turn latency tracing and metrics export for the hot path.
+
+Each turn carries a TurnTrace that records when it passed each milestone
+(end of speech, end of turn declared, ASR done, first LLM token, LLM done, first TTS audio,
+playback done). Finished turns update HDR-style latency histograms and are
+appended to a JSONL trace file. Counters, gauges (queue depths) and the
+histograms are exported in the Prometheus text format, to a file and/or
+an HTTP endpoint.
+
+Nothing is recorded until enable() is called: every module function then
+returns immediately, and start_turn() hands out a shared no-op trace.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+# Turn milestones, in the order a turn normally passes them
+SPEECH_END = 'speech_end'
+ENDPOINT = 'endpoint'  # the capture decided the turn was over
+ASR_DONE = 'asr_done'
+LLM_FIRST_TOKEN = 'llm_first_token'
+LLM_DONE = 'llm_done'
+TTS_FIRST_AUDIO = 'tts_first_audio'
+PLAYBACK_DONE = 'playback_done'
+
+# Stage durations derived from the milestones: stage -> (from, to)
+STAGES = {
+    'endpointing': (SPEECH_END, ENDPOINT),
+    'asr': (ENDPOINT, ASR_DONE),
+    'llm_first_token': (ASR_DONE, LLM_FIRST_TOKEN),
+    'llm_total': (ASR_DONE, LLM_DONE),
+    'tts_first_audio': (LLM_FIRST_TOKEN, TTS_FIRST_AUDIO),
+    'response_latency': (SPEECH_END, TTS_FIRST_AUDIO),
+    'playback': (TTS_FIRST_AUDIO, PLAYBACK_DONE),
+    'turn_total': (SPEECH_END, PLAYBACK_DONE),
+}
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+_tracer = None
+_local = threading.local()
+_NO_CONTEXT = nullcontext()
+
+
+class Histogram:
+    """HDR-style log-linear histogram of durations with bounded relative error.
+
+    Values are recorded as integer microseconds. Below 2**sub_bucket_bits
+    they are exact; above, each power of two is split into
+    2**(sub_bucket_bits - 1) buckets, so with the default 7 bits every
+    recorded value is within 1/64 (~1.6%) of the truth from 1 us to hours,
+    and recording is a dict increment.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, micros):
+        bits = self.sub_bucket_bits
+        if micros < (1 << bits):
+            return micros
+        shift = micros.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + ((micros >> shift) - half)
+
+    def _bounds(self, index):
+        """Lowest and highest microsecond value that maps to a bucket"""
+        bits = self.sub_bucket_bits
+        if index < (1 << bits):
+            return index, index
+        half = 1 << (bits - 1)
+        shift = (index - (1 << bits)) // half + 1
+        low = ((index - (1 << bits)) % half + half) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, seconds):
+        micros = max(0, int(seconds * 1e6))
+        index = self._index(micros)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p):
+        """Value at percentile p (0..100), in seconds; None when empty"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(round(p / 100 * self.count + 0.5)))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= rank:
+                    low, high = self._bounds(index)
+                    return min(self.max, max(self.min, (low + high) / 2 / 1e6))
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            **{f"p{int(q * 100)}": self.percentile(q * 100) for q in QUANTILES},
+        }
+
+
+class TurnTrace:
+    """Milestone timeline of one turn (wall-clock times from time.time())"""
+
+    def __init__(self, tracer, source, turn_id, speech_end=None):
+        self.tracer = tracer
+        self.source = source
+        self.turn_id = turn_id
+        self.events = {}
+        self.counts = {}
+        self.attributes = {}
+        self.finished = False
+        if speech_end:
+            self.events[SPEECH_END] = speech_end
+
+    def mark(self, event, at=None):
+        """Record a milestone; only its first occurrence counts"""
+        if event not in self.events:
+            self.events[event] = time.time() if at is None else at
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def set(self, name, value):
+        self.attributes[name] = value
+
+    def spans(self):
+        """Stage durations in seconds, for the stages whose milestones were both reached"""
+        spans = {}
+        for stage, (start, end) in STAGES.items():
+            if start in self.events and end in self.events:
+                spans[stage] = max(0.0, self.events[end] - self.events[start])
+        return spans
+
+    def finish(self, cancelled=False):
+        if self.finished:
+            return
+        self.finished = True
+        self.tracer.finish_turn(self, cancelled)
+
+    def to_record(self, cancelled=False):
+        origin = self.events.get(SPEECH_END) or min(self.events.values(), default=time.time())
+        return {
+            'ts': origin,
+            'source': self.source,
+            'turn': self.turn_id,
+            'cancelled': cancelled,
+            'events_ms': {name: round((at - origin) * 1000, 1)
+                          for name, at in sorted(self.events.items(), key=lambda item: item[1])},
+            'spans_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.spans().items()},
+            'counts': dict(self.counts),
+            **self.attributes,
+        }
+
+
+class _NullTrace:
+    """Stands in for a TurnTrace while tracing is disabled"""
+
+    source = None
+    turn_id = None
+    finished = True
+
+    def mark(self, event, at=None):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def spans(self):
+        return {}
+
+    def finish(self, cancelled=False):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+class Tracer:
+    """Collects turn traces and metrics and exports them"""
+
+    def __init__(self, jsonl_path=None, metrics_file=None, metrics_port=None, metrics_host='127.0.0.1',
+                 metrics_interval=15.0, prefix='agent'):
+        self.prefix = prefix
+        self.jsonl_path = jsonl_path
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.turns = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._records = queue.Queue()
+        self._threads = []
+        self._server = None
+        if jsonl_path:
+            self._start(self._write_records, "trace-writer")
+        if metrics_file:
+            self._start(self._write_metrics_loop, "metrics-writer")
+        if metrics_port:
+            self._serve(metrics_host, metrics_port)
+
+    def _start(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    # -- recording ----------------------------------------------------------
+
+    def count(self, name, n=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def histogram(self, name, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            return histogram
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).record(seconds)
+
+    def finish_turn(self, trace, cancelled=False):
+        for stage, seconds in trace.spans().items():
+            self.observe('turn_stage_seconds', seconds, stage=stage)
+        self.count('turns_total', outcome='cancelled' if cancelled else 'completed')
+        for name, n in trace.counts.items():
+            self.count(f'turn_{name}_total', n)
+        with self._lock:
+            self.turns += 1
+        if self.jsonl_path:
+            # Serialised and written on the writer thread, off the turn's path
+            self._records.put(trace.to_record(cancelled))
+
+    # -- export -------------------------------------------------------------
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            declare(metric, 'counter')
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            metric = f"{self.prefix}_{name}"
+            declare(metric, 'gauge')
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            metric = f"{self.prefix}_{name}"
+            declare(metric, 'summary')
+            for q in QUANTILES:
+                value = histogram.percentile(q * 100)
+                lines.append(f"{metric}{_format_labels(labels, [('quantile', q)])} "
+                             f"{value if value is not None else 'NaN'}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """Atomically rewrite the metrics file (node_exporter textfile collector format)"""
+        path = path or self.metrics_file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def _write_metrics_loop(self):
+        while not self._closed.wait(self.metrics_interval):
+            try:
+                self.write_metrics()
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+    def _write_records(self):
+        with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+            while True:
+                record = self._records.get()
+                if record is None:
+                    return
+                f.write(json.dumps(record) + "\n")
+                if self._records.empty():
+                    f.flush()
+
+    def _serve(self, host, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = tracer.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Could not serve metrics on {host}:{port}: {e}")
+            return
+        self._start(self._server.serve_forever, "metrics-http")
+        print(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+
+    def summary(self):
+        """Per-stage latency percentiles of the turns seen so far"""
+        with self._lock:
+            histograms = [(dict(labels).get('stage'), h) for (name, labels), h in self.histograms.items()
+                          if name == 'turn_stage_seconds']
+        return {stage: histogram.snapshot() for stage, histogram in sorted(histograms)}
+
+    def close(self):
+        self._closed.set()
+        if self.jsonl_path:
+            self._records.put(None)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        if self.metrics_file:
+            try:
+                self.write_metrics()
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+
+def enable(jsonl_path=None, metrics_file=None, metrics_port=None, **options):
+    """Start tracing; returns the process-wide Tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(jsonl_path, metrics_file, metrics_port, **options)
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def get_tracer():
+    return _tracer
+
+
+def start_turn(source, turn_id, speech_end=None):
+    """A new turn trace (the shared no-op trace when disabled)"""
+    if _tracer is None:
+        return NULL_TRACE
+    return TurnTrace(_tracer, source, turn_id, speech_end)
+
+
+def current():
+    """The trace of the turn this thread is working on, if any"""
+    return getattr(_local, 'trace', NULL_TRACE)
+
+
+class _Activation:
+    def __init__(self, trace):
+        self.trace = trace
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'trace', NULL_TRACE)
+        _local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, *exc):
+        _local.trace = self.previous
+
+
+def use(trace):
+    """Context manager making trace current() on this thread"""
+    if _tracer is None or trace is NULL_TRACE:
+        return _NO_CONTEXT
+    return _Activation(trace)
+
+
+def mark_stream(deltas, trace):
+    """Pass text deltas through, marking the trace's first LLM token and the end of the stream"""
+    if trace is NULL_TRACE:
+        yield from deltas
+        return
+    for delta in deltas:
+        if delta:
+            trace.mark(LLM_FIRST_TOKEN)
+        yield delta
+    trace.mark(LLM_DONE)
+
+
+def count(name, n=1, **labels):
+    if _tracer is not None:
+        _tracer.count(name, n, **labels)
+
+
+def gauge(name, value, **labels):
+    if _tracer is not None:
+        _tracer.gauge(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    if _tracer is not None:
+        _tracer.observe(name, seconds, **labels)
+
+
+def summary():
+    return _tracer.summary() if _tracer is not None else {}
+
+
+def shutdown():
+    """Flush the trace file and write the metrics one last time"""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None